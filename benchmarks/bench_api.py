@@ -0,0 +1,171 @@
+"""Load test of the JSON HTTP API (crm.api): requests/sec and latency per endpoint.
+
+    python benchmarks/bench_api.py --policies 50000 --clients 16 --seconds 10
+
+The server runs as `python -m crm.api` in its own process against a
+synthetic book; every scenario is driven by --clients threads, each with
+a keep-alive connection, for --seconds. Payments mark pending premiums
+paid, so later runs on the same book pay fewer of them.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import quote
+
+import numpy as np
+
+import common  # noqa: F401  (puts the repo on sys.path)
+
+from crm import synthetic
+
+AGENT_ID = "A0000"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(path, port, workers):
+    env = dict(os.environ, CRM_DB_PATH=path, CRM_PROFILE='0')
+    server = subprocess.Popen([sys.executable, "-m", "crm.api", "--port", str(port), "--workers", str(workers)],
+                              env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError("API server exited during startup")
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("API server did not start")
+
+
+# Sample data for the request bodies, read straight from the book
+def book_sample(path):
+    conn = sqlite3.connect(path)
+    try:
+        pans = [row[0] for row in conn.execute("SELECT pan FROM customers WHERE agent_id=?", (AGENT_ID,))]
+        pending = conn.execute('''SELECT p.policy_number, pr.due_date FROM premiums pr
+                                  JOIN policies p ON p.id = pr.policy_id
+                                  JOIN customers c ON c.id = p.customer_id
+                                  WHERE c.agent_id=? AND pr.status='Pending' ''', (AGENT_ID,)).fetchall()
+    finally:
+        conn.close()
+    return pans, pending
+
+
+def scenarios(pans, pending, batch):
+    start = date.today() - timedelta(days=90)
+    sequence = iter(range(10 ** 9))
+
+    def policy(number):
+        return {'customer_pan': random.choice(pans), 'policy_number': f"API{number:09d}", 'premium_amount': 2500,
+                'frequency': "Monthly", 'type': "Life Insurance", 'provider': "LIC",
+                'coverage_type': "Individual", 'start_date': start.isoformat(),
+                'end_date': (start + timedelta(days=365 * 5)).isoformat(), 'nominee_name': "Load Test"}
+
+    cursors = {}
+
+    # Follows next_cursor through the whole window, starting over at the end
+    def upcoming_walk(state):
+        cursor = cursors.get(state)
+        path = "/premiums/upcoming?days=90&limit=50" + (f"&cursor={cursor}" if cursor else "")
+        return "GET", path, None, lambda body: cursors.__setitem__(state, body['next_cursor'])
+
+    return {
+        "GET /customers/{pan}": lambda state: ("GET", f"/customers/{random.choice(pans)}", None, None),
+        f"POST /customers/lookup x{batch}": lambda state: (
+            "POST", "/customers/lookup", {'pans': random.sample(pans, batch)}, None),
+        "GET /premiums/upcoming (walk)": upcoming_walk,
+        f"POST /payments x{batch}": lambda state: (
+            "POST", "/payments", {'payments': [{'policy_number': number, 'due_date': due}
+                                               for number, due in random.sample(pending, batch)]}, None),
+        f"POST /policies x{batch}": lambda state: (
+            "POST", "/policies", {'policies': [policy(next(sequence)) for _ in range(batch)]}, None),
+    }
+
+
+def client(port, make_request, seconds, latencies, errors):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    state = threading.get_ident()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        method, path, body, on_response = make_request(state)
+        payload = json.dumps(body) if body is not None else None
+        started = time.perf_counter()
+        conn.request(method, quote(path, safe="/?&="), payload,
+                     {'X-Agent-Id': AGENT_ID, 'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        data = response.read()
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status != 200:
+            errors.append(f"{response.status} {data[:200]!r}")
+        elif on_response:
+            on_response(json.loads(data))
+    conn.close()
+
+
+def run(port, make_request, clients, seconds):
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client, args=(port, make_request, seconds, latencies, errors))
+               for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=10)
+    parser.add_argument("--policies", type=int, default=50000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--batch", type=int, default=50, help="items per batched request")
+    parser.add_argument("--workers", type=int, default=1, help="API server processes")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    server = None
+    try:
+        path = os.path.join(workdir, "crm.db")
+        synthetic.build(path, args.agents, args.policies, seed=42)
+        pans, pending = book_sample(path)
+        port = free_port()
+        server = start_server(path, port, args.workers)
+
+        print(f"{args.policies} policies, {args.agents} agents; {args.workers} server processes, "
+              f"{args.clients} clients x {args.seconds:g} s per endpoint, as {AGENT_ID}")
+        print(f"{'endpoint':<34}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        for label, make_request in scenarios(pans, pending, args.batch).items():
+            latencies, errors, elapsed = run(port, make_request, args.clients, args.seconds)
+            print(f"{label:<34}{len(latencies) / elapsed:>9.1f}{np.percentile(latencies, 50):>9.2f}"
+                  f"{np.percentile(latencies, 99):>9.2f}{len(errors):>8}")
+            if errors:
+                print(f"  first error: {errors[0]}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
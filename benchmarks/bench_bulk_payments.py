@@ -0,0 +1,88 @@
+"""Month-end bulk payment: per-premium loop vs crm.payments.pay_premiums.
+
+    python benchmarks/bench_bulk_payments.py --customers 20000 --pay 3000
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date
+
+from common import seed
+
+from crm import db, payments
+
+
+# What the "Mark Selected Premiums as Paid" button used to run per premium,
+# including the commit update_policy_status made on every call
+def per_premium_loop(conn, selected):
+    c = conn.cursor()
+    for policy_number, due_date in selected:
+        c.execute("UPDATE premiums SET status='Paid', paid_date=? WHERE policy_id=(SELECT id FROM policies WHERE policy_number=?) AND due_date=?",
+                  (date.today(), policy_number, due_date))
+        c.execute("SELECT id FROM policies WHERE policy_number=?", (policy_number,))
+        policy_id = c.fetchone()[0]
+        c.execute("SELECT status FROM policies WHERE id=?", (policy_id,))
+        if c.fetchone()[0] == 'Cancelled':
+            continue
+        c.execute("SELECT COUNT(*) FROM premiums WHERE policy_id=? AND status='Pending'", (policy_id,))
+        if c.fetchone()[0] == 0:
+            c.execute("UPDATE policies SET status='Completed' WHERE id=?", (policy_id,))
+        else:
+            c.execute("SELECT COUNT(*) FROM premiums WHERE policy_id=? AND status='Pending' AND due_date < date('now')",
+                      (policy_id,))
+            new_status = 'Lapsed' if c.fetchone()[0] > 0 else 'Active'
+            c.execute("UPDATE policies SET status=? WHERE id=?", (new_status, policy_id))
+        conn.commit()
+
+
+def snapshot(path):
+    conn = sqlite3.connect(path)
+    rows = (conn.execute("SELECT id, status FROM policies ORDER BY id").fetchall(),
+            conn.execute("SELECT id, status FROM premiums ORDER BY id").fetchall())
+    conn.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--pay", type=int, default=3000, help="pending premiums to mark paid")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        seeded = os.path.join(workdir, "seed.db")
+        seed(seeded, 1, args.customers, 1, 12)
+        before, after = os.path.join(workdir, "before.db"), os.path.join(workdir, "after.db")
+        shutil.copy(seeded, before)
+        shutil.copy(seeded, after)
+
+        conn = sqlite3.connect(before)
+        selected = conn.execute('''
+            SELECT p.policy_number, pr.due_date FROM premiums pr JOIN policies p ON pr.policy_id = p.id
+            WHERE pr.status='Pending' AND p.status != 'Cancelled' ORDER BY pr.due_date LIMIT ?''', (args.pay,)).fetchall()
+        print(f"{len(selected)} premiums across {len({number for number, _ in selected})} policies")
+
+        started = time.perf_counter()
+        per_premium_loop(conn, selected)
+        conn.close()
+        print(f"per-premium loop: {time.perf_counter() - started:8.3f} s")
+
+        db.configure(after)
+        started = time.perf_counter()
+        with db.transaction() as wconn:
+            summary = payments.pay_premiums(wconn, "A0000", selected)
+        print(f"bulk payment API: {time.perf_counter() - started:8.3f} s")
+        db.close()
+
+        print(payments.describe(summary))
+        print("results match" if snapshot(before) == snapshot(after) else "RESULTS DIFFER")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Page reruns with and without the per-agent result cache, and LRU hit rate vs size.
+
+    python benchmarks/bench_cache.py --agents 20 --customers 500
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+
+from common import seed, time_ms
+
+from crm import cache, db, queries, records, search, upcoming
+
+
+# The reads one rerun of each read page makes
+def page_reads(agent_id):
+    return [
+        lambda: cache.read_sql(agent_id, queries.CUSTOMER_CHOICES, (agent_id,)),
+        lambda: cache.read_sql(agent_id, queries.CUSTOMERS_WITH_PARENT, (agent_id,)),
+        lambda: cache.read_sql(agent_id, queries.PRIMARY_CUSTOMERS, (agent_id,)),
+        lambda: cache.call(agent_id, search.count_matches, agent_id, "ra"),
+        lambda: cache.call(agent_id, records.load_customer_records,
+                           cache.call(agent_id, search.search_customers, agent_id, "ra", 10, 0)['id']),
+        lambda: cache.call(agent_id, upcoming.summary, agent_id, 30, "All"),
+        lambda: cache.call(agent_id, upcoming.page, agent_id, 30, "All", "Due Date", None, 50, False),
+    ]
+
+
+def rerun(agent_id):
+    for read in page_reads(agent_id):
+        read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=20)
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--reruns", type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        path = os.path.join(workdir, "crm.db")
+        seed(path, args.agents, args.customers, 2, 12)
+        db.configure(path)
+        agent_id = "A0000"
+        def uncached():
+            cache.invalidate(agent_id)
+            rerun(agent_id)
+        print(f"rerun, cold cache: {time_ms(uncached, 5):8.2f} ms")
+        rerun(agent_id)
+        print(f"rerun, warm cache: {time_ms(lambda: rerun(agent_id), 5):8.3f} ms")
+
+        # Agents reused with a skew towards a few busy ones; a write every 20 reruns
+        rnd = random.Random(7)
+        agents = [f"A{a:04d}" for a in range(args.agents)]
+        weights = [1 / (a + 1) for a in range(args.agents)]
+        print(f"{'max entries':>12}{'hit rate':>10}{'evictions':>11}")
+        for size in (10, 40, 160, 640):
+            cache.results = cache.AgentCache(max_entries=size)
+            for n in range(args.reruns):
+                agent = rnd.choices(agents, weights)[0]
+                if n % 20 == 0:
+                    cache.invalidate(agent)
+                rerun(agent)
+            stats = cache.stats()
+            print(f"{size:>12}{stats['hit_rate']:>10.0%}{stats['evictions']:>11}")
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
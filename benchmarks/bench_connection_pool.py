@@ -0,0 +1,128 @@
+"""Reruns/sec for simulated concurrent agents: per-call sqlite3.connect vs crm.db pool.
+
+    python benchmarks/bench_connection_pool.py --agents 50 --reruns 20
+
+Each simulated rerun logs the agent in and runs the dashboard queries; every
+fifth rerun also marks a premium as paid, like an agent working the
+Upcoming Premiums page.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date
+
+from common import seed
+
+from crm import db
+
+DASHBOARD_QUERIES = (
+    "SELECT COUNT(*) as count FROM customers WHERE agent_id=?",
+    "SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=?",
+    "SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND p.status='Active'",
+    "SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND p.status='Lapsed'",
+    "SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND p.status='Completed'",
+    "SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND p.status='Cancelled'",
+    "SELECT COUNT(*) as count FROM customers WHERE agent_id=? AND parent_id IS NOT NULL",
+    "SELECT pr.due_date, pr.amount, c.name as customer_name, p.policy_number FROM premiums pr JOIN policies p ON pr.policy_id = p.id JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND pr.status='Pending' AND pr.due_date BETWEEN date('now') AND date('now', '+30 days') ORDER BY pr.due_date",
+)
+
+PAY_PREMIUM = ("UPDATE premiums SET status='Paid', paid_date=? WHERE id=(SELECT pr.id FROM premiums pr "
+               "JOIN policies p ON pr.policy_id = p.id JOIN customers c ON p.customer_id = c.id "
+               "WHERE c.agent_id=? AND pr.status='Pending' ORDER BY pr.due_date LIMIT 1)")
+
+
+# One rerun the way the pages used to do it: a fresh connection per function
+def rerun_direct(path, agent_id, write):
+    conn = sqlite3.connect(path)
+    conn.execute("SELECT * FROM agents WHERE id=?", (agent_id,)).fetchone()
+    conn.close()
+
+    conn = sqlite3.connect(path)
+    for sql in DASHBOARD_QUERIES:
+        conn.execute(sql, (agent_id,)).fetchall()
+    conn.close()
+
+    if write:
+        conn = sqlite3.connect(path)
+        conn.execute(PAY_PREMIUM, (date.today(), agent_id))
+        conn.commit()
+        conn.close()
+
+
+def rerun_pooled(path, agent_id, write):
+    with db.connection() as conn:
+        conn.execute("SELECT * FROM agents WHERE id=?", (agent_id,)).fetchone()
+
+    with db.connection() as conn:
+        for sql in DASHBOARD_QUERIES:
+            conn.execute(sql, (agent_id,)).fetchall()
+
+    if write:
+        with db.transaction() as conn:
+            conn.execute(PAY_PREMIUM, (date.today(), agent_id))
+
+
+def run(rerun, path, agents, reruns):
+    errors = []
+    barrier = threading.Barrier(agents + 1)
+
+    def agent(n):
+        agent_id = f"A{n:04d}"
+        barrier.wait()
+        for i in range(reruns):
+            try:
+                rerun(path, agent_id, i % 5 == 4)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=agent, args=(n,)) for n in range(agents)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return agents * reruns / elapsed, elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--customers-per-agent", type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        seeded = os.path.join(workdir, "seed.db")
+        seed(seeded, args.agents, args.customers_per_agent)
+
+        # The "before" copy goes back to the default rollback journal
+        before = os.path.join(workdir, "before.db")
+        shutil.copy(seeded, before)
+        conn = sqlite3.connect(before)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+        after = os.path.join(workdir, "after.db")
+        shutil.copy(before, after)
+
+        rate, elapsed, errors = run(rerun_direct, before, args.agents, args.reruns)
+        print(f"before (sqlite3.connect per call): {rate:8.1f} reruns/sec  "
+              f"{elapsed:6.2f}s  {len(errors)} 'database is locked' errors")
+
+        db.configure(after)
+        rate, elapsed, errors = run(rerun_pooled, after, args.agents, args.reruns)
+        print(f"after  (crm.db pool, WAL):         {rate:8.1f} reruns/sec  "
+              f"{elapsed:6.2f}s  {len(errors)} 'database is locked' errors")
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
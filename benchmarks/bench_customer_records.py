@@ -0,0 +1,72 @@
+"""Records page data for one page of customers: per-policy queries vs crm.records.
+
+    python benchmarks/bench_customer_records.py --customers 10 --policies-per-customer 20
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from common import seed, time_ms
+
+from crm import db, records
+
+OLD_POLICIES = "SELECT p.*, holder.name as holder_name FROM policies p LEFT JOIN customers holder ON p.policy_holder_id = holder.id WHERE p.customer_id=? ORDER BY p.start_date DESC"
+OLD_PREMIUMS = "SELECT * FROM premiums WHERE policy_id=? ORDER BY due_date"
+
+
+# What display_customer_details used to run: one policies query per
+# customer, then one premiums query per non-cancelled policy
+def per_policy_queries(conn, customer_ids):
+    for customer_id in customer_ids:
+        policies = pd.read_sql_query(OLD_POLICIES, conn, params=(customer_id,))
+        for _, policy in policies.iterrows():
+            if policy['status'] != 'Cancelled':
+                pd.read_sql_query(OLD_PREMIUMS, conn, params=(policy['id'],))
+
+
+def batched(conn, customer_ids):
+    loaded = records.load_customer_records(conn, customer_ids)
+    for customer_id in customer_ids:
+        for _, policy in loaded.policies(customer_id).iterrows():
+            loaded.premiums(policy['id'])
+
+
+def count_queries(conn, fn, customer_ids):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    fn(conn, customer_ids)
+    conn.set_trace_callback(None)
+    return len(statements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=10)
+    parser.add_argument("--policies-per-customer", type=int, default=20)
+    parser.add_argument("--premiums-per-policy", type=int, default=36)
+    parser.add_argument("--book", type=int, default=1000, help="customers in the agent's whole book")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        path = os.path.join(workdir, "crm.db")
+        seed(path, 1, args.book, args.policies_per_customer, args.premiums_per_policy)
+        db.configure(path)
+        with db.connection() as conn:
+            customer_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM customers ORDER BY id LIMIT ?", (args.customers,))]
+            print(f"{args.customers} customers x {args.policies_per_customer} policies "
+                  f"x {args.premiums_per_policy} premiums")
+            for label, fn in (("per-policy queries", per_policy_queries), ("batched loader   ", batched)):
+                queries_run = count_queries(conn, fn, customer_ids)
+                print(f"{label}: {queries_run:4d} queries  {time_ms(lambda: fn(conn, customer_ids)):8.1f} ms")
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
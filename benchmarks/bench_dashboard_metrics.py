@@ -0,0 +1,76 @@
+"""Dashboard data cost for one large agent: seven count queries vs the crm.metrics rollup row.
+
+    python benchmarks/bench_dashboard_metrics.py --customers 25000 --policies-per-customer 4
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from common import seed, time_ms
+
+from crm import cache, db, metrics
+
+OLD_COUNT_QUERIES = (
+    ("SELECT COUNT(*) as count FROM customers WHERE agent_id=?", ()),
+    ("SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=?", ()),
+    ("SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND p.status=?", ("Active",)),
+    ("SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND p.status=?", ("Lapsed",)),
+    ("SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND p.status=?", ("Completed",)),
+    ("SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND p.status=?", ("Cancelled",)),
+    ("SELECT COUNT(*) as count FROM customers WHERE agent_id=? AND parent_id IS NOT NULL", ()),
+)
+
+
+def old_counts(agent_id):
+    with db.connection() as conn:
+        for sql, extra in OLD_COUNT_QUERIES:
+            pd.read_sql_query(sql, conn, params=(agent_id,) + extra).iloc[0]['count']
+
+
+def new_counts(agent_id):
+    with db.connection() as conn:
+        metrics.load_dashboard_metrics(conn, agent_id)
+
+
+def upcoming_list(agent_id):
+    with db.connection() as conn:
+        metrics.load_upcoming_premiums(conn, agent_id)
+
+
+def cached_dashboard(agent_id):
+    metrics.dashboard_metrics(agent_id)
+    metrics.upcoming_premiums(agent_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=25000)
+    parser.add_argument("--policies-per-customer", type=int, default=4)
+    parser.add_argument("--premiums-per-policy", type=int, default=6)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        path = os.path.join(workdir, "crm.db")
+        seed(path, 1, args.customers, args.policies_per_customer, args.premiums_per_policy)
+        db.configure(path)
+        agent_id = "A0000"
+
+        print(f"{args.customers * args.policies_per_customer} policies for {agent_id}")
+        print(f"counts, old: 7 queries         {time_ms(lambda: old_counts(agent_id)):8.2f} ms")
+        print(f"counts, new: 1 rollup row     {time_ms(lambda: new_counts(agent_id)):8.2f} ms")
+        print(f"30-day upcoming premiums list  {time_ms(lambda: upcoming_list(agent_id)):8.2f} ms")
+        cached_dashboard(agent_id)
+        print(f"dashboard data, cached         {time_ms(lambda: cached_dashboard(agent_id)):8.2f} ms")
+        cache.invalidate(agent_id)
+        print(f"dashboard data, invalidated    {time_ms(lambda: cached_dashboard(agent_id), repeat=1):8.2f} ms")
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
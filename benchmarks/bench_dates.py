@@ -0,0 +1,86 @@
+"""ISO date storage (migration 8): upgrade time, and premium-history formatting per row against column-wise.
+
+    python benchmarks/bench_dates.py --agents 10 --policies 100000 --customers 500
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+# Slow-query reports from the profiling layer would interleave with the results
+os.environ.setdefault('CRM_PROFILE', '0')
+
+import common  # noqa: E402,F401  (puts the repo on sys.path)
+from common import time_ms  # noqa: E402
+
+from crm import dates, db, migrations, queries, synthetic  # noqa: E402
+
+
+# What display_customer_details did with text dates: slice, and parse each pending one
+def per_row(premiums):
+    lines = []
+    for _, premium in premiums[premiums['status'] == 'Paid'].iterrows():
+        paid_date = premium['paid_date'][:10] if isinstance(premium['paid_date'], str) else premium['paid_date']
+        due_date = premium['due_date'][:10] if isinstance(premium['due_date'], str) else premium['due_date']
+        lines.append(f"• ₹{premium['amount']:,.2f} paid on {paid_date} (due: {due_date})")
+    for _, premium in premiums[premiums['status'] == 'Pending'].iterrows():
+        due_date = premium['due_date'][:10] if isinstance(premium['due_date'], str) else premium['due_date']
+        status_icon = "⏰" if pd.to_datetime(due_date).date() < datetime.now().date() else "📅"
+        lines.append(f"• {status_icon} ₹{premium['amount']:,.2f} due on {due_date}")
+    return lines
+
+
+def column_wise(premiums):
+    paid = premiums[premiums['status'] == 'Paid']
+    pending = premiums[premiums['status'] == 'Pending']
+    overdue = pending['due_date'] < pd.Timestamp(dates.today())
+    return (("• ₹" + paid['amount'].map("{:,.2f}".format) + " paid on " + dates.iso(paid['paid_date'])
+             + " (due: " + dates.iso(paid['due_date']) + ")").tolist()
+            + (overdue.map({True: "• ⏰ ₹", False: "• 📅 ₹"}) + pending['amount'].map("{:,.2f}".format)
+               + " due on " + dates.iso(pending['due_date'])).tolist())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=10)
+    parser.add_argument("--policies", type=int, default=100000)
+    parser.add_argument("--customers", type=int, default=500, help="customers whose premium history is formatted")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    shipped = migrations.MIGRATIONS
+    try:
+        path = os.path.join(workdir, "crm.db")
+        migrations.MIGRATIONS = [m for m in shipped if m[0] < 8]
+        synthetic.build(path, args.agents, args.policies, seed=42)
+        migrations.MIGRATIONS = shipped
+        started = time.perf_counter()
+        db.configure(path)
+        db.init_db()
+        print(f"{args.policies} policies, {args.agents} agents; migration 8 took {time.perf_counter() - started:.1f}s")
+
+        with db.connection() as conn:
+            customer_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM customers WHERE agent_id='A0000' ORDER BY name LIMIT ?", (args.customers,))]
+            ids = json.dumps(customer_ids)
+            text = pd.read_sql_query(queries.CUSTOMERS_PREMIUMS, conn, params=(ids,))
+            typed = dates.parse(text.copy())
+        assert per_row(text) == column_wise(typed)
+        print(f"{len(text)} premiums of {len(customer_ids)} customers")
+        print(f"{'parse date columns':<30}{time_ms(lambda: dates.parse(text.copy())):>10.2f} ms")
+        print(f"{'format per row':<30}{time_ms(lambda: per_row(text), repeat=1):>10.2f} ms")
+        print(f"{'format column-wise':<30}{time_ms(lambda: column_wise(typed)):>10.2f} ms")
+        db.close()
+    finally:
+        migrations.MIGRATIONS = shipped
+        db.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
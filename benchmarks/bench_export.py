@@ -0,0 +1,67 @@
+"""Export peak memory vs book size: whole-frame export vs crm.export streaming.
+
+    python benchmarks/bench_export.py --customers 1000 4000 16000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from common import seed
+
+from crm import db, export
+
+
+# What export_data_to_csv_and_txt used to do: three full frames, CSVs, then one to_string TXT
+def whole_frames(agent_id, directory):
+    with db.connection() as conn:
+        frames = [pd.read_sql_query(query, conn, params=(agent_id,)) for _, query, _ in export.TABLES]
+    for (table, _, _), frame in zip(export.TABLES, frames):
+        frame.to_csv(os.path.join(directory, f"{table}_old.csv"), index=False, encoding="utf-8-sig")
+    with open(os.path.join(directory, "data_old.txt"), "w", encoding="utf-8") as f:
+        for frame in frames:
+            f.write(frame.to_string(index=False))
+
+
+def peak_mb(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, nargs="+", default=[1000, 4000, 16000])
+    parser.add_argument("--premiums-per-policy", type=int, default=24)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        for customers in args.customers:
+            path = os.path.join(workdir, f"crm_{customers}.db")
+            seed(path, 1, customers, 1, args.premiums_per_policy)
+            db.configure(path)
+            out = os.path.join(workdir, f"out_{customers}")
+            os.makedirs(out)
+            rows = customers * (2 + args.premiums_per_policy)
+            print(f"{rows:>9} rows")
+            old, old_s = peak_mb(lambda: whole_frames("A0000", out))
+            print(f"  whole frames (csv + txt): {old:8.1f} MB peak  {old_s:6.2f} s")
+            for fmt in export.FORMATS:
+                new, new_s = peak_mb(lambda: export.export_agent("A0000", fmt, out))
+                print(f"  streaming {fmt:<15} {new:8.1f} MB peak  {new_s:6.2f} s")
+            db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
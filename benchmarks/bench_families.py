@@ -0,0 +1,53 @@
+"""Family Management page data: one policy query per family vs crm.families.
+
+    python benchmarks/bench_families.py --customers 20000 --policies-per-customer 2
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from common import seed, time_ms
+
+from crm import cache, db, families, queries
+
+OLD_FAMILY_POLICIES = "SELECT p.policy_number, p.type, p.provider, p.status, customer.name as insured_name, holder.name as holder_name FROM policies p JOIN customers customer ON p.customer_id = customer.id JOIN customers holder ON p.policy_holder_id = holder.id WHERE (customer.id = ? OR customer.parent_id = ?) ORDER BY p.policy_number"
+
+
+# What family_management_page used to run on every rerun
+def per_family_queries(conn, agent_id):
+    customers = pd.read_sql_query(queries.FAMILIES, conn, params=(agent_id,))
+    for _, primary in customers[customers['parent_id'].isna()].iterrows():
+        pd.read_sql_query(OLD_FAMILY_POLICIES, conn, params=(primary['id'], primary['id']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--policies-per-customer", type=int, default=2)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        path = os.path.join(workdir, "crm.db")
+        seed(path, 1, args.customers, args.policies_per_customer, premiums_per_policy=1)
+        db.configure(path)
+        agent_id = "A0000"
+        with db.connection() as conn:
+            loaded = families.load_families(conn, agent_id)
+            print(f"{len(loaded.primaries)} families, {args.customers * args.policies_per_customer} policies")
+            print(f"one query per family: {time_ms(lambda: per_family_queries(conn, agent_id), 1):9.1f} ms")
+            print(f"aggregate loader:     {time_ms(lambda: families.load_families(conn, agent_id), 3):9.1f} ms")
+
+        families.agent_families(agent_id)
+        print(f"cached rerun:         {time_ms(lambda: families.agent_families(agent_id)):9.3f} ms")
+        cache.invalidate(agent_id)
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
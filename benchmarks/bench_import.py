@@ -0,0 +1,115 @@
+"""Bulk import throughput: one form submission per row vs crm.importer.
+
+    python benchmarks/bench_import.py --customers 20000 --policies 40000
+"""
+import argparse
+import csv
+import os
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+
+import common  # noqa: F401  (puts the repo on sys.path)
+
+from crm import db, enrollment, importer, queries
+
+FREQUENCIES = ("Monthly", "Quarterly", "Half-Yearly", "Yearly")
+
+
+def _pan(prefix, n):
+    return f"{prefix}{n % 10000:04d}{'ABCDEFGHIJKLMNOPQRSTUVWXYZ'[n // 10000 % 26]}"
+
+
+def write_customers(path, count, prefix):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(importer.CUSTOMER_COLUMNS)
+        for n in range(count):
+            member = n % 4 != 0
+            writer.writerow([f"Customer {n}", _pan(prefix, n), "2345 6789 0123", f"9{n:09d}", "",
+                             "Below ₹5L", _pan(prefix, n - n % 4) if member else "", "Child" if member else ""])
+
+
+def write_policies(path, count, customers, prefix, number_prefix):
+    start = date.today() - timedelta(days=400)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('customer_pan', 'policy_number', 'premium_amount', 'frequency', 'type', 'provider',
+                         'coverage_type', 'start_date', 'end_date', 'nominee_name', 'paid_until'))
+        for n in range(count):
+            writer.writerow([_pan(prefix, n % customers), f"{number_prefix}{n:08d}", 1000, FREQUENCIES[n % 4],
+                             "Life Insurance", "LIC", "Individual", start, start + timedelta(days=365 * 5),
+                             "Nominee", date.today() - timedelta(days=30)])
+
+
+# What entering the file through the enrollment forms costs: a duplicate
+# check and a transaction per row
+def one_by_one(kind, agent_id, path):
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        if kind == 'customers':
+            with db.connection() as conn:
+                if conn.execute(queries.CUSTOMER_BY_PAN, (row['pan'],)).fetchone():
+                    continue
+                parent = conn.execute(queries.CUSTOMER_BY_PAN, (row['parent_pan'],)).fetchone() \
+                    if row['parent_pan'] else None
+            with db.transaction() as conn:
+                enrollment.enroll_customer(conn, agent_id, {
+                    'pan': row['pan'], 'aadhar': row['aadhar'], 'name': row['name'], 'phone': row['phone'],
+                    'income_range': row['income_range'], 'parent_id': parent[0] if parent else None,
+                    'relationship': row['relationship'] or None})
+        else:
+            with db.connection() as conn:
+                customer = conn.execute(queries.CUSTOMER_BY_PAN, (row['customer_pan'],)).fetchone()
+            with db.transaction() as conn:
+                enrollment.enroll_policy(conn, {
+                    'customer_id': customer[0], 'policy_number': row['policy_number'],
+                    'premium_amount': float(row['premium_amount']), 'frequency': row['frequency'],
+                    'type': row['type'], 'provider': row['provider'], 'coverage_type': row['coverage_type'],
+                    'nominee_name': row['nominee_name'], 'start_date': row['start_date'],
+                    'end_date': row['end_date']})
+    return len(rows)
+
+
+def bulk(kind, agent_id, path):
+    return importer.import_file(kind, agent_id, path)['imported']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--policies", type=int, default=40000)
+    parser.add_argument("--baseline-rows", type=int, default=2000,
+                        help="rows entered one by one (the slow path is extrapolated from these)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        path = os.path.join(workdir, "crm.db")
+        common.seed(path, 1, 0)
+        db.configure(path)
+        agent_id = "A0000"
+
+        for label, run, prefix, customers, policies in (
+                ("one by one", one_by_one, "OLDPA", args.baseline_rows, args.baseline_rows),
+                ("importer  ", bulk, "NEWPA", args.customers, args.policies)):
+            customers_csv = os.path.join(workdir, f"{prefix}_customers.csv")
+            policies_csv = os.path.join(workdir, f"{prefix}_policies.csv")
+            write_customers(customers_csv, customers, prefix)
+            write_policies(policies_csv, policies, customers, prefix, prefix[:3])
+            for kind, source in (('customers', customers_csv), ('policies', policies_csv)):
+                started = time.perf_counter()
+                rows = run(kind, agent_id, source)
+                elapsed = time.perf_counter() - started
+                print(f"{label} {kind:<9}: {rows / elapsed:10.0f} rows/sec  ({rows} rows in {elapsed:.2f}s)")
+        with db.connection() as conn:
+            print(f"{conn.execute('SELECT COUNT(*) FROM premiums').fetchone()[0]} premium rows in the database")
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
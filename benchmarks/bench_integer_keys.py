@@ -0,0 +1,158 @@
+"""Integer primary keys (migration 7): file size and join latency before and after, on the same book.
+
+    python benchmarks/bench_integer_keys.py --agents 10 --policies 100000
+
+The "before" database has the version 6 layout: TEXT ids of the form
+C/P/PR + 8 hex digits, spread over the key space like the uuid4 slices the
+app used to generate. It is then migrated in place to version 7.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+# Slow-query reports from the profiling layer would interleave with the results
+os.environ.setdefault('CRM_PROFILE', '0')
+
+import common  # noqa: E402,F401  (puts the repo on sys.path)
+from common import time_ms  # noqa: E402
+
+from crm import cache, db, export, families, migrations, queries, records, synthetic, upcoming  # noqa: E402
+
+# Random-looking but distinct 8-hex-digit ids: an odd multiplier permutes 32-bit numbers
+_SCRAMBLE = "printf('{prefix}%08x', ({column} * 2654435761) % 4294967296)"
+_TEXT_KEY_COPIES = (
+    "INSERT INTO agents SELECT * FROM book.agents",
+    f'''INSERT INTO customers (id, agent_id, pan, aadhar, name, phone, email, income_range, parent_id,
+                               relationship, created_at)
+        SELECT {_SCRAMBLE.format(prefix='C', column='id')}, agent_id, pan, aadhar, name, phone, email,
+               income_range, CASE WHEN parent_id IS NOT NULL THEN {_SCRAMBLE.format(prefix='C', column='parent_id')} END,
+               relationship, created_at
+        FROM book.customers ORDER BY id''',
+    f'''INSERT INTO policies (id, customer_id, policy_holder_id, policy_number, premium_amount, frequency, type,
+                              provider, coverage_type, nominee_name, start_date, end_date, status)
+        SELECT {_SCRAMBLE.format(prefix='P', column='id')}, {_SCRAMBLE.format(prefix='C', column='customer_id')},
+               {_SCRAMBLE.format(prefix='C', column='policy_holder_id')}, policy_number, premium_amount,
+               frequency, type, provider, coverage_type, nominee_name, start_date, end_date, status
+        FROM book.policies ORDER BY id''',
+    f'''INSERT INTO premiums (id, policy_id, due_date, amount, status, paid_date)
+        SELECT {_SCRAMBLE.format(prefix='PR', column='id')}, {_SCRAMBLE.format(prefix='P', column='policy_id')},
+               due_date, amount, status, paid_date
+        FROM book.premiums ORDER BY id''',
+)
+
+
+# A version 6 database holding the same rows as `book`
+def build_text_keys(path, book):
+    shipped = migrations.MIGRATIONS
+    conn = sqlite3.connect(path)
+    try:
+        migrations.MIGRATIONS = []
+        db.create_schema(conn)
+        conn.execute("ATTACH DATABASE ? AS book", (book,))
+        for statement in _TEXT_KEY_COPIES:
+            conn.execute(statement)
+        conn.commit()
+        conn.execute("DETACH DATABASE book")
+        migrations.MIGRATIONS = [m for m in shipped if m[0] < 7]
+        migrations.migrate(conn)
+        conn.commit()
+    finally:
+        migrations.MIGRATIONS = shipped
+        conn.close()
+
+
+def vacuumed_size(path):
+    conn = sqlite3.connect(path)
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return os.path.getsize(path)
+
+
+def index_sizes(path):
+    conn = sqlite3.connect(path)
+    try:
+        return dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+    except sqlite3.OperationalError:
+        # dbstat is an optional compile-time feature
+        return {}
+    finally:
+        conn.close()
+
+
+def upcoming_page(conn, agent_id, days, sort):
+    count = upcoming.summary(conn, agent_id, days)[0]
+    upcoming.page(conn, agent_id, days, sort=sort, dense=upcoming.dense_window(conn, days, sort, count))
+
+
+def export_premiums(conn, agent_id):
+    for _ in export._chunks(conn, queries.EXPORT_PREMIUMS, (agent_id,), export.CHUNK_SIZE):
+        pass
+
+
+# Join-heavy reads of the pages, best of five (ms)
+def latencies(agent_id):
+    with db.connection() as conn:
+        customer_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM customers WHERE agent_id=? ORDER BY name LIMIT 50", (agent_id,))]
+        cases = {
+            "upcoming, 30 days": lambda: upcoming_page(conn, agent_id, 30, "Due Date"),
+            "upcoming, all by name": lambda: upcoming_page(conn, agent_id, None, "Customer Name"),
+            "upcoming totals, Active 90d": lambda: upcoming.summary(conn, agent_id, 90, "Active"),
+            "records, 50 customers": lambda: records.load_customer_records(conn, customer_ids),
+            "family management": lambda: families.load_families(conn, agent_id),
+            "export premiums join": lambda: export_premiums(conn, agent_id),
+        }
+        return {label: time_ms(fn) for label, fn in cases.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=10)
+    parser.add_argument("--policies", type=int, default=100000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        book = os.path.join(workdir, "book.db")
+        path = os.path.join(workdir, "crm.db")
+        synthetic.build(book, args.agents, args.policies, seed=42)
+        build_text_keys(path, book)
+        agent_id = "A0000"
+
+        results = {}
+        for stage in ("TEXT ids (v6)", "INTEGER ids (v7)"):
+            if stage.startswith("INTEGER"):
+                started = time.perf_counter()
+                db.configure(path)
+                db.init_db()
+                db.close()
+                print(f"migration 7 took {time.perf_counter() - started:.1f}s")
+            size = vacuumed_size(path)
+            indexes = index_sizes(path)
+            db.configure(path)
+            cache.results.clear()
+            results[stage] = {'file size (MB)': size / 2 ** 20,
+                              **{f"{name} (MB)": indexes[name] / 2 ** 20 for name in
+                                 ('premiums', 'idx_premiums_policy_status_due', 'idx_premiums_pending_due')
+                                 if name in indexes},
+                              **latencies(agent_id)}
+            db.close()
+
+        print(f"{args.policies} policies, {args.agents} agents; latencies for {agent_id} in ms")
+        before, after = results.values()
+        print(f"{'':<36}{'TEXT ids':>10}{'INTEGER':>10}{'change':>9}")
+        for label in before:
+            if label in after:
+                print(f"{label:<36}{before[label]:>10.2f}{after[label]:>10.2f}"
+                      f"{(after[label] / before[label] - 1) * 100:>8.0f}%")
+    finally:
+        db.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
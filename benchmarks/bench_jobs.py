@@ -0,0 +1,88 @@
+"""Sidebar actions: time the script is blocked, inline vs as crm.jobs background jobs.
+
+    python benchmarks/bench_jobs.py --policies 50000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import common  # noqa: F401  (puts the repo on sys.path)
+
+from crm import db, export, jobs, statuses, synthetic, upcoming
+
+
+def inline_export(agent_id, directory):
+    export.export_agent(agent_id, 'csv', directory)
+
+
+def inline_update(agent_id):
+    with db.transaction() as conn:
+        statuses.recompute_policy_statuses(conn, agent_id=agent_id)
+
+
+def elapsed_ms(fn):
+    started = time.perf_counter()
+    fn()
+    return (time.perf_counter() - started) * 1000
+
+
+# Latencies of the Upcoming Premiums reads (what a rerun does) until stop() is true
+def page_reads(agent_id, stop):
+    samples = []
+    while not stop():
+        samples.append(elapsed_ms(lambda: read_page(agent_id)))
+    return samples
+
+
+def read_page(agent_id):
+    with db.connection() as conn:
+        count = upcoming.summary(conn, agent_id, 30)[0]
+        upcoming.page(conn, agent_id, 30, dense=upcoming.dense_window(conn, 30, "Due Date", count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--policies", type=int, default=50000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        path = os.path.join(workdir, "crm.db")
+        synthetic.build(path, 1, args.policies, seed=42)
+        db.configure(path)
+        agent_id = "A0000"
+        export_dir = os.path.join(workdir, "exports")
+
+        print(f"{args.policies} policies for {agent_id}")
+        print(f"{'action':<22}{'inline ms':>10}{'submit ms':>10}{'job ms':>9}")
+        for kind, params, inline in (("export", {'format': 'csv', 'directory': export_dir},
+                                      lambda: inline_export(agent_id, export_dir)),
+                                     ("update_statuses", {}, lambda: inline_update(agent_id))):
+            blocked = elapsed_ms(inline)
+            started = time.perf_counter()
+            job = jobs.submit(kind, agent_id, params)
+            submitted = (time.perf_counter() - started) * 1000
+            job = jobs.wait(job['id'])
+            total = (time.perf_counter() - started) * 1000
+            print(f"{kind:<22}{blocked:>10.0f}{submitted:>10.2f}{total:>9.0f}  ({job['status']})")
+
+        # Reruns stay responsive while an export runs
+        idle = page_reads(agent_id, stop=lambda deadline=time.perf_counter() + 2: time.perf_counter() > deadline)
+        job = jobs.submit('export', agent_id, {'format': 'csv', 'directory': export_dir})
+        duplicates = {jobs.submit('export', agent_id, {'format': 'txt'})['id'] for _ in range(10)}
+        busy = page_reads(agent_id, stop=lambda: jobs.get(job['id'])['status'] not in jobs.ACTIVE)
+        print(f"10 duplicate submissions while running -> job ids {sorted(duplicates)} (first was {job['id']})")
+        for label, samples in (("idle", idle), ("during export", busy)):
+            print(f"page reads {label:<14} p50 {np.percentile(samples, 50):7.2f} ms   "
+                  f"p99 {np.percentile(samples, 99):7.2f} ms   ({len(samples)} reads)")
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
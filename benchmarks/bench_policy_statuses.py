@@ -0,0 +1,81 @@
+"""Policy status refresh for one agent: per-policy loop vs crm.statuses.
+
+    python benchmarks/bench_policy_statuses.py --customers 12500 --policies-per-customer 4
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from common import seed
+
+from crm import db, statuses
+
+
+# The loop update_all_policy_statuses used to run: three SELECTs, one
+# UPDATE and one commit per policy
+def per_policy_loop(path, agent_id):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("SELECT p.id FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=?", (agent_id,))
+    for (policy_id,) in c.fetchall():
+        c.execute("SELECT status FROM policies WHERE id=?", (policy_id,))
+        if c.fetchone()[0] == 'Cancelled':
+            continue
+        c.execute("SELECT COUNT(*) FROM premiums WHERE policy_id=? AND status='Pending'", (policy_id,))
+        if c.fetchone()[0] == 0:
+            c.execute("UPDATE policies SET status='Completed' WHERE id=?", (policy_id,))
+        else:
+            c.execute("SELECT COUNT(*) FROM premiums WHERE policy_id=? AND status='Pending' AND due_date < date('now')",
+                      (policy_id,))
+            new_status = 'Lapsed' if c.fetchone()[0] > 0 else 'Active'
+            c.execute("UPDATE policies SET status=? WHERE id=?", (new_status, policy_id))
+        conn.commit()
+    conn.close()
+
+
+def statuses_of(path):
+    conn = sqlite3.connect(path)
+    rows = dict(conn.execute("SELECT id, status FROM policies"))
+    conn.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=12500)
+    parser.add_argument("--policies-per-customer", type=int, default=4)
+    parser.add_argument("--premiums-per-policy", type=int, default=12)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        seeded = os.path.join(workdir, "seed.db")
+        seed(seeded, 1, args.customers, args.policies_per_customer, args.premiums_per_policy)
+        before, after = os.path.join(workdir, "before.db"), os.path.join(workdir, "after.db")
+        shutil.copy(seeded, before)
+        shutil.copy(seeded, after)
+        agent_id = "A0000"
+        print(f"{args.customers * args.policies_per_customer} policies for {agent_id}")
+
+        started = time.perf_counter()
+        per_policy_loop(before, agent_id)
+        print(f"per-policy loop:  {time.perf_counter() - started:8.2f} s")
+
+        db.configure(after)
+        started = time.perf_counter()
+        with db.transaction() as conn:
+            transitions = statuses.recompute_policy_statuses(conn, agent_id=agent_id)
+        print(f"set-based engine: {time.perf_counter() - started:8.2f} s")
+        db.close()
+
+        print(statuses.describe(transitions))
+        print("results match" if statuses_of(before) == statuses_of(after) else "RESULTS DIFFER")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
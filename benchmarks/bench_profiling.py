@@ -0,0 +1,51 @@
+"""Cost of the SQL profiling layer: the same reads on plain vs profiled connections.
+
+    python benchmarks/bench_profiling.py --customers 5000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from common import seed, time_ms
+
+from crm import db, profiling, queries, upcoming
+
+
+def point_lookups(conn, count=2000):
+    for n in range(count):
+        conn.execute(queries.CUSTOMER_BY_PAN, (f"P0000{n:06d}",)).fetchone()
+
+
+def frames(conn):
+    pd.read_sql_query(queries.CUSTOMERS_WITH_PARENT, conn, params=("A0000",))
+    upcoming.page(conn, "A0000", 90, "All", "Due Date", None, 500)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=5000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        path = os.path.join(workdir, "crm.db")
+        seed(path, 1, args.customers, 2, 12)
+        print(f"{'':<12}{'2000 point lookups':>20}{'frames':>10}")
+        for label, enabled in (("plain", False), ("profiled", True)):
+            profiling.ENABLED = enabled
+            db.configure(path)
+            with db.connection() as conn:
+                lookups = time_ms(lambda: point_lookups(conn))
+                loads = time_ms(lambda: frames(conn))
+            print(f"{label:<12}{lookups:>17.1f} ms{loads:>7.1f} ms")
+            db.close()
+        print(f"{len(profiling.snapshot('sql'))} statement fingerprints recorded")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Batch reminders (crm.reminders): run time and peak memory of `python -m crm.reminders` per batch size.
+
+    python benchmarks/bench_reminders.py --agents 10 --policies 200000 --days 90
+
+Each run is a fresh process, so its peak RSS is its own; the "import only"
+row is the interpreter with crm and pandas loaded. Every batch size walks
+today's window on its own copy of the book. The last copy then gets the
+next night's run (the window moved by a day), which only queues premiums
+that came into the window, and today's window again with --restart,
+where every premium is already reminded.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import common  # noqa: F401  (puts the repo on sys.path)
+
+from crm import synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# (seconds, peak RSS in MB, last output line) of a child process
+def measure(args, path):
+    env = dict(os.environ, CRM_DB_PATH=path, CRM_PROFILE='0')
+    started = time.perf_counter()
+    child = subprocess.Popen([sys.executable, *args], env=env, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    output = child.stdout.read()
+    _, status, usage = os.wait4(child.pid, 0)
+    elapsed = time.perf_counter() - started
+    if status:
+        raise RuntimeError(f"{' '.join(args)} failed")
+    # ru_maxrss is in KB on Linux
+    return elapsed, usage.ru_maxrss / 1024, output.strip().splitlines()[-1] if output.strip() else ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=10)
+    parser.add_argument("--policies", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--batches", type=int, nargs="+", default=[1000, 5000, 20000])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        path = os.path.join(workdir, "crm.db")
+        synthetic.build(path, args.agents, args.policies, seed=42)
+        print(f"{args.policies} policies, {args.agents} agents; {args.days}-day windows")
+        print(f"{'run':<28}{'seconds':>9}{'peak MB':>9}  result")
+
+        elapsed, rss, _ = measure(["-c", "import pandas, crm.reminders"], path)
+        print(f"{'import only':<28}{elapsed:>9.2f}{rss:>9.0f}")
+        today = date.today()
+        for batch in args.batches:
+            copy = os.path.join(workdir, f"crm_{batch}.db")
+            shutil.copyfile(path, copy)
+            elapsed, rss, result = measure(["-m", "crm.reminders", "--start", today.isoformat(),
+                                            "--days", str(args.days), "--batch", str(batch)], copy)
+            print(f"{f'batch {batch}':<28}{elapsed:>9.2f}{rss:>9.0f}  {result}")
+
+        runs = (("next night", today + timedelta(days=1), []), ("restart, all reminded", today, ["--restart"]))
+        for label, start, extra in runs:
+            elapsed, rss, result = measure(["-m", "crm.reminders", "--start", start.isoformat(), "--days",
+                                            str(args.days), "--batch", str(args.batches[-1]), *extra], copy)
+            print(f"{label:<28}{elapsed:>9.2f}{rss:>9.0f}  {result}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Rollup tables: reads against recomputing from premiums, and the cost the triggers add to writes.
+
+    python benchmarks/bench_rollups.py --agents 10 --policies 100000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+from datetime import date, timedelta
+
+import common  # noqa: F401  (puts the repo on sys.path)
+from common import time_ms
+
+from crm import dates, db, enrollment, queries, statuses, synthetic, upcoming
+
+# What the dashboard and update_policy_status read before the rollups
+OLD_DASHBOARD_METRICS = '''
+    SELECT (SELECT COUNT(*) FROM customers WHERE agent_id=:agent_id) as customers,
+           (SELECT COUNT(*) FROM customers WHERE agent_id=:agent_id AND parent_id IS NOT NULL) as family_members,
+           COUNT(*) as policies,
+           COALESCE(SUM(p.status = 'Active'), 0) as active,
+           COALESCE(SUM(p.status = 'Lapsed'), 0) as lapsed,
+           COALESCE(SUM(p.status = 'Completed'), 0) as completed,
+           COALESCE(SUM(p.status = 'Cancelled'), 0) as cancelled
+    FROM customers c
+    JOIN policies p ON p.customer_id = c.id
+    WHERE c.agent_id=:agent_id
+'''
+OLD_PENDING = "SELECT COUNT(*) FROM premiums WHERE policy_id=? AND status='Pending'"
+OLD_OVERDUE = "SELECT COUNT(*) FROM premiums WHERE policy_id=? AND status='Pending' AND due_date < date('now')"
+OLD_NEW_STATUS = '''
+    CASE
+        WHEN NOT EXISTS (SELECT 1 FROM premiums pr WHERE pr.policy_id = p.id AND pr.status = 'Pending')
+            THEN 'Completed'
+        WHEN EXISTS (SELECT 1 FROM premiums pr WHERE pr.policy_id = p.id AND pr.status = 'Pending'
+                     AND pr.due_date < ?)
+            THEN 'Lapsed'
+        ELSE 'Active'
+    END
+'''
+TRIGGERS = "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name LIKE 'rollup_%'"
+
+
+def old_summary(conn, agent_id, days):
+    query, params = queries.upcoming_premiums_summary_query(agent_id, days, "All")
+    return conn.execute(query, params).fetchone()
+
+
+def old_policy_status(conn, policy_ids):
+    for policy_id in policy_ids:
+        conn.execute("SELECT status FROM policies WHERE id=?", (policy_id,)).fetchone()
+        if conn.execute(OLD_PENDING, (policy_id,)).fetchone()[0]:
+            conn.execute(OLD_OVERDUE, (policy_id,)).fetchone()
+
+
+def new_policy_status(conn, policy_ids):
+    today = dates.today()
+    for policy_id in policy_ids:
+        conn.execute(queries.POLICY_STATUS_COUNTERS, {'today': today, 'policy_id': policy_id}).fetchone()
+
+
+def recompute(new_status):
+    def run():
+        with db.transaction() as conn:
+            saved, statuses._NEW_STATUS = statuses._NEW_STATUS, new_status
+            try:
+                statuses.recompute_policy_statuses(conn)
+            finally:
+                statuses._NEW_STATUS = saved
+    return run
+
+
+def enroll(conn, count, prefix):
+    start = date.today() - timedelta(days=200)
+    customer_ids = [row[0] for row in conn.execute("SELECT id FROM customers LIMIT 1000")]
+    with db.transaction() as wconn:
+        enrollment.enroll_policies(wconn, [{
+            'customer_id': customer_ids[n % len(customer_ids)], 'policy_number': f"{prefix}{n:08d}",
+            'premium_amount': 1000.0, 'frequency': "Monthly", 'type': "Life Insurance", 'provider': "LIC",
+            'coverage_type': "Individual", 'nominee_name': "Nominee",
+            'start_date': start, 'end_date': start + timedelta(days=365 * 5)} for n in range(count)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=10)
+    parser.add_argument("--policies", type=int, default=100000)
+    parser.add_argument("--enroll", type=int, default=5000, help="policies enrolled to time the triggers")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        path = os.path.join(workdir, "crm.db")
+        synthetic.build(path, args.agents, args.policies, seed=42)
+        db.configure(path)
+        agent_id = "A0000"
+        with db.connection() as conn:
+            policy_ids = random.Random(1).sample([row[0] for row in conn.execute("SELECT id FROM policies")], 2000)
+            print(f"{args.policies} policies, {args.agents} agents")
+            print(f"{'':<34}{'recomputed ms':>14}{'rollup ms':>11}")
+            for label, old, new in (
+                    ("dashboard counts", lambda: conn.execute(OLD_DASHBOARD_METRICS, {'agent_id': agent_id}).fetchone(),
+                     lambda: conn.execute(queries.DASHBOARD_METRICS, (agent_id,)).fetchone()),
+                    ("upcoming totals, all upcoming", lambda: old_summary(conn, agent_id, None),
+                     lambda: upcoming.summary(conn, agent_id, None)),
+                    ("upcoming totals, overdue", lambda: old_summary(conn, agent_id, -1),
+                     lambda: upcoming.summary(conn, agent_id, -1)),
+                    ("update_policy_status x 2000", lambda: old_policy_status(conn, policy_ids),
+                     lambda: new_policy_status(conn, policy_ids))):
+                print(f"{label:<34}{time_ms(old):>14.2f}{time_ms(new):>11.2f}")
+            print(f"{'recompute_policy_statuses, all':<34}{time_ms(recompute(OLD_NEW_STATUS), repeat=1):>14.2f}"
+                  f"{time_ms(recompute(statuses._NEW_STATUS), repeat=1):>11.2f}")
+
+            # Write cost: the same enrollment without and with the triggers
+            triggers = conn.execute(TRIGGERS).fetchall()
+            with db.transaction() as wconn:
+                for name, _ in triggers:
+                    wconn.execute(f"DROP TRIGGER {name}")
+            without_triggers = time_ms(lambda: enroll(conn, args.enroll, "RAW"), repeat=1)
+            with db.transaction() as wconn:
+                for _, sql in triggers:
+                    wconn.execute(sql)
+            with_triggers = time_ms(lambda: enroll(conn, args.enroll, "TRG"), repeat=1)
+            print(f"enroll {args.enroll} policies: {without_triggers:.0f} ms without triggers, "
+                  f"{with_triggers:.0f} ms with them")
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Records page customer search: LIKE '%term%' vs the FTS5 index in crm.search.
+
+    python benchmarks/bench_search.py --customers 1000000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from common import seed, time_ms
+
+from crm import db, queries, search
+
+# The query the "Customer Name" search used to run on every rerun
+LIKE_QUERY = "SELECT c.*, parent.name as parent_name, parent.pan as parent_pan FROM customers c LEFT JOIN customers parent ON c.parent_id = parent.id WHERE c.name LIKE ? AND c.agent_id=? ORDER BY c.name"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=1000000)
+    parser.add_argument("--page-size", type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        path = os.path.join(workdir, "crm.db")
+        seed(path, 1, args.customers, policies_per_customer=0)
+        db.configure(path)
+        agent_id = "A0000"
+
+        with db.connection() as conn:
+            # Search terms taken from the seeded data: a full name, a surname, a PAN and a phone prefix
+            name, pan, phone = conn.execute("SELECT name, pan, phone FROM customers WHERE rowid = ?",
+                                            (args.customers // 2 + 1,)).fetchone()
+            terms = (name, name.split()[1], name.split()[1][:3], pan, phone[:6])
+
+            print(f"{args.customers} customers for {agent_id}")
+            print(f"{'term':<22}{'LIKE rows':>10}{'LIKE ms':>10}{'FTS rows':>10}{'count ms':>10}{'page ms':>10}{'+pandas':>10}")
+            for term in terms:
+                like_rows = len(pd.read_sql_query(LIKE_QUERY, conn, params=(f"%{term}%", agent_id)))
+                like_ms = time_ms(lambda: pd.read_sql_query(LIKE_QUERY, conn, params=(f"%{term}%", agent_id)), 3)
+                total = search.count_matches(conn, agent_id, term)
+                count_ms = time_ms(lambda: search.count_matches(conn, agent_id, term))
+                expression = search.match_expression(term)
+                page_ms = time_ms(lambda: conn.execute(queries.CUSTOMER_SEARCH,
+                                                       (expression, agent_id, args.page_size, 0)).fetchall())
+                frame_ms = time_ms(lambda: search.search_customers(conn, agent_id, term, args.page_size))
+                print(f"{term:<22}{like_rows:>10}{like_ms:>10.1f}{total:>10}{count_ms:>10.1f}{page_ms:>10.1f}{frame_ms:>10.1f}")
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
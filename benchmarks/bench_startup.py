@@ -0,0 +1,115 @@
+"""App startup: cold start of a fresh server process, and the overhead of every rerun after it.
+
+    python benchmarks/bench_startup.py --reruns 50
+
+Cold start runs the app's first script run (imports, schema setup and
+migrations, demo agent) in a new interpreter, against a new and an
+existing database. Reruns are timed in this process on the login page,
+along with the SQL statements each one executes; "bootstrap" is what
+every rerun paid before insurance_crm.bootstrap ran only once.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+# The app's background lapse scheduler would add statements of its own
+os.environ.setdefault('CRM_LAPSE_CHECK_INTERVAL', '0')
+
+import common  # noqa: E402,F401  (puts the repo on sys.path)
+from common import time_ms  # noqa: E402
+
+from crm import agents, db, profiling  # noqa: E402
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "insurance_crm.py")
+
+# Imports (measured separately) and first run of the app in a new interpreter
+_COLD_START = f'''
+import time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file({APP!r}, default_timeout=120)
+at.run()
+assert not at.exception, at.exception
+finished = time.perf_counter()
+print((imported - started) * 1000, (finished - imported) * 1000)
+'''
+
+
+def cold_start(path):
+    env = dict(os.environ, CRM_DB_PATH=path)
+    output = subprocess.run([sys.executable, "-c", _COLD_START], env=env, capture_output=True, text=True,
+                            check=True).stdout
+    return [float(value) for value in output.split()[-2:]]
+
+
+# What every rerun ran before the bootstrap was cached
+def per_rerun_bootstrap():
+    db.init_db()
+    with db.transaction() as conn:
+        agents.ensure_demo_agent(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=50)
+    parser.add_argument("--hold", type=float, default=1.0, help="seconds the simulated job holds the writer")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        path = os.path.join(workdir, "crm.db")
+        print(f"{'cold start':<34}{'streamlit ms':>13}{'first run ms':>13}")
+        for label in ("new database", "existing database"):
+            imports, first_run = cold_start(path)
+            print(f"  {label:<32}{imports:>13.0f}{first_run:>13.0f}")
+
+        from streamlit.testing.v1 import AppTest
+
+        db.configure(path)
+        at = AppTest.from_file(APP, default_timeout=120)
+        at.run()
+        samples, statements = [], []
+        for _ in range(args.reruns):
+            before = profiling.statement_count()
+            started = time.perf_counter()
+            at.run()
+            samples.append((time.perf_counter() - started) * 1000)
+            statements.append(profiling.statement_count() - before)
+        assert not at.exception, at.exception
+        print(f"login page rerun: p50 {np.percentile(samples, 50):.2f} ms, p99 {np.percentile(samples, 99):.2f} ms, "
+              f"{np.mean(statements):.1f} SQL statements ({args.reruns} reruns)")
+
+        before = profiling.statement_count()
+        per_rerun_bootstrap()
+        count = profiling.statement_count() - before
+        print(f"bootstrap each rerun used to run: {time_ms(per_rerun_bootstrap):.2f} ms, {count} SQL statements")
+
+        # It opens a write transaction, so a rerun waited behind any job holding the writer
+        holding = threading.Event()
+
+        def hold_writer():
+            with db.transaction():
+                holding.set()
+                time.sleep(args.hold)
+
+        writer = threading.Thread(target=hold_writer)
+        writer.start()
+        holding.wait()
+        print(f"  ...while a job holds the writer for {args.hold:g} s: "
+              f"{time_ms(per_rerun_bootstrap, repeat=1):.0f} ms")
+        writer.join()
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Load benchmark suite: core data functions and headless page renders at several book sizes.
+
+    python benchmarks/bench_suite.py --policies 10000 100000 1000000 [--compare old.json]
+
+Each book is built by crm.synthetic (seeded, so every run sees the same
+data). Latency is the best of --repeat runs with the result cache cleared;
+queries is the number of SQL statements one run executes. Results go to
+benchmarks/results/suite_<timestamp>.json; --compare prints the change
+against an earlier results file.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime
+
+# The app's background lapse scheduler would skew page timings
+os.environ.setdefault('CRM_LAPSE_CHECK_INTERVAL', '0')
+
+import pandas as pd  # noqa: E402
+
+import common  # noqa: E402,F401  (puts the repo root on sys.path)
+
+from crm import (cache, db, export, families, metrics, profiling, records, search, statuses,  # noqa: E402
+                 synthetic, upcoming)
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "insurance_crm.py")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+PAGES = ("Dashboard", "Customer Enrollment", "Policy Enrollment", "Records", "Family Management",
+         "Upcoming Premiums", "Performance")
+# Fixed reference date so every run builds the same book
+TODAY = date(2026, 1, 15)
+
+
+def measure(fn, repeat):
+    best = None
+    queries = 0
+    for _ in range(repeat):
+        cache.results.clear()
+        before = profiling.statement_count()
+        started = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        queries = profiling.statement_count() - before
+        best = elapsed if best is None else min(best, elapsed)
+    return {'ms': round(best, 3), 'queries': queries}
+
+
+def core_functions(agent_id, workdir):
+    def with_conn(fn):
+        def run():
+            with db.connection() as conn:
+                fn(conn)
+        return run
+
+    def search_page(conn):
+        search.count_matches(conn, agent_id, "ra")
+        customers = search.search_customers(conn, agent_id, "ra", 10, 0)
+        records.load_customer_records(conn, customers['id'])
+
+    def upcoming_page(conn):
+        count = upcoming.summary(conn, agent_id, None)[0]
+        dense = upcoming.dense_window(conn, None, "Due Date", count)
+        upcoming.page(conn, agent_id, None, "All", "Due Date", None, 50, dense)
+
+    def recompute():
+        with db.transaction() as conn:
+            statuses.recompute_policy_statuses(conn, agent_id=agent_id)
+
+    return {
+        'dashboard_metrics': with_conn(lambda conn: (metrics.load_dashboard_metrics(conn, agent_id),
+                                                     metrics.load_upcoming_premiums(conn, agent_id))),
+        'load_families': with_conn(lambda conn: families.load_families(conn, agent_id)),
+        'search_and_records': with_conn(search_page),
+        'upcoming_summary_and_page': with_conn(upcoming_page),
+        'recompute_policy_statuses': recompute,
+        'export_agent_csv': lambda: export.export_agent(agent_id, 'csv', os.path.join(workdir, "export")),
+    }
+
+
+# Renders every page headlessly through streamlit's AppTest, logged in as agent_id
+def page_renders(agent_id, repeat):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=600)
+    at.run()
+    at.text_input[0].set_value(agent_id)
+    [b for b in at.button if b.label == 'Login'][0].click().run()
+
+    results = {}
+    for page in PAGES:
+        at.session_state.page = page
+        cold = measure(at.run, repeat)
+        if at.exception:
+            raise RuntimeError(f"{page}: {at.exception[0].message}")
+        # A rerun with nothing changed, served from the result cache
+        started = time.perf_counter()
+        at.run()
+        cold['warm_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        results[page] = cold
+    return results
+
+
+def run_scale(policies, args, workdir):
+    agents = max(1, policies // args.policies_per_agent)
+    path = os.path.join(args.data_dir or workdir, f"crm_{policies}_{agents}_{args.seed}.db")
+    started = time.perf_counter()
+    if os.path.exists(path):
+        with sqlite3.connect(path) as conn:
+            totals = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in ('agents', 'customers', 'policies', 'premiums')}
+    else:
+        totals = synthetic.build(path, agents, policies, args.seed, TODAY)
+    build_s = time.perf_counter() - started
+    print(f"{policies} policies: {totals} ({build_s:.1f} s to build or open)")
+
+    db.configure(path)
+    agent_id = "A0000"
+    result = {'policies': policies, 'rows': totals, 'build_s': round(build_s, 1), 'functions': {}, 'pages': {}}
+    for name, fn in core_functions(agent_id, workdir).items():
+        result['functions'][name] = measure(fn, args.repeat)
+        print(f"  {name:<28}{result['functions'][name]['ms']:>10.1f} ms {result['functions'][name]['queries']:>5} queries")
+    if not args.skip_pages:
+        result['pages'] = page_renders(agent_id, args.repeat)
+        for name, page in result['pages'].items():
+            print(f"  page {name:<23}{page['ms']:>10.1f} ms {page['queries']:>5} queries  (warm {page['warm_ms']:.1f} ms)")
+    db.close()
+    return result
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(APP)).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit, 'run_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'pandas': pd.__version__,
+        'machine': platform.machine(),
+    }
+
+
+# Latency changes against an earlier results file; over +20% is flagged
+def compare(old_path, new):
+    with open(old_path, encoding='utf-8') as f:
+        old = {s['policies']: s for s in json.load(f)['scales']}
+    print(f"\nvs {old_path}")
+    for scale in new['scales']:
+        before = old.get(scale['policies'])
+        if before is None:
+            continue
+        for section in ('functions', 'pages'):
+            for name, now in scale[section].items():
+                was = before.get(section, {}).get(name)
+                if not was:
+                    continue
+                change = now['ms'] / was['ms'] - 1 if was['ms'] else 0.0
+                flag = "  REGRESSION" if change > 0.2 else ""
+                print(f"  {scale['policies']:>8} {name:<28}{was['ms']:>10.1f} -> {now['ms']:>10.1f} ms "
+                      f"{change:+7.0%}  queries {was['queries']} -> {now['queries']}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--policies", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--policies-per-agent", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=None, help="keep generated databases here and reuse them")
+    parser.add_argument("--skip-pages", action="store_true", help="only the core data functions")
+    parser.add_argument("--out", default=None, help="results file (default benchmarks/results/suite_<time>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        if args.data_dir:
+            os.makedirs(args.data_dir, exist_ok=True)
+        results = {'meta': metadata(), 'scales': [run_scale(policies, args, workdir) for policies in args.policies]}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"suite_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresults written to {out}")
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Upcoming Premiums grid, "All upcoming": whole window in pandas vs keyset pages.
+
+    python benchmarks/bench_upcoming.py --customers 20000 --premiums-per-policy 36
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from common import seed
+
+from crm import db, queries, upcoming
+
+OLD_QUERY = '''
+    SELECT pr.due_date, pr.amount, pr.status as premium_status,
+           c.name as customer_name, p.policy_number, p.type as policy_type,
+           p.provider, p.status as policy_status, holder.name as policy_holder
+    FROM premiums pr
+    JOIN policies p ON pr.policy_id = p.id
+    JOIN customers c ON p.customer_id = c.id
+    LEFT JOIN customers holder ON p.policy_holder_id = holder.id
+    WHERE c.agent_id=? AND pr.status='Pending' AND p.status != 'Cancelled'
+    ORDER BY pr.due_date
+'''
+OLD_SORTS = {"Due Date": ("due_date", True), "Amount": ("amount", False),
+             "Customer Name": ("customer_name", True), "Policy Number": ("policy_number", True)}
+
+
+# What upcoming_premiums_page used to do on every rerun
+def whole_window(conn, agent_id, sort):
+    premiums = pd.read_sql_query(OLD_QUERY, conn, params=(agent_id,))
+    premiums['due_date'] = pd.to_datetime(premiums['due_date']).dt.date
+    premiums['amount'].sum()
+    len(premiums[premiums['due_date'] < pd.Timestamp.now().date()])
+    column, ascending = OLD_SORTS[sort]
+    premiums = premiums.sort_values(column, ascending=ascending)
+    display_df = premiums.copy()
+    display_df['due_date'] = display_df['due_date'].apply(lambda x: x.strftime('%Y-%m-%d'))
+    display_df['amount'] = display_df['amount'].apply(lambda x: f"₹{x:,.2f}")
+    return display_df
+
+
+def keyset_page(conn, agent_id, sort, page_size=50):
+    premium_count = upcoming.summary(conn, agent_id)[0]
+    dense = upcoming.dense_window(conn, None, sort, premium_count, page_size)
+    premiums, after = upcoming.page(conn, agent_id, sort=sort, page_size=page_size, dense=dense)
+    # The second page, reached through its cursor
+    premiums, _ = upcoming.page(conn, agent_id, sort=sort, after=after, page_size=page_size, dense=dense)
+    display_df = premiums.copy()
+    display_df['amount'] = display_df['amount'].map("₹{:,.2f}".format)
+    return display_df
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = (time.perf_counter() - started) * 1000
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--premiums-per-policy", type=int, default=36)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        path = os.path.join(workdir, "crm.db")
+        seed(path, 1, args.customers, 1, args.premiums_per_policy)
+        db.configure(path)
+        agent_id = "A0000"
+        with db.connection() as conn:
+            print(f"{upcoming.summary(conn, agent_id)[0]} pending premiums for {agent_id}")
+            print(f"{'sort':<15}{'window ms':>10}{'window MB':>11}{'page ms':>10}{'page MB':>9}")
+            for sort in queries.UPCOMING_SORTS:
+                old_ms, old_mb = measure(lambda: whole_window(conn, agent_id, sort))
+                new_ms, new_mb = measure(lambda: keyset_page(conn, agent_id, sort))
+                print(f"{sort:<15}{old_ms:>10.0f}{old_mb:>11.1f}{new_ms:>10.1f}{new_mb:>9.2f}")
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Helpers shared by the benchmark scripts
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crm import db  # noqa: E402
+
+STATUSES = ("Active", "Active", "Active", "Lapsed", "Completed", "Cancelled")
+
+# Syllables for synthetic names: 900 first names x 900 surnames
+_SYLLABLES = ("ra", "vi", "sha", "ma", "an", "ku", "de", "pa", "ti", "la", "su", "ni", "ka", "ja", "ya",
+              "ha", "go", "me", "ru", "sa", "bi", "na", "chan", "dra", "kri", "shna", "pri", "mi", "lo", "ve")
+
+
+def person_name(rnd):
+    first = rnd.choice(_SYLLABLES) + rnd.choice(_SYLLABLES)
+    last = rnd.choice(_SYLLABLES) + rnd.choice(_SYLLABLES) + "r"
+    return f"{first.title()} {last.title()}"
+
+
+# Fill a fresh database at `path` with a simple book of business and close the pool.
+# Agent ids are A0000, A0001, ...; every fourth customer is a family member.
+def seed(path, agents, customers_per_agent, policies_per_customer=1, premiums_per_policy=36):
+    db.configure(path)
+    db.init_db()
+    rnd = random.Random(42)
+    today = date.today()
+    with db.transaction() as conn:
+        for a in range(agents):
+            agent_id = f"A{a:04d}"
+            conn.execute("INSERT INTO agents (id, name, email, phone, created_at) VALUES (?, ?, ?, ?, ?)",
+                         (agent_id, f"Agent {a}", f"agent{a}@insureCRM.com", "9876543210", today))
+            primary_id = None
+            for n in range(customers_per_agent):
+                parent_id = primary_id if n % 4 else None
+                customer_id = conn.execute(
+                    "INSERT INTO customers (display_id, agent_id, pan, aadhar, name, phone, email, income_range, parent_id, relationship, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (f"C{a:04d}{n:06d}", agent_id, f"P{a:04d}{n:06d}", "123412341234", person_name(rnd),
+                     f"9{a:03d}{n:06d}", None, "Below ₹5L", parent_id, "Child" if parent_id else None, today)).lastrowid
+                if parent_id is None:
+                    primary_id = customer_id
+
+                for k in range(policies_per_customer):
+                    display_id = f"P{a:04d}{n:06d}{k:02d}"
+                    start = today - timedelta(days=rnd.randint(0, 720))
+                    status = rnd.choice(STATUSES)
+                    policy_id = conn.execute(
+                        "INSERT INTO policies (display_id, customer_id, policy_holder_id, policy_number, premium_amount, frequency, type, provider, coverage_type, nominee_name, start_date, end_date, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (display_id, customer_id, customer_id, f"POL{display_id[1:]}", 1000.0, "Monthly",
+                         "Life Insurance", "LIC", "Individual", "Nominee", start,
+                         start + timedelta(days=30 * premiums_per_policy), status)).lastrowid
+                    conn.executemany(
+                        "INSERT INTO premiums (policy_id, due_date, amount, status) VALUES (?, ?, ?, ?)",
+                        [(policy_id, start + timedelta(days=30 * i), 1000.0,
+                          "Paid" if start + timedelta(days=30 * i) < today and status != "Lapsed" else "Pending")
+                         for i in range(premiums_per_policy)])
+    db.close()
+
+
+# Best-of-N wall time of fn() in milliseconds
+def time_ms(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
@@ -0,0 +1 @@
+# Data layer shared by the Streamlit app (insurance_crm.py) and its CLIs
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from crm import queries
+
+# Created on first start so there is someone to log in as
+DEMO_AGENT = {'id': "A1001", 'name': "John Doe", 'email': "john@insureCRM.com", 'phone': "9876543210"}
+
+
+# The agent's id, name, email and phone, or None for an unknown id
+def get_agent(conn, agent_id):
+    row = conn.execute(queries.AGENT_BY_ID, (agent_id,)).fetchone()
+    if row is None:
+        return None
+    return {'id': row[0], 'name': row[1], 'email': row[2], 'phone': row[3]}
+
+
+def create_agent(conn, agent):
+    conn.execute("INSERT INTO agents (id, name, email, phone, created_at) VALUES (?, ?, ?, ?, ?)",
+                 (agent['id'], agent['name'], agent['email'], agent['phone'], datetime.now()))
+
+
+# Adds the demo agent to an empty agents table. Must run inside db.transaction().
+def ensure_demo_agent(conn):
+    if conn.execute("SELECT COUNT(*) FROM agents").fetchone()[0] == 0:
+        create_agent(conn, DEMO_AGENT)
@@ -0,0 +1,253 @@
+"""JSON HTTP API over the CRM data layer, for partner systems and the mobile app.
+
+    python -m crm.api [--host 127.0.0.1] [--port 8000]
+
+Every request names its agent in the X-Agent-Id header; with CRM_API_KEY
+set it must also carry "Authorization: Bearer <key>".
+
+    GET  /customers/{pan}      one customer with policies and premiums
+    POST /customers/lookup     {"pans": [...]}
+    POST /policies             {"policies": [{<crm.importer policy columns>}, ...]}
+    POST /payments             {"payments": [{"policy_number": ..., "due_date": "YYYY-MM-DD"}, ...]}
+    GET  /premiums/upcoming    ?days=30&status=All&sort=Due Date&limit=50&cursor=...
+    GET  /metrics              crm.profiling SQL timings, Prometheus text format
+
+POST bodies also take a single object instead of the list; a batch holds
+up to CRM_API_MAX_BATCH items (default 1000). Upcoming premiums come one
+page at a time: pass a response's next_cursor back as `cursor` for the
+next page. Handlers call the same crm functions as the Streamlit pages,
+on a thread pool. They skip crm.cache, which only hears of writes made
+in its own process; for the same reason the app's pages show writes made
+here once their cached results expire (60 s). --workers runs several
+server processes; on SQLite they share its single writer, so writes
+queue behind each other either way, while with CRM_DATABASE_URL set to a
+postgresql:// URL they write concurrently. /metrics needs no agent, only
+the key; each server process reports its own statements. Needs starlette and uvicorn (pip install starlette uvicorn).
+"""
+import argparse
+import json
+import os
+from datetime import date
+
+import pandas as pd
+
+from crm import agents, dates, db, importer, payments, profiling, queries, records, upcoming
+
+API_KEY = os.environ.get('CRM_API_KEY')
+MAX_BATCH = int(os.environ.get('CRM_API_MAX_BATCH', 1000))
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STATUS_FILTERS = ("All", "Active", "Lapsed", "Completed")
+
+# Agents are never deleted, so one lookup per agent and process is enough
+_known_agents = set()
+
+
+# JSON-ready rows of a result frame: dates as 'YYYY-MM-DD', NaN as null
+def _rows(frame):
+    frame = frame.assign(**{column: dates.iso(frame[column]).replace("", None) for column in frame.columns
+                            if pd.api.types.is_datetime64_any_dtype(frame[column])})
+    return json.loads(frame.to_json(orient='records', force_ascii=False))
+
+
+def _check_key(headers):
+    if API_KEY and headers.get('authorization') != f"Bearer {API_KEY}":
+        raise PermissionError("missing or wrong API key")
+
+
+def _agent(headers):
+    _check_key(headers)
+    agent_id = headers.get('x-agent-id')
+    if not agent_id:
+        raise PermissionError("missing X-Agent-Id header")
+    return agent_id
+
+
+def _check_agent(agent_id):
+    with db.connection() as conn:
+        if agents.get_agent(conn, agent_id) is None:
+            raise PermissionError(f"unknown agent {agent_id}")
+    _known_agents.add(agent_id)
+
+
+# The list under `key` of a POST body, or the body itself as a batch of one
+def _batch(body, key, kind=dict):
+    items = body.get(key, [body]) if isinstance(body, dict) else body
+    if not isinstance(items, list) or not all(isinstance(item, kind) for item in items):
+        raise ValueError(f"expected {{\"{key}\": [...]}}")
+    if len(items) > MAX_BATCH:
+        raise ValueError(f"at most {MAX_BATCH} {key} per request")
+    return items
+
+
+# Customers of the agent with their policies (newest first) and the
+# premiums of those that are not cancelled; PANs without a match are listed
+def lookup_customers(agent_id, pans):
+    pans = list(dict.fromkeys(str(pan).strip().upper() for pan in pans))
+    with db.connection() as conn:
+        customers = db.read_sql(conn, queries.RECORDS_BY_PANS, (db.array(pans), agent_id))
+        loaded = records.load_customer_records(conn, customers['id'])
+    # Each frame is serialized once and the rows nested afterwards
+    found = _rows(customers)
+    policies = {customer['id']: [] for customer in found}
+    premiums = {}
+    for policy in _rows(loaded.all_policies):
+        policy['premiums'] = premiums.setdefault(policy['id'], [])
+        policies[policy['customer_id']].append(policy)
+    for premium in _rows(loaded.all_premiums):
+        premiums[premium['policy_id']].append(premium)
+    for customer in found:
+        customer['policies'] = policies[customer['id']]
+    matched = {customer['pan'] for customer in found}
+    return {'customers': found, 'not_found': [pan for pan in pans if pan not in matched]}
+
+
+# Policies with their premium schedules, checked and written like a bulk import
+def enroll_policies(agent_id, policies):
+    reasons = importer.import_rows('policies', agent_id, policies)
+    results = [{'policy_number': policy.get('policy_number'), 'enrolled': not reason, 'reason': reason or None}
+               for policy, reason in zip(policies, reasons)]
+    enrolled = sum(result['enrolled'] for result in results)
+    return {'enrolled': enrolled, 'rejected': len(results) - enrolled, 'results': results}
+
+
+def pay_premiums(agent_id, items):
+    pairs = []
+    for n, item in enumerate(items):
+        try:
+            pairs.append((str(item['policy_number']), date.fromisoformat(str(item['due_date']))))
+        except (KeyError, ValueError):
+            raise ValueError(f"payment {n}: needs policy_number and due_date (YYYY-MM-DD)")
+    with db.transaction() as conn:
+        summary = payments.pay_premiums(conn, agent_id, pairs)
+    summary['transitions'] = [{'from': old, 'to': new, 'count': count}
+                              for (old, new), count in summary['transitions'].items()]
+    return summary
+
+
+# Window totals and one keyset page of upcoming premiums, as on the page.
+# `days` < 0 means overdue only and None every upcoming premium.
+def upcoming_premiums(agent_id, days=None, status_filter="All", sort="Due Date", limit=PAGE_SIZE, cursor=None):
+    if status_filter not in STATUS_FILTERS:
+        raise ValueError(f"status must be one of {', '.join(STATUS_FILTERS)}")
+    if sort not in queries.UPCOMING_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(queries.UPCOMING_SORTS)}")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    try:
+        after = json.loads(cursor) if cursor else None
+    except json.JSONDecodeError:
+        raise ValueError("invalid cursor")
+    # One plain value per keyset column of the sort, as page() hands them out
+    if after is not None and not (isinstance(after, list) and len(after) == len(queries.UPCOMING_SORTS[sort][0])
+                                  and all(isinstance(value, (str, int, float)) and not isinstance(value, bool)
+                                          for value in after)):
+        raise ValueError("invalid cursor")
+
+    with db.connection() as conn:
+        count, amount, overdue = upcoming.summary(conn, agent_id, days, status_filter)
+        dense = upcoming.dense_window(conn, days, sort, count, limit)
+        premiums, next_cursor = upcoming.page(conn, agent_id, days, status_filter, sort, after, limit, dense)
+    return {'total': count, 'amount': amount, 'overdue': overdue, 'premiums': _rows(premiums),
+            'next_cursor': json.dumps(next_cursor) if next_cursor is not None else None}
+
+
+def _int_param(params, name, default):
+    value = params.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+
+def create_app():
+    try:
+        from starlette.applications import Starlette
+        from starlette.concurrency import run_in_threadpool
+        from starlette.responses import JSONResponse, PlainTextResponse
+        from starlette.routing import Route
+    except ImportError:
+        raise RuntimeError("The HTTP API needs starlette (pip install starlette uvicorn)")
+
+    # parse(request, body) -> (fn, *args); fn(agent_id, *args) runs on the
+    # thread pool. Errors map to 400 (bad input), 401 (agent or key) and 404;
+    # a statement the database was too busy for (db.is_busy: SQLite's busy
+    # timeout, a PostgreSQL lock timeout, serialization failure or deadlock)
+    # gets 503 and may be retried.
+    def endpoint(parse):
+        async def run(request):
+            try:
+                agent_id = _agent(request.headers)
+                if agent_id not in _known_agents:
+                    await run_in_threadpool(_check_agent, agent_id)
+                body = await request.json() if request.method == 'POST' else None
+                fn, *args = parse(request, body)
+                result = await run_in_threadpool(fn, agent_id, *args)
+            except PermissionError as e:
+                return JSONResponse({'error': str(e)}, status_code=401)
+            except LookupError as e:
+                return JSONResponse({'error': str(e)}, status_code=404)
+            except ValueError as e:
+                return JSONResponse({'error': str(e)}, status_code=400)
+            except Exception as e:
+                if not db.is_busy(e):
+                    raise
+                return JSONResponse({'error': "database busy, retry"}, status_code=503,
+                                    headers={'Retry-After': "1"})
+            return JSONResponse(result)
+        return run
+
+    async def metrics(request):
+        try:
+            _check_key(request.headers)
+        except PermissionError as e:
+            return JSONResponse({'error': str(e)}, status_code=401)
+        return PlainTextResponse(profiling.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+    def customer(agent_id, pan):
+        found = lookup_customers(agent_id, [pan])['customers']
+        if not found:
+            raise LookupError(f"no customer with PAN {pan.upper()}")
+        return found[0]
+
+    def upcoming_params(request, body):
+        params = request.query_params
+        days = params.get('days')
+        return (upcoming_premiums, None if days in (None, "", "all") else _int_param(params, 'days', None),
+                params.get('status', "All"), params.get('sort', "Due Date"),
+                _int_param(params, 'limit', PAGE_SIZE), params.get('cursor'))
+
+    return Starlette(routes=[
+        Route('/customers/lookup', endpoint(lambda request, body: (lookup_customers, _batch(body, 'pans', str))),
+              methods=['POST']),
+        Route('/customers/{pan}', endpoint(lambda request, body: (customer, request.path_params['pan'])),
+              methods=['GET']),
+        Route('/policies', endpoint(lambda request, body: (enroll_policies, _batch(body, 'policies'))),
+              methods=['POST']),
+        Route('/payments', endpoint(lambda request, body: (pay_premiums, _batch(body, 'payments'))),
+              methods=['POST']),
+        Route('/premiums/upcoming', endpoint(upcoming_params), methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON HTTP API over the CRM data layer")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="server processes")
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        raise RuntimeError("The HTTP API needs uvicorn (pip install starlette uvicorn)")
+    db.init_db()
+    uvicorn.run("crm.api:create_app", factory=True, host=args.host, port=args.port, workers=args.workers,
+                access_log=False)
+
+
+if __name__ == "__main__":
+    main()
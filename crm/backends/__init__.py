@@ -0,0 +1,80 @@
+# Storage backends behind crm.db. The database is picked by its location:
+# a postgresql:// URL opens crm.backends.postgres, anything else is a
+# SQLite file (crm.backends.sqlite).
+#
+# A backend implements the methods of Backend; crm.db hands its calls on to
+# the configured one. The queries are the ones in crm.queries, written in
+# SQLite's dialect; a backend for another database runs its own text of
+# the statements that are not portable (see crm.backends.postgres.QUERIES).
+POSTGRES_SCHEMES = ('postgresql://', 'postgres://')
+
+
+def dialect(location):
+    return 'postgresql' if location.startswith(POSTGRES_SCHEMES) else 'sqlite'
+
+
+def open_backend(location):
+    if dialect(location) == 'postgresql':
+        from crm.backends.postgres import PostgresBackend
+        return PostgresBackend(location)
+    from crm.backends.sqlite import SqliteBackend
+    return SqliteBackend(location)
+
+
+class Backend:
+    # 'sqlite' or 'postgresql'; query builders pick their SQL by it
+    name = None
+
+    # Context manager over a connection for reads
+    def connection(self):
+        raise NotImplementedError
+
+    # Context manager over a connection in a write transaction; commits on
+    # success, rolls back on error. Nested calls join the outer transaction,
+    # and connection() inside it returns the same connection.
+    def transaction(self):
+        raise NotImplementedError
+
+    # True while the calling thread is inside transaction()
+    def in_transaction(self):
+        raise NotImplementedError
+
+    # Create the schema or bring it up to the last crm.migrations version
+    def create_schema(self, conn):
+        raise NotImplementedError
+
+    # The parameter for an array of values in the backend's query text
+    # (json_each(?) in SQLite, unnest(?) in PostgreSQL)
+    def array(self, values):
+        raise NotImplementedError
+
+    # `count` unused integer keys for `table`, inside a write transaction
+    def next_ids(self, conn, table, count):
+        raise NotImplementedError
+
+    # Have next_ids follow rows inserted with explicit ids (crm.synthetic)
+    def restart_ids(self, conn):
+        raise NotImplementedError
+
+    # {column: declared type} of a table, in column order
+    def columns(self, conn, table):
+        raise NotImplementedError
+
+    # Refill the rollup tables from the base tables (python -m crm.rollups)
+    def rebuild_rollups(self, conn):
+        raise NotImplementedError
+
+    # Cursor over a large result that holds at most a fetchmany() of rows
+    # in memory at a time (crm.export)
+    def stream(self, conn, sql, params):
+        raise NotImplementedError
+
+    # True for an error that only says the database was too busy to take the
+    # statement (lock wait, serialization failure, deadlock): running it
+    # again later may well succeed
+    def is_busy(self, error):
+        raise NotImplementedError
+
+    # Close every pooled connection
+    def close(self):
+        raise NotImplementedError
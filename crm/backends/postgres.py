@@ -0,0 +1,361 @@
+import itertools
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import date
+from functools import lru_cache
+
+from crm import migrations, profiling, queries
+from crm.backends import Backend
+
+try:
+    import psycopg
+    import psycopg_pool
+    from psycopg.adapt import Dumper
+    from psycopg.types.numeric import FloatLoader
+except ImportError:
+    raise RuntimeError('PostgreSQL databases need psycopg (pip install "psycopg[binary,pool]")')
+
+# Connections per app server - override with CRM_PG_POOL_SIZE
+POOL_SIZE = int(os.environ.get('CRM_PG_POOL_SIZE', 10))
+
+
+# --- Schema ---
+# The tables of the first version in PostgreSQL, as crm.backends.sqlite
+# creates them; crm.migrations then takes both databases through the same
+# versions. Dates are text, as SQLite stores them, in the C collation so
+# range filters and the month prefix compare them as SQLite does; so are
+# the names, PANs and policy numbers the pages sort by, whatever the
+# database's default collation.
+TABLES = [
+    '''CREATE TABLE IF NOT EXISTS agents
+       (id text PRIMARY KEY, name text, email text, phone text, created_at timestamp)''',
+    '''CREATE TABLE IF NOT EXISTS customers
+       (id text PRIMARY KEY, agent_id text REFERENCES agents(id), pan text COLLATE "C" UNIQUE, aadhar text,
+        name text COLLATE "C", phone text, email text, income_range text,
+        parent_id text, relationship text, created_at text COLLATE "C")''',
+    '''CREATE TABLE IF NOT EXISTS policies
+       (id text PRIMARY KEY, customer_id text REFERENCES customers(id),
+        policy_holder_id text REFERENCES customers(id), policy_number text COLLATE "C" UNIQUE,
+        premium_amount double precision, frequency text, type text, provider text,
+        coverage_type text, nominee_name text, nominee_pan text, nominee_aadhar text,
+        beneficiary_name text, beneficiary_pan text, beneficiary_aadhar text,
+        start_date text COLLATE "C", end_date text COLLATE "C", status text)''',
+    '''CREATE TABLE IF NOT EXISTS premiums
+       (id text PRIMARY KEY, policy_id text REFERENCES policies(id), due_date text COLLATE "C",
+        amount double precision, status text, paid_date text COLLATE "C")''',
+]
+
+
+# Several app servers may start at once: the advisory lock lets one of them
+# create or upgrade the schema while the others wait for it
+def create_schema(conn):
+    conn.execute("SELECT pg_advisory_xact_lock(hashtext('crm.migrations'))")
+    for statement in TABLES:
+        conn.execute(statement)
+    migrations.migrate(conn, 'postgresql')
+
+
+# --- Queries ---
+# PostgreSQL text of the crm.queries statements written in SQLite's
+# dialect, under the same names; PostgresConnection runs these in their
+# place. Arrays are bound as arrays (PostgresBackend.array) and read with
+# unnest where SQLite reads a JSON array with json_each.
+QUERIES = {
+    'RECORDS_BY_PANS': '''
+        SELECT c.*, parent.name as parent_name, parent.pan as parent_pan
+        FROM unnest(?::text[]) j(value)
+        JOIN customers c ON c.pan = j.value
+        LEFT JOIN customers parent ON c.parent_id = parent.id
+        WHERE c.agent_id=?
+    ''',
+    # Best ts_rank first
+    'CUSTOMER_SEARCH': '''
+        SELECT c.*, parent.name as parent_name, parent.pan as parent_pan
+        FROM (SELECT s.customer_id, ts_rank(s.document, query) AS score
+              FROM to_tsquery('simple', ?) query
+              JOIN customer_search s ON s.document @@ query
+              JOIN customers c ON c.id = s.customer_id
+              WHERE c.agent_id=?
+              ORDER BY score DESC, s.customer_id LIMIT ? OFFSET ?) matches
+        JOIN customers c ON c.id = matches.customer_id
+        LEFT JOIN customers parent ON c.parent_id = parent.id
+        ORDER BY matches.score DESC, c.name
+    ''',
+    'CUSTOMER_SEARCH_COUNT': '''
+        SELECT COUNT(*)
+        FROM to_tsquery('simple', ?) query
+        JOIN customer_search s ON s.document @@ query
+        JOIN customers c ON c.id = s.customer_id
+        WHERE c.agent_id=?
+    ''',
+    'CUSTOMERS_POLICIES': '''
+        SELECT p.*, holder.name as holder_name
+        FROM policies p
+        LEFT JOIN customers holder ON p.policy_holder_id = holder.id
+        WHERE p.customer_id IN (SELECT unnest(?::bigint[]))
+        ORDER BY p.customer_id, p.start_date DESC
+    ''',
+    'CUSTOMERS_PREMIUMS': '''
+        SELECT pr.*
+        FROM premiums pr
+        JOIN policies p ON pr.policy_id = p.id
+        WHERE p.customer_id IN (SELECT unnest(?::bigint[])) AND p.status != 'Cancelled'
+        ORDER BY pr.policy_id, pr.due_date
+    ''',
+    'AGENT_POLICIES_BY_NUMBER': '''
+        SELECT p.policy_number, p.id, p.status
+        FROM policies p
+        JOIN customers c ON p.customer_id = c.id
+        WHERE p.policy_number IN (SELECT unnest(?::text[])) AND c.agent_id=?
+    ''',
+    'AGENT_PANS': '''
+        SELECT c.pan, c.id FROM unnest(?::text[]) j(value)
+        JOIN customers c ON c.pan = j.value
+        WHERE c.agent_id = ?
+    ''',
+    'REMINDED_PREMIUMS': '''
+        SELECT o.policy_id, o.due_date
+        FROM unnest(?::bigint[], ?::text[]) batch(policy_id, due_date)
+        JOIN reminder_outbox o ON o.policy_id = batch.policy_id AND o.due_date = batch.due_date
+    ''',
+}
+# SQLite's CROSS JOIN ... ON only pins the join order; PostgreSQL plans a plain JOIN
+for _name in ('PENDING_THIS_MONTH_OVERDUE', 'REMINDER_BATCH'):
+    QUERIES[_name] = getattr(queries, _name).replace("CROSS JOIN", "JOIN")
+
+_REPLACEMENTS = {getattr(queries, name): sql for name, sql in QUERIES.items()}
+
+# Quoted text and comments pass through; ? and :name placeholders become
+# psycopg's %s and %(name)s, and a literal % is doubled. '::' is a cast.
+_TOKENS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|::|\?|(?<![:\w]):(\w+)|%")
+
+
+def _placeholder(match):
+    token = match.group(0)
+    if token == '?':
+        return '%s'
+    if token == '%':
+        return '%%'
+    if match.group(1):
+        return f'%({match.group(1)})s'
+    return token
+
+
+# psycopg text of a statement written for sqlite3
+@lru_cache(maxsize=1024)
+def translate(sql):
+    return _TOKENS.sub(_placeholder, _REPLACEMENTS.get(sql, sql))
+
+
+# Without parameters psycopg sends the text as it is (DDL, function bodies)
+def _statement(sql, parameters):
+    if not parameters:
+        return _REPLACEMENTS.get(sql, sql), None
+    return translate(sql), parameters
+
+
+# --- Connections ---
+# The sqlite3 connection and cursor methods the crm modules use, over psycopg
+class PostgresCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def execute(self, sql, parameters=()):
+        self._cursor.execute(*_statement(sql, parameters))
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._cursor.executemany(translate(sql), seq_of_parameters)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+# Timed as crm.profiling times SQLite's cursors; slow statements are logged
+# with their EXPLAIN, run in a savepoint so a statement PostgreSQL cannot
+# explain leaves the caller's transaction as it was
+class ProfiledPostgresCursor(profiling.StatementProfile, PostgresCursor):
+    def execute(self, sql, parameters=()):
+        return self._profile_execute(lambda: PostgresCursor.execute(self, sql, parameters), sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._profile_executemany(lambda params: PostgresCursor.executemany(self, sql, params),
+                                         sql, seq_of_parameters)
+
+    def fetchone(self):
+        def fetch():
+            row = PostgresCursor.fetchone(self)
+            return row, row is not None, row is None
+        return self._profile_fetch(fetch)
+
+    def fetchmany(self, size=None):
+        size = size or self._cursor.arraysize
+
+        def fetch():
+            rows = PostgresCursor.fetchmany(self, size)
+            return rows, len(rows), len(rows) < size
+        return self._profile_fetch(fetch)
+
+    def fetchall(self):
+        def fetch():
+            rows = PostgresCursor.fetchall(self)
+            return rows, len(rows), True
+        return self._profile_fetch(fetch)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        PostgresCursor.close(self)
+
+    def _plan(self, sql, parameters):
+        raw = self._cursor.connection
+        text, parameters = _statement(sql, parameters)
+        try:
+            with raw.transaction(), raw.cursor() as cursor:
+                cursor.execute("EXPLAIN " + text, parameters)
+                return [row[0] for row in cursor]
+        except psycopg.Error as e:
+            return [f"(no plan: {e})"]
+
+
+def _cursor(raw_cursor):
+    return (ProfiledPostgresCursor if profiling.ENABLED else PostgresCursor)(raw_cursor)
+
+
+class PostgresConnection:
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self):
+        return _cursor(self.raw.cursor())
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# Dates are bound as 'YYYY-MM-DD' text of no declared type, as sqlite3
+# binds them, so they compare with the text date columns
+class _IsoDateDumper(Dumper):
+    def dump(self, obj):
+        return obj.isoformat().encode()
+
+
+def _configure(conn):
+    conn.adapters.register_dumper(date, _IsoDateDumper)
+    # SUM() and AVG() of integers are numeric; read them as floats, not Decimal
+    conn.adapters.register_loader('numeric', FloatLoader)
+
+
+_stream_names = itertools.count()
+
+
+# Pooled psycopg connections shared by any number of app servers. Reads run
+# in autocommit; each transaction() is a transaction of its own, so writers
+# no longer wait for one another as they do behind SQLite's single writer.
+class PostgresBackend(Backend):
+    name = 'postgresql'
+
+    def __init__(self, url, max_size=POOL_SIZE):
+        self.pool = psycopg_pool.ConnectionPool(url, min_size=1, max_size=max_size, kwargs={'autocommit': True},
+                                                configure=_configure, check=psycopg_pool.ConnectionPool.check_connection,
+                                                name="crm", open=True)
+        self._local = threading.local()
+
+    @contextmanager
+    def connection(self):
+        # Nested use and reads inside transaction() share the thread's connection
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        with self.pool.connection() as raw:
+            self._local.conn = conn = PostgresConnection(raw)
+            try:
+                yield conn
+            finally:
+                self._local.conn = None
+
+    @contextmanager
+    def transaction(self):
+        if self.in_transaction():
+            # Nested transaction() joins the outer one
+            yield self._local.conn
+            return
+        with self.connection() as conn:
+            self._local.write = True
+            try:
+                with conn.raw.transaction():
+                    yield conn
+            finally:
+                self._local.write = False
+
+    def in_transaction(self):
+        return getattr(self._local, 'write', False)
+
+    def create_schema(self, conn):
+        create_schema(conn)
+
+    def array(self, values):
+        return list(values)
+
+    # From the table's identity sequence, so concurrent writers never share an id
+    def next_ids(self, conn, table, count):
+        return sorted(row[0] for row in conn.execute(
+            "SELECT nextval(pg_get_serial_sequence(?, 'id')) FROM generate_series(1, ?)", (table, count)))
+
+    def restart_ids(self, conn):
+        migrations.restart_ids(conn, self.name)
+
+    def columns(self, conn, table):
+        return {name: data_type.upper() for name, data_type in conn.execute(
+            '''SELECT column_name, data_type FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = ? ORDER BY ordinal_position''', (table,))}
+
+    def rebuild_rollups(self, conn):
+        migrations.rebuild_rollups(conn, self.name)
+
+    # A server-side cursor; WITH HOLD keeps it open outside a transaction
+    def stream(self, conn, sql, params):
+        cursor = conn.raw.cursor(name=f"crm_stream_{next(_stream_names)}", withhold=True)
+        return _cursor(cursor).execute(sql, params)
+
+    def is_busy(self, error):
+        return isinstance(error, (psycopg.errors.LockNotAvailable, psycopg.errors.SerializationFailure,
+                                  psycopg.errors.DeadlockDetected))
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,200 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from crm import migrations, profiling
+from crm.backends import Backend
+
+# Integer ids picked out of DataFrames are numpy integers; bind them as ints
+sqlite3.register_adapter(np.int64, int)
+
+# Pragmas applied to every pooled connection
+PRAGMAS = (
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+# Thread-safe connection pool: each thread checks out its own reader
+# connection, while all writes go through one serialized writer connection.
+class ConnectionPool:
+    def __init__(self, path, max_idle_readers=64):
+        self.path = path
+        self.max_idle_readers = max_idle_readers
+        self._local = threading.local()
+        self._idle = []
+        self._idle_lock = threading.Lock()
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._closed = False
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        # isolation_level=None: transactions are opened explicitly by transaction()
+        # Statements are timed by crm.profiling unless CRM_PROFILE=0
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False,
+                               factory=profiling.connection_factory())
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        if self.path != ':memory:':
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        # Inside a write transaction, reads go through the writer so they see its changes
+        if getattr(self._local, 'write_depth', 0):
+            yield self._writer
+            return
+
+        # Nested use on the same thread reuses the connection already checked out
+        conn = getattr(self._local, 'reader', None)
+        if conn is not None:
+            yield conn
+            return
+
+        with self._idle_lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+
+        self._local.reader = conn
+        try:
+            yield conn
+        finally:
+            self._local.reader = None
+            with self._idle_lock:
+                if not self._closed and len(self._idle) < self.max_idle_readers:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            conn = self._writer
+
+            depth = getattr(self._local, 'write_depth', 0)
+            self._local.write_depth = depth + 1
+            try:
+                if depth:
+                    # Nested transaction() joins the outer one
+                    yield conn
+                    return
+
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                except BaseException:
+                    conn.rollback()
+                    raise
+                else:
+                    conn.commit()
+            finally:
+                self._local.write_depth = depth
+
+    def in_transaction(self):
+        return bool(getattr(self._local, 'write_depth', 0))
+
+    def close(self):
+        with self._idle_lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+# The tables of the first version, then every migration (crm.migrations)
+def create_schema(conn):
+    c = conn.cursor()
+
+    # Create tables if they don't exist
+    c.execute('''CREATE TABLE IF NOT EXISTS agents
+                (id TEXT PRIMARY KEY, name TEXT, email TEXT, phone TEXT, created_at TIMESTAMP)''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS customers
+                (id TEXT PRIMARY KEY, agent_id TEXT, pan TEXT UNIQUE, aadhar TEXT,
+                name TEXT, phone TEXT, email TEXT, income_range TEXT,
+                parent_id TEXT, relationship TEXT,
+                created_at TIMESTAMP, FOREIGN KEY(agent_id) REFERENCES agents(id))''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS policies
+                (id TEXT PRIMARY KEY, customer_id TEXT, policy_holder_id TEXT, policy_number TEXT UNIQUE,
+                premium_amount REAL, frequency TEXT, type TEXT, provider TEXT,
+                coverage_type TEXT, nominee_name TEXT, nominee_pan TEXT, nominee_aadhar TEXT,
+                beneficiary_name TEXT, beneficiary_pan TEXT, beneficiary_aadhar TEXT,
+                start_date TIMESTAMP, end_date TIMESTAMP, status TEXT,
+                FOREIGN KEY(customer_id) REFERENCES customers(id),
+                FOREIGN KEY(policy_holder_id) REFERENCES customers(id))''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS premiums
+                (id TEXT PRIMARY KEY, policy_id TEXT, due_date TIMESTAMP,
+                amount REAL, status TEXT, paid_date TIMESTAMP,
+                FOREIGN KEY(policy_id) REFERENCES policies(id))''')
+
+    # Indexes and later schema changes
+    migrations.migrate(conn)
+
+
+class SqliteBackend(Backend):
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.pool = ConnectionPool(path)
+
+    def connection(self):
+        return self.pool.connection()
+
+    def transaction(self):
+        return self.pool.transaction()
+
+    def in_transaction(self):
+        return self.pool.in_transaction()
+
+    def create_schema(self, conn):
+        create_schema(conn)
+
+    # numpy integers (ids from a DataFrame) are not JSON serializable by default
+    def array(self, values):
+        return json.dumps(list(values), default=int)
+
+    # Writers are serialized, so the largest id stays the largest until commit
+    def next_ids(self, conn, table, count):
+        start = conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+        return list(range(start, start + count))
+
+    def restart_ids(self, conn):
+        pass
+
+    def columns(self, conn, table):
+        return {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+    def rebuild_rollups(self, conn):
+        migrations.rebuild_rollups(conn)
+
+    # SQLite cursors step through the result as it is fetched
+    def stream(self, conn, sql, params):
+        return conn.execute(sql, params)
+
+    # A writer that waited out the busy timeout behind another one
+    def is_busy(self, error):
+        return isinstance(error, sqlite3.OperationalError) and 'locked' in str(error)
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from crm import db
+
+# Entries kept across all agents before the least recently used is evicted
+# - override with CRM_CACHE_ENTRIES
+MAX_ENTRIES = int(os.environ.get('CRM_CACHE_ENTRIES', 2000))
+
+
+# Per-agent result cache with a TTL and LRU eviction. Every write path that
+# touches an agent's customers, policies or premiums calls
+# invalidate(agent_id); a per-agent generation number keeps a load that
+# raced with such a write from being stored.
+class AgentCache:
+    def __init__(self, ttl=60, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, agent_id, key, loader):
+        # Reads inside a write transaction may see uncommitted rows
+        if db.in_transaction():
+            return loader()
+
+        now = time.monotonic()
+        with self._lock:
+            generation = self._generations.get(agent_id, 0)
+            entry = self._entries.get((agent_id, key))
+            if entry is not None and entry[0] == generation and entry[1] > now:
+                self._entries.move_to_end((agent_id, key))
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        value = loader()
+
+        with self._lock:
+            if self._generations.get(agent_id, 0) == generation:
+                self._entries[(agent_id, key)] = (generation, now + self.ttl, value)
+                self._entries.move_to_end((agent_id, key))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, agent_id):
+        with self._lock:
+            self._generations[agent_id] = self._generations.get(agent_id, 0) + 1
+            for cache_key in [k for k in self._entries if k[0] == agent_id]:
+                del self._entries[cache_key]
+
+    def clear(self):
+        with self._lock:
+            for agent_id in {k[0] for k in self._entries}:
+                self._generations[agent_id] = self._generations.get(agent_id, 0) + 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared by all sessions of the Streamlit process
+results = AgentCache()
+
+
+def invalidate(agent_id):
+    results.invalidate(agent_id)
+
+
+def stats():
+    return results.stats()
+
+
+# Hashable form of query parameters and loader arguments
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, pd.Series, pd.Index)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+# fn(conn, *args) for one agent, cached under (fn, args).
+# The result is shared - callers must not modify it in place.
+def call(agent_id, fn, *args):
+    def load():
+        with db.connection() as conn:
+            return fn(conn, *args)
+    return results.get(agent_id, (fn.__module__, fn.__qualname__, _freeze(args)), load)
+
+
+def _read_sql(conn, query, params):
+    return db.read_sql(conn, query, params)
+
+
+# DataFrame of a read query, cached per (agent_id, query, params)
+def read_sql(agent_id, query, params=()):
+    return call(agent_id, _read_sql, query, params)
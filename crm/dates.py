@@ -0,0 +1,43 @@
+from datetime import date, timedelta
+
+import pandas as pd
+
+# Dates the queries compare against, bound as ISO strings rather than
+# computed by the database (SQLite's date('now') is the UTC date and has no
+# equivalent in other SQL dialects). Paid dates and schedules use the same
+# local calendar.
+
+
+def today():
+    return date.today().isoformat()
+
+
+def days_from_today(days):
+    return (date.today() + timedelta(days=days)).isoformat()
+
+
+def month_start():
+    return date.today().replace(day=1).isoformat()
+
+
+# 'YYYY-MM', the key of agent_pending_months
+def month():
+    return date.today().strftime('%Y-%m')
+
+
+# Stored dates are 'YYYY-MM-DD' text (migration 8). Query results get their
+# date columns as datetime64 in one vectorized pass with the format fixed,
+# so nothing downstream parses values one at a time.
+DATE_COLUMNS = ('due_date', 'paid_date', 'start_date', 'end_date', 'created_at')
+
+
+def parse(frame):
+    for column in DATE_COLUMNS:
+        if column in frame:
+            frame[column] = pd.to_datetime(frame[column], format='%Y-%m-%d')
+    return frame
+
+
+# datetime64 column back to 'YYYY-MM-DD' text ('' where missing)
+def iso(series):
+    return series.dt.strftime('%Y-%m-%d').fillna('')
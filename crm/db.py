@@ -0,0 +1,103 @@
+import os
+import threading
+
+import pandas as pd
+
+from crm import backends
+from crm.backends.sqlite import PRAGMAS, ConnectionPool, create_schema  # noqa: F401
+
+# Database location: a SQLite file, or a postgresql:// URL for several app
+# servers sharing one database (crm.backends.postgres). Override with
+# CRM_DATABASE_URL, or CRM_DB_PATH (benchmarks, CLIs, tests)
+DB_PATH = os.environ.get('CRM_DATABASE_URL') or os.environ.get('CRM_DB_PATH', os.path.join('data', 'crm.db'))
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = backends.open_backend(DB_PATH)
+        return _backend
+
+
+# Point the shared backend at a different database file or URL
+def configure(path):
+    global DB_PATH
+    close()
+    DB_PATH = path
+
+
+# Close every pooled connection; the next use reopens the backend
+def close():
+    global _backend
+    with _backend_lock:
+        if _backend is not None:
+            _backend.close()
+        _backend = None
+
+
+# 'sqlite' or 'postgresql', for the queries that are written per dialect
+def dialect():
+    return backends.dialect(DB_PATH)
+
+
+# Read-only access for pages:  with db.connection() as conn: ...
+def connection():
+    return get_backend().connection()
+
+
+# Serialized write access; commits on success, rolls back on error:
+#   with db.transaction() as conn: ...
+def transaction():
+    return get_backend().transaction()
+
+
+# True while the calling thread is inside transaction()
+def in_transaction():
+    return get_backend().in_transaction()
+
+
+# Parameter for the array the queries take as one value (ids, PANs, policy numbers)
+def array(values):
+    return get_backend().array(values)
+
+
+def next_ids(conn, table, count):
+    return get_backend().next_ids(conn, table, count)
+
+
+def restart_ids(conn):
+    get_backend().restart_ids(conn)
+
+
+def columns(conn, table):
+    return get_backend().columns(conn, table)
+
+
+def rebuild_rollups(conn):
+    get_backend().rebuild_rollups(conn)
+
+
+# True when `error` only means the database was busy; the statement may be retried
+def is_busy(error):
+    return get_backend().is_busy(error)
+
+
+def stream(conn, sql, params=()):
+    return get_backend().stream(conn, sql, params)
+
+
+# DataFrame of a query, like pd.read_sql_query on any backend's connection
+def read_sql(conn, sql, params=()):
+    cursor = conn.execute(sql, params)
+    names = [d[0] for d in cursor.description]
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=names, coerce_float=True)
+
+
+# Database setup
+def init_db():
+    with transaction() as conn:
+        get_backend().create_schema(conn)
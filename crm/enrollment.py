@@ -0,0 +1,131 @@
+import os
+from datetime import date
+
+from crm import db, schedule, statuses
+
+CUSTOMER_COLUMNS = (
+    'id', 'display_id', 'agent_id', 'pan', 'aadhar', 'name', 'phone', 'email', 'income_range', 'parent_id',
+    'relationship', 'created_at',
+)
+
+POLICY_COLUMNS = (
+    'id', 'display_id', 'customer_id', 'policy_holder_id', 'policy_number', 'premium_amount', 'frequency', 'type',
+    'provider', 'coverage_type', 'nominee_name', 'nominee_pan', 'nominee_aadhar', 'beneficiary_name',
+    'beneficiary_pan', 'beneficiary_aadhar', 'start_date', 'end_date', 'status',
+)
+
+INSERT_POLICY = (f"INSERT INTO policies ({', '.join(POLICY_COLUMNS)}) "
+                 f"VALUES ({', '.join('?' * len(POLICY_COLUMNS))})")
+INSERT_CUSTOMER = (f"INSERT INTO customers ({', '.join(CUSTOMER_COLUMNS)}) "
+                   f"VALUES ({', '.join('?' * len(CUSTOMER_COLUMNS))})")
+INSERT_PREMIUM = "INSERT INTO premiums (policy_id, due_date, amount, status) VALUES (?, ?, ?, ?)"
+
+# SQLite's default host-parameter limit is 999 on older builds
+_MAX_PARAMS = 900
+
+
+# `count` unused integer keys for `table`, from the storage backend (the
+# largest id + 1 on SQLite, the table's sequence on PostgreSQL). Only valid
+# inside the write transaction that inserts them.
+def next_ids(conn, table, count):
+    return list(db.next_ids(conn, table, count))
+
+
+# `count` display ids of the form <prefix><8 hex chars>, from a single urandom call
+def new_ids(prefix, count):
+    digits = os.urandom(4 * count).hex()
+    return [prefix + digits[i:i + 8] for i in range(0, 8 * count, 8)]
+
+
+def _existing_ids(conn, table, ids):
+    found = set()
+    for start in range(0, len(ids), _MAX_PARAMS):
+        chunk = ids[start:start + _MAX_PARAMS]
+        placeholders = ", ".join("?" * len(chunk))
+        found.update(row[0] for row in conn.execute(
+            f"SELECT display_id FROM {table} WHERE display_id IN ({placeholders})", chunk))
+    return found
+
+
+# Like new_ids, but redraws any display id that repeats within the batch or
+# already exists in `table` (where display_id is UNIQUE as well)
+def unique_ids(conn, table, prefix, count):
+    ids = list(dict.fromkeys(new_ids(prefix, count)))
+    taken = _existing_ids(conn, table, ids)
+    ids = [i for i in ids if i not in taken]
+    while len(ids) < count:
+        extra = [i for i in dict.fromkeys(new_ids(prefix, count - len(ids))) if i not in ids]
+        taken = _existing_ids(conn, table, extra)
+        ids.extend(i for i in extra if i not in taken)
+    return ids[:count]
+
+
+def existing_policy_numbers(conn, policy_numbers):
+    policy_numbers = list(policy_numbers)
+    found = set()
+    for start in range(0, len(policy_numbers), _MAX_PARAMS):
+        chunk = policy_numbers[start:start + _MAX_PARAMS]
+        placeholders = ", ".join("?" * len(chunk))
+        found.update(row[0] for row in conn.execute(
+            f"SELECT policy_number FROM policies WHERE policy_number IN ({placeholders})", chunk))
+    return found
+
+
+# Premium rows for a batch of policies, from one vectorized schedule call
+def premium_rows(policy_ids, policies):
+    policy_index, due_dates = schedule.premium_schedule(
+        [p['start_date'] for p in policies], [p['end_date'] for p in policies], [p['frequency'] for p in policies])
+    amounts = [p['premium_amount'] for p in policies]
+    for i, due_date in zip(policy_index.tolist(), due_dates.astype(str).tolist()):
+        yield policy_ids[i], due_date, amounts[i], 'Pending'
+
+
+# Bulk policy enrollment. `policies` is an iterable of dicts keyed by the
+# policies columns (id and status are filled in). All policies and their
+# premium schedules are written with executemany in the caller's
+# transaction, then their statuses are computed set-wise.
+# Returns the new policy ids in input order.
+def enroll_policies(conn, policies):
+    policies = list(policies)
+    numbers = [p['policy_number'] for p in policies]
+    if len(set(numbers)) != len(numbers):
+        raise ValueError("Duplicate policy numbers in batch")
+    existing = existing_policy_numbers(conn, numbers)
+    if existing:
+        raise ValueError(f"Policies already exist: {', '.join(sorted(existing)[:10])}")
+
+    policy_ids = next_ids(conn, 'policies', len(policies))
+    display_ids = unique_ids(conn, 'policies', 'P', len(policies))
+    rows = []
+    for policy_id, display_id, policy in zip(policy_ids, display_ids, policies):
+        row = dict(policy, id=policy_id, display_id=display_id, status='Active')
+        row['policy_holder_id'] = row.get('policy_holder_id') or row['customer_id']
+        row['start_date'] = str(schedule.to_day(row['start_date']))
+        row['end_date'] = str(schedule.to_day(row['end_date']))
+        rows.append(tuple(row.get(column) for column in POLICY_COLUMNS))
+    conn.executemany(INSERT_POLICY, rows)
+
+    conn.executemany(INSERT_PREMIUM, premium_rows(policy_ids, policies))
+
+    # Back-dated policies may already have overdue premiums
+    statuses.recompute_policy_statuses(conn, policy_ids=policy_ids)
+    return policy_ids
+
+
+def enroll_policy(conn, policy):
+    return enroll_policies(conn, [policy])[0]
+
+
+# One customer of the agent, keyed like the customers columns (id,
+# display_id, agent_id and created_at are filled in). Returns the new customer id.
+def enroll_customer(conn, agent_id, customer):
+    customer_id = next_ids(conn, 'customers', 1)[0]
+    row = dict(customer, id=customer_id, display_id=unique_ids(conn, 'customers', 'C', 1)[0],
+               agent_id=agent_id, created_at=date.today())
+    conn.execute(INSERT_CUSTOMER, tuple(row.get(column) for column in CUSTOMER_COLUMNS))
+    return customer_id
+
+
+# The external id (C.../P...) shown for a customer or policy
+def display_id(conn, table, row_id):
+    return conn.execute(f"SELECT display_id FROM {table} WHERE id=?", (row_id,)).fetchone()[0]
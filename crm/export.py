@@ -0,0 +1,182 @@
+"""Streaming export of an agent's customers, policies and premiums.
+
+    python -m crm.export AGENT_ID [--format csv|csv.gz|parquet|txt] [--dir DIR]
+
+Rows are read from a cursor in chunks and appended to the output files as
+they arrive, so memory stays flat however large the agent's book is.
+Files go to CRM_EXPORT_DIR (default data/exports) with a timestamp suffix.
+The app runs exports as background jobs (crm.jobs).
+"""
+import argparse
+import gzip
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from crm import db, queries
+
+EXPORT_DIR = os.environ.get('CRM_EXPORT_DIR', os.path.join('data', 'exports'))
+FORMATS = ('csv', 'csv.gz', 'parquet', 'txt')
+CHUNK_SIZE = 20000
+
+TABLES = (
+    ('customers', queries.EXPORT_CUSTOMERS, queries.EXPORT_CUSTOMERS_COUNT),
+    ('policies', queries.EXPORT_POLICIES, queries.EXPORT_POLICIES_COUNT),
+    ('premiums', queries.EXPORT_PREMIUMS, queries.EXPORT_PREMIUMS_COUNT),
+)
+
+
+def _chunks(conn, query, params, chunksize):
+    cursor = db.stream(conn, query, params)
+    try:
+        columns = [d[0] for d in cursor.description]
+        rows = cursor.fetchmany(chunksize)
+        # The first chunk is yielded even when empty so every file gets its header
+        yield pd.DataFrame(rows, columns=columns)
+        while rows:
+            rows = cursor.fetchmany(chunksize)
+            if rows:
+                yield pd.DataFrame(rows, columns=columns)
+    finally:
+        cursor.close()
+
+
+class _CsvWriter:
+    def __init__(self, path, compress=False):
+        if compress:
+            self.file = gzip.open(path, 'wt', encoding='utf-8', newline='')
+        else:
+            self.file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self.header = True
+
+    def write(self, frame):
+        frame.to_csv(self.file, index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+# Arrow type of a column declared `declared`, by SQLite's affinity rules; columns
+# the query adds (customer_name, ...) and anything else are text
+def _arrow_type(pa, declared):
+    declared = (declared or '').upper()
+    if 'INT' in declared:
+        return pa.int64()
+    if any(name in declared for name in ('REAL', 'FLOA', 'DOUB', 'NUMERIC', 'DECIMAL')):
+        return pa.float64()
+    if 'TIMESTAMP' in declared or 'DATETIME' in declared:
+        return pa.timestamp('us')
+    return pa.string()
+
+
+class _ParquetWriter:
+    # declared: {column: declared type} of the exported table (db.columns)
+    def __init__(self, path, declared):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.pa, self.pq, self.path = pa, pq, path
+        self.declared = declared
+        self.writer = None
+        self.schema = None
+
+    def write(self, frame):
+        pa = self.pa
+        if self.writer is None:
+            # From the declared types, not the first chunk: a column that is
+            # NULL all through it (parent_id, ...) still gets its real type
+            self.schema = pa.schema([(column, _arrow_type(pa, self.declared.get(column)))
+                                     for column in frame.columns])
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        timestamps = [field.name for field in self.schema if pa.types.is_timestamp(field.type)]
+        if timestamps:
+            frame = frame.assign(**{column: pd.to_datetime(frame[column], format='ISO8601')
+                                    for column in timestamps})
+        self.writer.write_table(pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class _TxtWriter:
+    def __init__(self, path, title):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.file.write(f"=== {title} ===\n\n")
+        self.header = True
+
+    def write(self, frame):
+        # Column widths are per chunk; the full frame is never rendered at once
+        if len(frame) or self.header:
+            self.file.write(frame.to_string(index=False, header=self.header))
+            self.file.write("\n")
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+def _writer(path, fmt, title, declared):
+    if fmt == 'csv':
+        return _CsvWriter(path)
+    if fmt == 'csv.gz':
+        return _CsvWriter(path, compress=True)
+    if fmt == 'parquet':
+        return _ParquetWriter(path, declared)
+    return _TxtWriter(path, title)
+
+
+# Export one agent's data, one file per table. `progress(done, total)` is
+# called after every chunk with row counts. Returns the written file paths.
+def export_agent(agent_id, fmt='csv', directory=None, chunksize=CHUNK_SIZE, progress=None):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    directory = directory or EXPORT_DIR
+    os.makedirs(directory, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    files = []
+    with db.connection() as conn:
+        total = sum(conn.execute(count, (agent_id,)).fetchone()[0] for _, _, count in TABLES)
+        done = 0
+        if progress:
+            progress(done, total)
+        for table, query, _ in TABLES:
+            path = os.path.join(directory, f"{table}_export_{timestamp}.{fmt}")
+            declared = db.columns(conn, table)
+            writer = _writer(path, fmt, table.title(), declared)
+            try:
+                for frame in _chunks(conn, query, (agent_id,), chunksize):
+                    writer.write(frame)
+                    done += len(frame)
+                    if progress:
+                        progress(done, total)
+            finally:
+                writer.close()
+            files.append(path)
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streaming export of one agent's data")
+    parser.add_argument("agent_id")
+    parser.add_argument("--format", choices=FORMATS, default='csv')
+    parser.add_argument("--dir", default=None, help=f"output directory (default {EXPORT_DIR})")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    def report(done, total):
+        print(f"\r{done}/{total} rows", end="", flush=True)
+
+    files = export_agent(args.agent_id, args.format, args.dir, args.chunksize, progress=report)
+    print()
+    for path in files:
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+from crm import cache, db, queries
+
+
+# An agent's family structure and policies, loaded with two queries and
+# grouped by the family's primary customer
+class AgentFamilies:
+    def __init__(self, customers, policies):
+        self.primaries = customers[customers['parent_id'].isna()]
+        self._customers = customers
+        self._policies = policies.drop(columns='family_id')
+        # Row positions per family; frames are only sliced for the families rendered
+        self._member_rows = customers.groupby('parent_id', sort=False).indices
+        self._policy_rows = policies.groupby('family_id', sort=False).indices
+
+    def members(self, primary_id):
+        return self._customers.iloc[self._member_rows.get(primary_id, [])]
+
+    # Policies of the primary customer and every family member
+    def policies(self, primary_id):
+        return self._policies.iloc[self._policy_rows.get(primary_id, [])].reset_index(drop=True)
+
+
+def load_families(conn, agent_id):
+    customers = db.read_sql(conn, queries.FAMILIES, (agent_id,))
+    policies = db.read_sql(conn, queries.AGENT_FAMILY_POLICIES, (agent_id,))
+    return AgentFamilies(customers, policies)
+
+
+# Cached per agent until the TTL expires or a write invalidates the agent.
+# Shared - callers must not modify the frames in place.
+def agent_families(agent_id):
+    def load():
+        with db.connection() as conn:
+            return load_families(conn, agent_id)
+    return cache.results.get(agent_id, 'agent_families', load)
@@ -0,0 +1,354 @@
+"""Bulk import of customers and policies from CSV or Excel files.
+
+    python -m crm.importer customers AGENT_ID customers.csv [--rejects rejected.csv]
+    python -m crm.importer policies AGENT_ID policies.xlsx [--chunksize 20000]
+
+The file is read in chunks; each chunk is validated column-wise, checked
+for duplicates (within the file and against the database) and written
+with executemany in its own transaction, premium schedules included.
+Rows that fail are written to the rejected-rows report with the file row
+number and the reason; re-running a partly imported file rejects the rows
+that already made it in as duplicates.
+
+Customer columns: name, pan, aadhar, phone, email, income_range,
+parent_pan, relationship (family members reference a primary imported
+earlier in the file or already in the agent's book).
+Policy columns: customer_pan, policy_holder_pan, policy_number,
+premium_amount, frequency, type, provider, coverage_type, start_date,
+end_date, nominee_name, nominee_pan, nominee_aadhar, beneficiary_name,
+beneficiary_pan, beneficiary_aadhar, paid_until (premiums due on or before
+it are recorded as paid).
+"""
+import argparse
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from crm import cache, db, enrollment, queries, schedule, statuses
+
+CHUNK_SIZE = 20000
+
+INCOME_RANGES = ("Below ₹5L", "₹5L-₹10L", "₹10L-₹20L", "Above ₹20L")
+RELATIONSHIPS = ("Spouse", "Child", "Parent", "Sibling", "Other")
+FREQUENCIES = tuple(schedule.FREQUENCY_MONTHS)
+TYPES = ("Life Insurance", "Health Insurance", "Motor Insurance", "Home Insurance", "Travel Insurance")
+COVERAGE_TYPES = ("Individual", "Family")
+
+CUSTOMER_COLUMNS = ('name', 'pan', 'aadhar', 'phone', 'email', 'income_range', 'parent_pan', 'relationship')
+POLICY_COLUMNS = ('customer_pan', 'policy_holder_pan', 'policy_number', 'premium_amount', 'frequency', 'type',
+                  'provider', 'coverage_type', 'start_date', 'end_date', 'nominee_name', 'nominee_pan',
+                  'nominee_aadhar', 'beneficiary_name', 'beneficiary_pan', 'beneficiary_aadhar', 'paid_until')
+
+# Premiums of an imported policy that were already paid before the import
+_PAY_UNTIL = '''
+    UPDATE premiums SET status='Paid', paid_date=due_date
+    WHERE policy_id=? AND status='Pending' AND due_date <= ?
+'''
+
+_PAN = r'[A-Z]{5}[0-9]{4}[A-Z]'
+_AADHAR = r'[2-9][0-9]{11}'
+
+
+def _read_excel(source, chunksize):
+    try:
+        import openpyxl
+    except ImportError:
+        raise RuntimeError("Excel import needs openpyxl (pip install openpyxl)")
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(value).strip() if value is not None else "" for value in next(rows, ())]
+        batch = []
+        for row in rows:
+            batch.append(["" if value is None else value.date().isoformat() if isinstance(value, datetime)
+                          else str(value) for value in row])
+            if len(batch) == chunksize:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+# The file as DataFrames of up to `chunksize` rows, every cell a stripped
+# string ("" when empty), with a 'row' column holding the file row number
+def read_chunks(source, chunksize=CHUNK_SIZE, filename=None):
+    filename = filename or (source if isinstance(source, str) else getattr(source, 'name', ''))
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        chunks = _read_excel(source, chunksize)
+    else:
+        chunks = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunksize,
+                             encoding='utf-8-sig', skipinitialspace=True)
+    first_row = 2  # row 1 is the header
+    for chunk in chunks:
+        chunk.columns = [str(c).strip().lower() for c in chunk.columns]
+        chunk = chunk.apply(lambda column: column.astype(str).str.strip())
+        chunk.insert(0, 'row', np.arange(first_row, first_row + len(chunk)))
+        first_row += len(chunk)
+        yield chunk
+
+
+def _missing_columns(frame, columns):
+    return [c for c in columns if c not in frame.columns]
+
+
+# Adds reasons for `bad` rows; a row keeps its first reason
+def _reject(reasons, bad, reason):
+    reasons[bad & (reasons == "")] = reason
+
+
+def _valid_pan(values):
+    return values.str.upper().str.fullmatch(_PAN)
+
+
+def _valid_aadhar(values):
+    return values.str.replace(r'[\s-]', '', regex=True).str.fullmatch(_AADHAR)
+
+
+def _dates(values):
+    return pd.to_datetime(values, errors='coerce', format='ISO8601')
+
+
+def _iso_dates(values):
+    return _dates(values).dt.strftime('%Y-%m-%d')
+
+
+# Empty strings as None (NULL). pandas' str columns turn None into NaN,
+# which sqlite3 stores as NULL but psycopg as the text 'NaN'.
+def _nullable(values):
+    return values.astype(object).replace("", None)
+
+
+def _existing(conn, table, column, values):
+    query = queries.existing_values_query(table, column)
+    return {row[0] for row in conn.execute(query, (db.array(values),))}
+
+
+def _agent_customer_ids(conn, agent_id, pans):
+    return dict(conn.execute(queries.AGENT_PANS, (db.array(pans), agent_id)).fetchall())
+
+
+# Reasons per row ("" = valid) from the column checks alone
+def validate_customers(frame):
+    reasons = pd.Series("", index=frame.index)
+    for column in ('name', 'pan', 'aadhar', 'phone', 'income_range'):
+        _reject(reasons, frame[column] == "", f"missing {column}")
+    _reject(reasons, ~_valid_pan(frame['pan']), "invalid PAN")
+    _reject(reasons, ~_valid_aadhar(frame['aadhar']), "invalid Aadhar")
+    _reject(reasons, ~frame['income_range'].isin(INCOME_RANGES), "unknown income_range")
+    members = frame['parent_pan'] != ""
+    _reject(reasons, members & ~_valid_pan(frame['parent_pan']), "invalid parent_pan")
+    _reject(reasons, members & ~frame['relationship'].isin(RELATIONSHIPS), "unknown relationship")
+    return reasons
+
+
+def validate_policies(frame):
+    reasons = pd.Series("", index=frame.index)
+    for column in ('customer_pan', 'policy_number', 'premium_amount', 'frequency', 'type', 'provider',
+                   'coverage_type', 'start_date', 'end_date', 'nominee_name'):
+        _reject(reasons, frame[column] == "", f"missing {column}")
+    _reject(reasons, ~_valid_pan(frame['customer_pan']), "invalid customer_pan")
+    for column in ('policy_holder_pan', 'nominee_pan', 'beneficiary_pan'):
+        _reject(reasons, (frame[column] != "") & ~_valid_pan(frame[column]), f"invalid {column}")
+    for column in ('nominee_aadhar', 'beneficiary_aadhar'):
+        _reject(reasons, (frame[column] != "") & ~_valid_aadhar(frame[column]), f"invalid {column}")
+    amount = pd.to_numeric(frame['premium_amount'], errors='coerce')
+    _reject(reasons, ~(amount > 0), "premium_amount must be a positive number")
+    _reject(reasons, ~frame['frequency'].isin(FREQUENCIES), "unknown frequency")
+    _reject(reasons, ~frame['type'].isin(TYPES), "unknown type")
+    _reject(reasons, ~frame['coverage_type'].isin(COVERAGE_TYPES), "unknown coverage_type")
+    start = _dates(frame['start_date'])
+    end = _dates(frame['end_date'])
+    _reject(reasons, start.isna(), "invalid start_date (use YYYY-MM-DD)")
+    _reject(reasons, end.isna(), "invalid end_date (use YYYY-MM-DD)")
+    _reject(reasons, ~(end > start), "end_date must be after start_date")
+    paid_until = frame['paid_until'] != ""
+    _reject(reasons, paid_until & _dates(frame['paid_until']).isna(), "invalid paid_until (use YYYY-MM-DD)")
+    return reasons
+
+
+# Appends rejected rows with their reason to a CSV report
+class _Rejects:
+    def __init__(self, target):
+        self.target = target
+        self.file = None
+        self.count = 0
+
+    def write(self, frame, reasons):
+        if frame.empty:
+            return
+        if self.file is None:
+            self.file = open(self.target, 'w', encoding='utf-8-sig', newline='') \
+                if isinstance(self.target, str) else self.target
+            header = True
+        else:
+            header = False
+        frame.assign(reason=reasons).to_csv(self.file, index=False, header=header)
+        self.count += len(frame)
+
+    def close(self):
+        if self.file is not None and isinstance(self.target, str):
+            self.file.close()
+
+
+def _import_customer_chunk(conn, agent_id, frame, seen):
+    reasons = validate_customers(frame)
+    frame = frame.assign(pan=frame['pan'].str.upper(), parent_pan=frame['parent_pan'].str.upper(),
+                         aadhar=frame['aadhar'].str.replace(r'[\s-]', '', regex=True))
+
+    # Duplicates within the file, then against every customer in the database
+    pans = frame['pan']
+    _reject(reasons, pans.isin(seen) | pans.duplicated(), "duplicate PAN in file")
+    _reject(reasons, pans.isin(_existing(conn, 'customers', 'pan', pans[reasons == ""])), "PAN already exists")
+
+    # Family members need a primary of this agent, stored already or imported
+    # with them; rejecting a primary also rejects its members
+    ok = reasons == ""
+    ids = pd.Series(enrollment.next_ids(conn, 'customers', len(frame)), index=frame.index)
+    stored = _agent_customer_ids(conn, agent_id, set(frame.loc[ok, 'parent_pan']) - set(pans[ok]) - {""})
+    _reject(reasons, ok & (frame['parent_pan'] == pans), "customer cannot be their own parent")
+    while True:
+        ok = reasons == ""
+        parent_ids = frame['parent_pan'].map({**stored, **dict(zip(pans[ok], ids[ok]))}).fillna("")
+        orphans = ok & (frame['parent_pan'] != "") & (parent_ids == "")
+        if not orphans.any():
+            break
+        _reject(reasons, orphans, "unknown parent_pan")
+    seen.update(pans[ok])
+
+    today = datetime.now().date()
+    valid = frame[ok]
+    conn.executemany(enrollment.INSERT_CUSTOMER, zip(
+        ids[ok], enrollment.unique_ids(conn, 'customers', 'C', len(valid)), [agent_id] * len(valid),
+        valid['pan'], valid['aadhar'], valid['name'], valid['phone'],
+        _nullable(valid['email']), valid['income_range'], _nullable(parent_ids[ok]),
+        _nullable(valid['relationship'].where(valid['parent_pan'] != "", "")), [today] * len(valid)))
+    return len(valid), reasons
+
+
+def _import_policy_chunk(conn, agent_id, frame, seen):
+    reasons = validate_policies(frame)
+    upper = {c: frame[c].str.upper() for c in ('customer_pan', 'policy_holder_pan', 'nominee_pan', 'beneficiary_pan')}
+    frame = frame.assign(**upper)
+
+    numbers = frame['policy_number']
+    _reject(reasons, numbers.isin(seen) | numbers.duplicated(), "duplicate policy_number in file")
+    _reject(reasons, numbers.isin(_existing(conn, 'policies', 'policy_number', numbers[reasons == ""])),
+            "policy_number already exists")
+
+    # Customers and policy holders must belong to this agent
+    pans = set(frame.loc[reasons == "", 'customer_pan']) | set(frame.loc[reasons == "", 'policy_holder_pan'])
+    customer_ids = _agent_customer_ids(conn, agent_id, pans - {""})
+    customer = frame['customer_pan'].map(customer_ids)
+    holder = frame['policy_holder_pan'].map(customer_ids).where(frame['policy_holder_pan'] != "", customer)
+    _reject(reasons, customer.isna(), "customer_pan is not one of the agent's customers")
+    _reject(reasons, holder.isna(), "policy_holder_pan is not one of the agent's customers")
+    ok = reasons == ""
+    seen.update(numbers[ok])
+
+    valid = frame[ok].assign(customer_id=customer[ok].astype('int64'), policy_holder_id=holder[ok].astype('int64'),
+                             premium_amount=pd.to_numeric(frame.loc[ok, 'premium_amount']),
+                             start_date=_iso_dates(frame.loc[ok, 'start_date']),
+                             end_date=_iso_dates(frame.loc[ok, 'end_date']))
+    for column in ('nominee_aadhar', 'beneficiary_aadhar'):
+        valid[column] = valid[column].str.replace(r'[\s-]', '', regex=True)
+    columns = [c for c in enrollment.POLICY_COLUMNS if c in valid.columns]
+    policies = _nullable(valid[columns]).to_dict('records')
+    policy_ids = enrollment.enroll_policies(conn, policies)
+
+    # Premiums paid before the book moved here; statuses follow the payments
+    paid = (valid['paid_until'] != "").to_numpy()
+    if paid.any():
+        paid_ids = [policy_id for policy_id, is_paid in zip(policy_ids, paid) if is_paid]
+        conn.executemany(_PAY_UNTIL, zip(paid_ids, _iso_dates(valid.loc[paid, 'paid_until'])))
+        statuses.recompute_policy_statuses(conn, policy_ids=paid_ids)
+    return len(policies), reasons
+
+
+def _kind(kind):
+    if kind == 'customers':
+        return CUSTOMER_COLUMNS, _import_customer_chunk
+    if kind == 'policies':
+        return POLICY_COLUMNS, _import_policy_chunk
+    raise ValueError(f"Unknown import kind: {kind}")
+
+
+# Streams `source` (a path or file object) into the agent's book. `kind` is
+# 'customers' or 'policies'; `rejects` a path or text file for the report.
+# `progress(summary)` is called after every chunk.
+# Returns {'rows', 'imported', 'rejected'}.
+def import_file(kind, agent_id, source, rejects=None, chunksize=CHUNK_SIZE, filename=None, progress=None):
+    columns, import_chunk = _kind(kind)
+    report = _Rejects(rejects) if rejects is not None else None
+    summary = {'rows': 0, 'imported': 0, 'rejected': 0}
+    seen = set()
+    try:
+        for chunk in read_chunks(source, chunksize, filename):
+            missing = _missing_columns(chunk, ('name', 'pan') if kind == 'customers' else ('customer_pan', 'policy_number'))
+            if missing:
+                raise ValueError(f"Missing required columns: {', '.join(missing)}")
+            # Optional columns may be left out of the file entirely
+            for column in _missing_columns(chunk, columns):
+                chunk[column] = ""
+
+            with db.transaction() as conn:
+                imported, reasons = import_chunk(conn, agent_id, chunk, seen)
+            rejected = reasons != ""
+            if report is not None:
+                report.write(chunk[rejected], reasons[rejected])
+            summary['rows'] += len(chunk)
+            summary['imported'] += imported
+            summary['rejected'] += int(rejected.sum())
+            if progress:
+                progress(summary)
+    finally:
+        if report is not None:
+            report.close()
+        cache.invalidate(agent_id)
+    return summary
+
+
+# Imports rows given as dicts keyed by the import columns (the JSON API's
+# batches) with the same checks and writes as a file, in one transaction.
+# Returns the reason each row was rejected, in order ("" = imported).
+def import_rows(kind, agent_id, rows):
+    columns, import_chunk = _kind(kind)
+    if not rows:
+        return []
+    frame = pd.DataFrame([["" if row.get(column) is None else str(row[column]).strip() for column in columns]
+                          for row in rows], columns=list(columns))
+    frame.insert(0, 'row', np.arange(1, len(frame) + 1))
+    try:
+        with db.transaction() as conn:
+            _, reasons = import_chunk(conn, agent_id, frame, set())
+    finally:
+        cache.invalidate(agent_id)
+    return reasons.tolist()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import of customers or policies for one agent")
+    parser.add_argument("kind", choices=('customers', 'policies'))
+    parser.add_argument("agent_id")
+    parser.add_argument("path", help="CSV or Excel (.xlsx) file")
+    parser.add_argument("--rejects", default=None, help="rejected-rows report (default <path>.rejected.csv)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    rejects = args.rejects or os.path.splitext(args.path)[0] + ".rejected.csv"
+
+    def report(summary):
+        print(f"\r{summary['rows']} rows read, {summary['imported']} imported, {summary['rejected']} rejected",
+              end="", flush=True)
+
+    summary = import_file(args.kind, args.agent_id, args.path, rejects, args.chunksize, progress=report)
+    print()
+    if summary['rejected']:
+        print(f"rejected rows: {rejects}")
+
+
+if __name__ == "__main__":
+    main()
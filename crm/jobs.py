@@ -0,0 +1,259 @@
+"""Background jobs for long-running agent actions.
+
+    python -m crm.jobs [--agent AGENT_ID] [--limit 20]
+
+Exports and the "Update All Policy Statuses" maintenance run on a small
+thread pool (CRM_JOB_WORKERS, default 2) instead of inside the Streamlit
+script. Every job is a row of the jobs table holding its state and
+progress, which the pages poll. Submitting a job while the same kind of
+job is still queued or running for the agent returns that job instead;
+a unique index on the active jobs settles racing submits, from any
+process. Each job records the process that runs it (host:pid), which
+refreshes the heartbeat of its active jobs every CRM_JOB_HEARTBEAT
+seconds (default 30). A job is failed as interrupted only once its
+process is gone: a pid on this host that no longer runs, or elsewhere no
+heartbeat for CRM_JOB_STALE_AFTER seconds (default 120).
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from crm import cache, db, export, statuses
+
+log = logging.getLogger(__name__)
+
+WORKERS = int(os.environ.get('CRM_JOB_WORKERS', 2))
+# Progress is written to the jobs table at most this often (seconds)
+PROGRESS_INTERVAL = 0.5
+# Finished jobs kept per agent and kind
+HISTORY = 20
+ACTIVE = ('queued', 'running')
+HEARTBEAT_INTERVAL = float(os.environ.get('CRM_JOB_HEARTBEAT', 30))
+STALE_AFTER = float(os.environ.get('CRM_JOB_STALE_AFTER', 120))
+HOST = socket.gethostname()
+OWNER = f"{HOST}:{os.getpid()}"
+
+_COLUMNS = ("id, kind, agent_id, params, status, done, total, result, error, created_at, started_at, finished_at, "
+            "owner, heartbeat_at")
+_ACTIVE_JOB = f'''
+    SELECT {_COLUMNS} FROM jobs
+    WHERE agent_id=? AND kind=? AND status IN ('queued', 'running')
+    ORDER BY id DESC LIMIT 1
+'''
+# Inserts nothing, and returns no id, while the agent has an active job of the kind (idx_jobs_active)
+_INSERT_JOB = '''
+    INSERT INTO jobs (kind, agent_id, params, status, created_at, owner, heartbeat_at)
+    VALUES (?, ?, ?, 'queued', ?, ?, ?)
+    ON CONFLICT (agent_id, kind) WHERE status IN ('queued', 'running') DO NOTHING
+    RETURNING id
+'''
+_LATEST_JOB = f"SELECT {_COLUMNS} FROM jobs WHERE agent_id=? AND kind=? ORDER BY id DESC LIMIT 1"
+_PRUNE = '''
+    DELETE FROM jobs WHERE agent_id=? AND kind=? AND status NOT IN ('queued', 'running')
+      AND id NOT IN (SELECT id FROM jobs WHERE agent_id=? AND kind=? ORDER BY id DESC LIMIT ?)
+'''
+
+
+def _export(agent_id, params, progress):
+    files = export.export_agent(agent_id, params.get('format', 'csv'), params.get('directory'), progress=progress)
+    return {'files': files}
+
+
+def _update_statuses(agent_id, params, progress):
+    progress(0, 1)
+    with db.transaction() as conn:
+        transitions = statuses.recompute_policy_statuses(conn, agent_id=agent_id)
+    cache.invalidate(agent_id)
+    return {'policies': sum(transitions.values()), 'summary': statuses.describe(transitions)}
+
+
+# Job kinds: fn(agent_id, params, progress(done, total)) -> JSON-able result
+HANDLERS = {
+    'export': _export,
+    'update_statuses': _update_statuses,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_futures = {}
+
+
+# None when it cannot be told (Windows: os.kill would end the process)
+def _alive(pid):
+    if os.name == 'nt':
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Whether an active job's process is gone: by its pid on this host, by its
+# heartbeat elsewhere. Jobs from before owners were recorded have neither.
+def _orphaned(owner, stale):
+    if owner == OWNER:
+        return False
+    host, _, pid = (owner or '').rpartition(':')
+    if host == HOST and pid.isdigit():
+        alive = _alive(int(pid))
+        if alive is not None:
+            return not alive
+    return bool(stale)
+
+
+# Fail the active jobs (all, or the agent's of one kind) whose process is gone
+def _fail_orphans(conn, agent_id=None, kind=None):
+    now = datetime.now()
+    where, params = ("AND agent_id=? AND kind=?", (agent_id, kind)) if kind else ("", ())
+    rows = conn.execute(f'''SELECT id, owner, heartbeat_at IS NULL OR heartbeat_at < ? FROM jobs
+                            WHERE status IN ('queued', 'running') {where}''',
+                        (now - timedelta(seconds=STALE_AFTER), *params)).fetchall()
+    orphans = [job_id for job_id, owner, stale in rows if _orphaned(owner, stale)]
+    if orphans:
+        conn.executemany('''UPDATE jobs SET status='failed', error='interrupted by a restart', finished_at=?
+                            WHERE id=?''', [(now, job_id) for job_id in orphans])
+    return orphans
+
+
+def _heartbeat():
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        try:
+            with db.transaction() as conn:
+                conn.execute("UPDATE jobs SET heartbeat_at=? WHERE owner=? AND status IN ('queued', 'running')",
+                             (datetime.now(), OWNER))
+        except Exception:
+            log.exception("could not write the job heartbeat")
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            with db.transaction() as conn:
+                _fail_orphans(conn)
+            threading.Thread(target=_heartbeat, name="crm-job-heartbeat", daemon=True).start()
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="crm-job")
+        return _executor
+
+
+def _row(cursor):
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    job = dict(zip([d[0] for d in cursor.description], row))
+    job['params'] = json.loads(job['params'] or '{}')
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def get(job_id):
+    with db.connection() as conn:
+        return _row(conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id=?", (job_id,)))
+
+
+# The agent's most recent job of this kind, finished or not
+def latest(agent_id, kind):
+    _pool()
+    with db.connection() as conn:
+        return _row(conn.execute(_LATEST_JOB, (agent_id, kind)))
+
+
+def fraction(job):
+    return min(job['done'] / job['total'], 1.0) if job['total'] else 0.0
+
+
+# Queue a job unless the agent already has one of this kind queued or
+# running; returns the job row either way
+def submit(kind, agent_id, params=None):
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    pool = _pool()
+    with db.transaction() as conn:
+        # An active job left by a process that is gone would block the kind
+        _fail_orphans(conn, agent_id, kind)
+        conn.execute(_PRUNE, (agent_id, kind, agent_id, kind, HISTORY))
+        now = datetime.now()
+        while True:
+            inserted = conn.execute(_INSERT_JOB, (kind, agent_id, json.dumps(params or {}), now, OWNER, now)).fetchall()
+            if inserted:
+                break
+            # Another submit got there first; its job may even be done by now
+            job = _row(conn.execute(_ACTIVE_JOB, (agent_id, kind)))
+            if job is not None:
+                return job
+        job_id = inserted[0][0]
+        job = _row(conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id=?", (job_id,)))
+
+    future = _futures[job_id] = pool.submit(_run, job_id, kind, agent_id, job['params'])
+    future.add_done_callback(lambda _: _futures.pop(job_id, None))
+    return job
+
+
+def _update(job_id, **values):
+    with db.transaction() as conn:
+        conn.execute(f"UPDATE jobs SET {', '.join(f'{k}=?' for k in values)} WHERE id=?",
+                     (*values.values(), job_id))
+
+
+def _run(job_id, kind, agent_id, params):
+    counts = {'done': 0, 'total': 0, 'written': 0.0}
+
+    def progress(done, total):
+        counts['done'], counts['total'] = done, total
+        now = time.monotonic()
+        if now - counts['written'] >= PROGRESS_INTERVAL:
+            counts['written'] = now
+            _update(job_id, done=done, total=total)
+
+    # Any failure, the status writes included (e.g. "database is locked"),
+    # marks the job failed; a job left queued would block its kind for the agent
+    try:
+        _update(job_id, status='running', started_at=datetime.now())
+        result = HANDLERS[kind](agent_id, params, progress)
+        total = counts['total'] or 1
+        _update(job_id, status='done', done=total, total=total, result=json.dumps(result, default=str),
+                finished_at=datetime.now())
+    except Exception as e:
+        log.error("job %s (%s for %s) failed", job_id, kind, agent_id, exc_info=True)
+        try:
+            _update(job_id, status='failed', error=str(e), finished_at=datetime.now())
+        except Exception:
+            log.error("could not mark job %s failed", job_id, exc_info=True)
+
+
+# Block until the job finishes (CLI, benchmarks); returns its final row
+def wait(job_id, timeout=None):
+    future = _futures.get(job_id)
+    if future is not None:
+        future.result(timeout)
+    return get(job_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recent background jobs")
+    parser.add_argument("--agent", help="only this agent's jobs")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    db.init_db()
+    where, params = ("WHERE agent_id=?", [args.agent]) if args.agent else ("", [])
+    with db.connection() as conn:
+        rows = conn.execute(f"SELECT id, kind, agent_id, status, done, total, created_at, finished_at, error "
+                            f"FROM jobs {where} ORDER BY id DESC LIMIT ?", params + [args.limit]).fetchall()
+    for job_id, kind, agent_id, status, done, total, created_at, finished_at, error in rows:
+        print(f"{job_id:>6} {kind:<16} {agent_id:<10} {status:<8} {done}/{total} "
+              f"{created_at} -> {finished_at or ''} {error or ''}")
+
+
+if __name__ == "__main__":
+    main()
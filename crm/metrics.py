@@ -0,0 +1,28 @@
+from crm import cache, dates, db, queries, rollups
+
+
+# Dashboard counts for one agent: its row of the rollup table
+def load_dashboard_metrics(conn, agent_id):
+    return rollups.agent_counts(conn, agent_id)
+
+
+def load_upcoming_premiums(conn, agent_id):
+    upcoming = db.read_sql(conn, queries.DASHBOARD_UPCOMING_PREMIUMS,
+                           (agent_id, dates.today(), dates.days_from_today(30)))
+    return dates.parse(upcoming)
+
+
+# Cached per agent until the TTL expires or a write invalidates the agent
+def dashboard_metrics(agent_id):
+    def load():
+        with db.connection() as conn:
+            return load_dashboard_metrics(conn, agent_id)
+    return cache.results.get(agent_id, 'dashboard_metrics', load)
+
+
+# Shared DataFrame - callers must not modify it in place
+def upcoming_premiums(agent_id):
+    def load():
+        with db.connection() as conn:
+            return load_upcoming_premiums(conn, agent_id)
+    return cache.results.get(agent_id, 'dashboard_upcoming_premiums', load)
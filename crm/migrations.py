@@ -0,0 +1,849 @@
+from datetime import datetime
+
+# Nominee and beneficiary names of every policy of one customer, for the search index
+_NOMINEES = '''(SELECT group_concat(coalesce(nominee_name, '') || ' ' || coalesce(beneficiary_name, ''), ' ')
+                FROM policies WHERE customer_id={customer})'''
+
+# Trigger bodies for the v5 rollups. `sign` is '+' to add a row's share and
+# '-' to take it away; `row` is 'new' or 'old'.
+_ADD_COUNTS = "ON CONFLICT (agent_id) DO UPDATE SET " + ", ".join(
+    f"{column}={column}+excluded.{column}"
+    for column in ('customers', 'family_members', 'policies', 'active', 'lapsed', 'completed', 'cancelled'))
+_ADD_MONTHS = ("ON CONFLICT (agent_id, due_month) DO UPDATE SET "
+               "premiums=premiums+excluded.premiums, amount=amount+excluded.amount")
+
+
+def _customer_counts(sign, row):
+    return f'''INSERT INTO agent_rollups (agent_id, customers, family_members)
+                VALUES ({row}.agent_id, {sign}1, {sign}({row}.parent_id IS NOT NULL)) {_ADD_COUNTS};'''
+
+
+def _policy_counts(sign, row):
+    return f'''INSERT INTO agent_rollups (agent_id, policies, active, lapsed, completed, cancelled)
+                SELECT agent_id, {sign}1, {sign}({row}.status IS 'Active'), {sign}({row}.status IS 'Lapsed'),
+                       {sign}({row}.status IS 'Completed'), {sign}({row}.status IS 'Cancelled')
+                FROM customers WHERE id={row}.customer_id {_ADD_COUNTS};'''
+
+
+# Pending premiums of a policy that is not cancelled
+def _policy_months(sign, row):
+    return f'''INSERT INTO agent_pending_months (agent_id, due_month, premiums, amount)
+                SELECT c.agent_id, substr(pr.due_date, 1, 7), {sign}COUNT(*), {sign}SUM(pr.amount)
+                FROM premiums pr JOIN customers c ON c.id={row}.customer_id
+                WHERE pr.policy_id={row}.id AND pr.status='Pending' AND {row}.status IS NOT 'Cancelled'
+                GROUP BY 1, 2 {_ADD_MONTHS};'''
+
+
+# Every policy and pending premium of a customer, when it changes agent
+def _customer_book(sign, row):
+    return f'''INSERT INTO agent_rollups (agent_id, policies, active, lapsed, completed, cancelled)
+                SELECT {row}.agent_id, {sign}COUNT(*), {sign}SUM(status IS 'Active'), {sign}SUM(status IS 'Lapsed'),
+                       {sign}SUM(status IS 'Completed'), {sign}SUM(status IS 'Cancelled')
+                FROM policies WHERE customer_id={row}.id HAVING COUNT(*) > 0 {_ADD_COUNTS};
+                INSERT INTO agent_pending_months (agent_id, due_month, premiums, amount)
+                SELECT {row}.agent_id, substr(pr.due_date, 1, 7), {sign}COUNT(*), {sign}SUM(pr.amount)
+                FROM policies p JOIN premiums pr ON pr.policy_id=p.id
+                WHERE p.customer_id={row}.id AND p.status IS NOT 'Cancelled' AND pr.status='Pending'
+                GROUP BY 2 {_ADD_MONTHS};'''
+
+
+# One pending premium, if its policy is not cancelled
+def _premium_month(sign, row):
+    return f'''INSERT INTO agent_pending_months (agent_id, due_month, premiums, amount)
+                SELECT c.agent_id, substr({row}.due_date, 1, 7), {sign}1, {sign}{row}.amount
+                FROM policies p JOIN customers c ON c.id=p.customer_id
+                WHERE p.id={row}.policy_id AND {row}.status='Pending' AND p.status IS NOT 'Cancelled'
+                {_ADD_MONTHS};'''
+
+
+_PREMIUM_COUNTER_ADD = '''INSERT INTO policy_premium_counters (policy_id, pending, next_due)
+                SELECT new.policy_id, 1, new.due_date WHERE new.status='Pending'
+                ON CONFLICT (policy_id) DO UPDATE SET pending=pending+1,
+                    next_due=CASE WHEN next_due IS NULL OR excluded.next_due < next_due
+                                  THEN excluded.next_due ELSE next_due END;'''
+_PREMIUM_COUNTER_REMOVE = '''UPDATE policy_premium_counters SET pending=pending-1,
+                    next_due=(SELECT MIN(due_date) FROM premiums WHERE policy_id=old.policy_id AND status='Pending')
+                WHERE policy_id=old.policy_id AND old.status='Pending';'''
+
+# v7 tables: INTEGER PRIMARY KEY ids (the rowid itself) and the old TEXT
+# ids of customers and policies kept as display_id
+_INTEGER_KEY_TABLES = {
+    'customers': '''CREATE TABLE customers_v7
+        (id INTEGER PRIMARY KEY, display_id TEXT NOT NULL UNIQUE, agent_id TEXT, pan TEXT UNIQUE, aadhar TEXT,
+        name TEXT, phone TEXT, email TEXT, income_range TEXT,
+        parent_id INTEGER, relationship TEXT,
+        created_at TIMESTAMP, FOREIGN KEY(agent_id) REFERENCES agents(id))''',
+    'policies': '''CREATE TABLE policies_v7
+        (id INTEGER PRIMARY KEY, display_id TEXT NOT NULL UNIQUE, customer_id INTEGER, policy_holder_id INTEGER,
+        policy_number TEXT UNIQUE, premium_amount REAL, frequency TEXT, type TEXT, provider TEXT,
+        coverage_type TEXT, nominee_name TEXT, nominee_pan TEXT, nominee_aadhar TEXT,
+        beneficiary_name TEXT, beneficiary_pan TEXT, beneficiary_aadhar TEXT,
+        start_date TIMESTAMP, end_date TIMESTAMP, status TEXT,
+        FOREIGN KEY(customer_id) REFERENCES customers(id),
+        FOREIGN KEY(policy_holder_id) REFERENCES customers(id))''',
+    'premiums': '''CREATE TABLE premiums_v7
+        (id INTEGER PRIMARY KEY, policy_id INTEGER, due_date TIMESTAMP,
+        amount REAL, status TEXT, paid_date TIMESTAMP,
+        FOREIGN KEY(policy_id) REFERENCES policies(id))''',
+}
+# Each row keeps its rowid as the new id; references are mapped through the
+# old TEXT ids. Premium ids were never shown anywhere and are not kept.
+_INTEGER_KEY_COPIES = {
+    'customers': '''INSERT INTO customers_v7
+        SELECT c.rowid, c.id, c.agent_id, c.pan, c.aadhar, c.name, c.phone, c.email, c.income_range,
+               parent.rowid, c.relationship, c.created_at
+        FROM customers c LEFT JOIN customers parent ON parent.id = c.parent_id''',
+    'policies': '''INSERT INTO policies_v7
+        SELECT p.rowid, p.id, c.rowid, holder.rowid, p.policy_number, p.premium_amount, p.frequency, p.type,
+               p.provider, p.coverage_type, p.nominee_name, p.nominee_pan, p.nominee_aadhar,
+               p.beneficiary_name, p.beneficiary_pan, p.beneficiary_aadhar, p.start_date, p.end_date, p.status
+        FROM policies p
+        LEFT JOIN customers c ON c.id = p.customer_id
+        LEFT JOIN customers holder ON holder.id = p.policy_holder_id''',
+    'premiums': '''INSERT INTO premiums_v7
+        SELECT pr.rowid, p.rowid, pr.due_date, pr.amount, pr.status, pr.paid_date
+        FROM premiums pr LEFT JOIN policies p ON p.id = pr.policy_id''',
+}
+
+
+# The CREATE statements among the steps of versions before `version`
+def _rerun(conn, dialect, version, prefixes):
+    for number, _, steps in MIGRATIONS:
+        if number < version:
+            for step in steps_for(steps, dialect):
+                if isinstance(step, str) and step.lstrip().startswith(prefixes):
+                    conn.execute(step)
+
+
+# v8 tables: the v7 layout with every date stored as 'YYYY-MM-DD' text.
+# The CHECK admits NULL and canonical dates only: not timestamps, and not
+# impossible days like 2024-02-30, which date() passes through unless it
+# has a modifier to apply. Range filters can compare the text directly and
+# substr(due_date, 1, 7) is always the month.
+def _iso_date(column):
+    return f"{column} TEXT CHECK ({column} IS date({column}, '+0 days'))"
+
+
+_ISO_DATE_TABLES = {
+    'customers': f'''CREATE TABLE customers_v8
+        (id INTEGER PRIMARY KEY, display_id TEXT NOT NULL UNIQUE, agent_id TEXT, pan TEXT UNIQUE, aadhar TEXT,
+        name TEXT, phone TEXT, email TEXT, income_range TEXT,
+        parent_id INTEGER, relationship TEXT,
+        {_iso_date('created_at')}, FOREIGN KEY(agent_id) REFERENCES agents(id))''',
+    'policies': f'''CREATE TABLE policies_v8
+        (id INTEGER PRIMARY KEY, display_id TEXT NOT NULL UNIQUE, customer_id INTEGER, policy_holder_id INTEGER,
+        policy_number TEXT UNIQUE, premium_amount REAL, frequency TEXT, type TEXT, provider TEXT,
+        coverage_type TEXT, nominee_name TEXT, nominee_pan TEXT, nominee_aadhar TEXT,
+        beneficiary_name TEXT, beneficiary_pan TEXT, beneficiary_aadhar TEXT,
+        {_iso_date('start_date')}, {_iso_date('end_date')}, status TEXT,
+        FOREIGN KEY(customer_id) REFERENCES customers(id),
+        FOREIGN KEY(policy_holder_id) REFERENCES customers(id))''',
+    'premiums': f'''CREATE TABLE premiums_v8
+        (id INTEGER PRIMARY KEY, policy_id INTEGER, {_iso_date('due_date')},
+        amount REAL, status TEXT, {_iso_date('paid_date')},
+        FOREIGN KEY(policy_id) REFERENCES policies(id))''',
+}
+# Timestamps written by older versions (paid_date from datetime.now(),
+# pandas Timestamps) lose their time of day
+_ISO_DATE_COPIES = {
+    'customers': '''INSERT INTO customers_v8
+        SELECT id, display_id, agent_id, pan, aadhar, name, phone, email, income_range,
+               parent_id, relationship, date(created_at)
+        FROM customers''',
+    'policies': '''INSERT INTO policies_v8
+        SELECT id, display_id, customer_id, policy_holder_id, policy_number, premium_amount, frequency, type,
+               provider, coverage_type, nominee_name, nominee_pan, nominee_aadhar,
+               beneficiary_name, beneficiary_pan, beneficiary_aadhar, date(start_date), date(end_date), status
+        FROM policies''',
+    'premiums': '''INSERT INTO premiums_v8
+        SELECT id, policy_id, date(due_date), amount, status, date(paid_date)
+        FROM premiums''',
+}
+_DATE_COLUMNS = {'customers': ('created_at',), 'policies': ('start_date', 'end_date'),
+                 'premiums': ('due_date', 'paid_date')}
+
+
+# Swap customers, policies and premiums for their rebuilt `<table>_v<version>`
+# copies. Dropping the old tables drops their indexes and triggers, so those
+# statements of the earlier migrations are run again.
+def _replace_tables(conn, version, creates, copies):
+    for table, create in creates.items():
+        conn.execute(create)
+        conn.execute(copies[table])
+    for table in ('premiums', 'policies', 'customers'):
+        conn.execute(f"DROP TABLE {table}")
+    for table in creates:
+        conn.execute(f"ALTER TABLE {table}_v{version} RENAME TO {table}")
+
+    _rerun(conn, 'sqlite', version, ("CREATE INDEX", "CREATE TRIGGER"))
+
+
+# Rebuild customers, policies and premiums with integer keys and refill the
+# derived tables
+def _integer_keys(conn):
+    _replace_tables(conn, 7, _INTEGER_KEY_TABLES, _INTEGER_KEY_COPIES)
+    conn.execute("DROP TABLE policy_premium_counters")
+    conn.execute('''CREATE TABLE policy_premium_counters
+                    (policy_id INTEGER PRIMARY KEY, pending INTEGER NOT NULL DEFAULT 0, next_due DATE)''')
+    rebuild_customer_search(conn)
+    rebuild_rollups(conn)
+
+
+# Normalize every stored date to 'YYYY-MM-DD' behind CHECK constraints.
+# A value date() cannot read would be lost, so the upgrade stops instead.
+def _iso_dates(conn):
+    for table, columns in _DATE_COLUMNS.items():
+        for column in columns:
+            row = conn.execute(f"SELECT rowid, {column} FROM {table} WHERE {column} IS NOT NULL "
+                               f"AND (date({column}) IS NULL OR date({column}) IS NOT date({column}, '+0 days')) "
+                               f"LIMIT 1").fetchone()
+            if row is not None:
+                raise RuntimeError(f"{table}.{column} of row {row[0]} is not a date ({row[1]!r}); "
+                                   f"correct it and restart to upgrade the database")
+    _replace_tables(conn, 8, _ISO_DATE_TABLES, _ISO_DATE_COPIES)
+    # next_due and the due months were copied from the old values
+    rebuild_rollups(conn)
+
+
+# PostgreSQL has neither FTS5 nor SQLite's trigger dialect; its steps below
+# build the same search index and rollups from plpgsql. Functions taking a
+# row of customers, policies or premiums go with the table when a later
+# version rebuilds it, and are created again with its triggers.
+
+# Text of a search document field: FTS5's unicode61 tokenizer splits on
+# anything that is not a letter or digit (emails into their parts, ...)
+def _pg_words(value):
+    return f"to_tsvector('simple', regexp_replace(coalesce({value}, ''), '[^[:alnum:]]+', ' ', 'g'))"
+
+
+_PG_NOMINEES = ("(SELECT string_agg(concat_ws(' ', nominee_name, beneficiary_name), ' ') "
+                "FROM policies WHERE customer_id = c.id)")
+_PG_REFRESH_SEARCH = '''INSERT INTO customer_search (customer_id, document)
+                SELECT c.id, customer_search_document(c) FROM customers c WHERE {where}
+                ON CONFLICT (customer_id) DO UPDATE SET document = excluded.document;'''
+
+# One tsvector per customer in place of the FTS5 table. Weights follow the
+# bm25 column weights: name, then PAN and phone, then email, then nominee
+# and beneficiary names.
+_PG_SEARCH = [
+    f'''CREATE OR REPLACE FUNCTION customer_search_document(c customers) RETURNS tsvector
+        LANGUAGE sql STABLE AS $$
+            SELECT setweight({_pg_words('c.name')}, 'A')
+                   || setweight({_pg_words("concat_ws(' ', c.pan, c.phone)")}, 'B')
+                   || setweight({_pg_words('c.email')}, 'C')
+                   || setweight({_pg_words(_PG_NOMINEES)}, 'D')
+        $$''',
+    f'''CREATE OR REPLACE FUNCTION customer_search_customers() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM customer_search WHERE customer_id = OLD.id;
+            ELSE
+                {_PG_REFRESH_SEARCH.format(where='c.id = NEW.id')}
+            END IF;
+            RETURN NULL;
+        END
+        $$''',
+    '''CREATE TRIGGER customer_search_customers
+       AFTER INSERT OR DELETE OR UPDATE OF name, pan, phone, email ON customers
+       FOR EACH ROW EXECUTE FUNCTION customer_search_customers()''',
+    # A policy's nominee and beneficiary names are part of its customer's
+    # document (OLD is NULL on INSERT, NEW on DELETE)
+    f'''CREATE OR REPLACE FUNCTION customer_search_policies() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            {_PG_REFRESH_SEARCH.format(where='c.id = OLD.customer_id OR c.id = NEW.customer_id')}
+            RETURN NULL;
+        END
+        $$''',
+    '''CREATE TRIGGER customer_search_policies
+       AFTER INSERT OR DELETE OR UPDATE OF customer_id, nominee_name, beneficiary_name ON policies
+       FOR EACH ROW EXECUTE FUNCTION customer_search_policies()''',
+]
+
+# The v5 rollup triggers as plpgsql: one trigger per table that adds or
+# takes away (sign 1 or -1) a row's share
+_PG_ROLLUPS = [
+    '''CREATE OR REPLACE FUNCTION rollup_add_counts(agent text, customers integer, family_members integer,
+            policies integer, active integer, lapsed integer, completed integer, cancelled integer)
+        RETURNS void LANGUAGE plpgsql AS $$
+        BEGIN
+            IF agent IS NULL THEN
+                RETURN;
+            END IF;
+            INSERT INTO agent_rollups AS r
+                (agent_id, customers, family_members, policies, active, lapsed, completed, cancelled)
+            VALUES (agent, customers, family_members, policies, active, lapsed, completed, cancelled)
+            ON CONFLICT (agent_id) DO UPDATE SET
+                customers = r.customers + excluded.customers,
+                family_members = r.family_members + excluded.family_members,
+                policies = r.policies + excluded.policies, active = r.active + excluded.active,
+                lapsed = r.lapsed + excluded.lapsed, completed = r.completed + excluded.completed,
+                cancelled = r.cancelled + excluded.cancelled;
+        END
+        $$''',
+    '''CREATE OR REPLACE FUNCTION rollup_add_month(agent text, month text, premiums integer, amount double precision)
+        RETURNS void LANGUAGE plpgsql AS $$
+        BEGIN
+            IF agent IS NULL THEN
+                RETURN;
+            END IF;
+            INSERT INTO agent_pending_months AS m (agent_id, due_month, premiums, amount)
+            VALUES (agent, month, premiums, amount)
+            ON CONFLICT (agent_id, due_month) DO UPDATE SET
+                premiums = m.premiums + excluded.premiums, amount = m.amount + excluded.amount;
+        END
+        $$''',
+    # One policy's share of its agent's counts
+    '''CREATE OR REPLACE FUNCTION rollup_policy_counts(agent text, p policies, sign integer)
+        RETURNS void LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM rollup_add_counts(agent, 0, 0, sign,
+                sign * (p.status IS NOT DISTINCT FROM 'Active')::integer,
+                sign * (p.status IS NOT DISTINCT FROM 'Lapsed')::integer,
+                sign * (p.status IS NOT DISTINCT FROM 'Completed')::integer,
+                sign * (p.status IS NOT DISTINCT FROM 'Cancelled')::integer);
+        END
+        $$''',
+    # Pending premiums of a policy that is not cancelled
+    '''CREATE OR REPLACE FUNCTION rollup_policy_months(agent text, p policies, sign integer)
+        RETURNS void LANGUAGE plpgsql AS $$
+        BEGIN
+            IF p.status IS NOT DISTINCT FROM 'Cancelled' THEN
+                RETURN;
+            END IF;
+            PERFORM rollup_add_month(agent, substr(due_date, 1, 7), sign * COUNT(*)::integer, sign * SUM(amount))
+            FROM premiums WHERE policy_id = p.id AND status = 'Pending'
+            GROUP BY substr(due_date, 1, 7);
+        END
+        $$''',
+    # One pending premium, if its policy is not cancelled
+    '''CREATE OR REPLACE FUNCTION rollup_premium_month(pr premiums, sign integer)
+        RETURNS void LANGUAGE plpgsql AS $$
+        BEGIN
+            IF pr.status IS DISTINCT FROM 'Pending' THEN
+                RETURN;
+            END IF;
+            PERFORM rollup_add_month(c.agent_id, substr(pr.due_date, 1, 7), sign, sign * pr.amount)
+            FROM policies p JOIN customers c ON c.id = p.customer_id
+            WHERE p.id = pr.policy_id AND p.status IS DISTINCT FROM 'Cancelled';
+        END
+        $$''',
+    # A customer moving to another agent takes its policies and pending premiums along
+    '''CREATE OR REPLACE FUNCTION rollup_customers() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                PERFORM rollup_add_counts(OLD.agent_id, -1, -(OLD.parent_id IS NOT NULL)::integer, 0, 0, 0, 0, 0);
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                PERFORM rollup_add_counts(NEW.agent_id, 1, (NEW.parent_id IS NOT NULL)::integer, 0, 0, 0, 0, 0);
+            END IF;
+            IF TG_OP = 'UPDATE' AND OLD.agent_id IS DISTINCT FROM NEW.agent_id THEN
+                PERFORM rollup_policy_counts(OLD.agent_id, p, -1), rollup_policy_months(OLD.agent_id, p, -1),
+                        rollup_policy_counts(NEW.agent_id, p, 1), rollup_policy_months(NEW.agent_id, p, 1)
+                FROM policies p WHERE p.customer_id = NEW.id;
+            END IF;
+            RETURN NULL;
+        END
+        $$''',
+    '''CREATE TRIGGER rollup_customers
+       AFTER INSERT OR DELETE OR UPDATE OF agent_id, parent_id ON customers
+       FOR EACH ROW EXECUTE FUNCTION rollup_customers()''',
+    # Only cancelling (or un-cancelling) a policy or moving it to another
+    # customer moves its pending premiums; Active/Lapsed/Completed do not.
+    # Premiums are normally inserted after their policy; pick up any that were not.
+    '''CREATE OR REPLACE FUNCTION rollup_policies() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            old_agent text;
+            new_agent text;
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                SELECT agent_id INTO old_agent FROM customers WHERE id = OLD.customer_id;
+                PERFORM rollup_policy_counts(old_agent, OLD, -1);
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                SELECT agent_id INTO new_agent FROM customers WHERE id = NEW.customer_id;
+                PERFORM rollup_policy_counts(new_agent, NEW, 1);
+            END IF;
+            IF TG_OP = 'INSERT' THEN
+                PERFORM rollup_policy_months(new_agent, NEW, 1);
+            ELSIF TG_OP = 'DELETE' THEN
+                PERFORM rollup_policy_months(old_agent, OLD, -1);
+            ELSIF (OLD.status IS NOT DISTINCT FROM 'Cancelled') <> (NEW.status IS NOT DISTINCT FROM 'Cancelled')
+                    OR OLD.customer_id IS DISTINCT FROM NEW.customer_id THEN
+                PERFORM rollup_policy_months(old_agent, OLD, -1);
+                PERFORM rollup_policy_months(new_agent, NEW, 1);
+            END IF;
+            RETURN NULL;
+        END
+        $$''',
+    '''CREATE TRIGGER rollup_policies
+       AFTER INSERT OR DELETE OR UPDATE OF status, customer_id ON policies
+       FOR EACH ROW EXECUTE FUNCTION rollup_policies()''',
+    # Pending premiums per policy and the earliest pending due date
+    '''CREATE OR REPLACE FUNCTION rollup_premiums() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' AND OLD.status = 'Pending' THEN
+                PERFORM rollup_premium_month(OLD, -1);
+                UPDATE policy_premium_counters SET pending = pending - 1,
+                    next_due = (SELECT MIN(due_date) FROM premiums WHERE policy_id = OLD.policy_id AND status = 'Pending')
+                WHERE policy_id = OLD.policy_id;
+            END IF;
+            IF TG_OP <> 'DELETE' AND NEW.status = 'Pending' THEN
+                PERFORM rollup_premium_month(NEW, 1);
+                INSERT INTO policy_premium_counters AS k (policy_id, pending, next_due)
+                VALUES (NEW.policy_id, 1, NEW.due_date)
+                ON CONFLICT (policy_id) DO UPDATE SET pending = k.pending + 1,
+                    next_due = CASE WHEN k.next_due IS NULL OR excluded.next_due < k.next_due
+                                    THEN excluded.next_due ELSE k.next_due END;
+            END IF;
+            RETURN NULL;
+        END
+        $$''',
+    '''CREATE TRIGGER rollup_premiums
+       AFTER INSERT OR DELETE OR UPDATE OF policy_id, due_date, amount, status ON premiums
+       FOR EACH ROW EXECUTE FUNCTION rollup_premiums()''',
+]
+
+# rebuild_rollups on PostgreSQL
+_PG_REBUILD_ROLLUPS = [
+    "DELETE FROM agent_rollups",
+    '''INSERT INTO agent_rollups (agent_id, customers, family_members)
+       SELECT agent_id, COUNT(*), COUNT(parent_id) FROM customers WHERE agent_id IS NOT NULL GROUP BY agent_id''',
+    '''INSERT INTO agent_rollups AS r (agent_id, policies, active, lapsed, completed, cancelled)
+       SELECT c.agent_id, COUNT(*), COUNT(*) FILTER (WHERE p.status = 'Active'),
+              COUNT(*) FILTER (WHERE p.status = 'Lapsed'), COUNT(*) FILTER (WHERE p.status = 'Completed'),
+              COUNT(*) FILTER (WHERE p.status = 'Cancelled')
+       FROM policies p JOIN customers c ON c.id = p.customer_id
+       WHERE c.agent_id IS NOT NULL GROUP BY c.agent_id
+       ON CONFLICT (agent_id) DO UPDATE SET policies = r.policies + excluded.policies,
+           active = r.active + excluded.active, lapsed = r.lapsed + excluded.lapsed,
+           completed = r.completed + excluded.completed, cancelled = r.cancelled + excluded.cancelled''',
+    "DELETE FROM agent_pending_months",
+    '''INSERT INTO agent_pending_months (agent_id, due_month, premiums, amount)
+       SELECT c.agent_id, substr(pr.due_date, 1, 7), COUNT(*), SUM(pr.amount)
+       FROM premiums pr
+       JOIN policies p ON p.id = pr.policy_id
+       JOIN customers c ON c.id = p.customer_id
+       WHERE pr.status = 'Pending' AND p.status IS DISTINCT FROM 'Cancelled' AND c.agent_id IS NOT NULL
+       GROUP BY 1, 2''',
+    "DELETE FROM policy_premium_counters",
+    '''INSERT INTO policy_premium_counters (policy_id, pending, next_due)
+       SELECT policy_id, COUNT(*), MIN(due_date) FROM premiums
+       WHERE status = 'Pending' GROUP BY policy_id''',
+]
+
+
+# v7 in PostgreSQL: bigint identity ids, numbered in the old tables'
+# physical order as SQLite keeps each rowid. Customers and policies are
+# copied first; later tables find their new ids through display_id.
+_PG_INTEGER_KEY_TABLES = {
+    'customers': '''CREATE TABLE customers_v7
+        (id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY, display_id text NOT NULL UNIQUE,
+        agent_id text REFERENCES agents(id), pan text COLLATE "C" UNIQUE, aadhar text, name text COLLATE "C",
+        phone text, email text, income_range text, parent_id bigint, relationship text,
+        created_at text COLLATE "C")''',
+    'policies': '''CREATE TABLE policies_v7
+        (id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY, display_id text NOT NULL UNIQUE,
+        customer_id bigint REFERENCES customers_v7(id), policy_holder_id bigint REFERENCES customers_v7(id),
+        policy_number text COLLATE "C" UNIQUE, premium_amount double precision, frequency text, type text,
+        provider text, coverage_type text, nominee_name text, nominee_pan text, nominee_aadhar text,
+        beneficiary_name text, beneficiary_pan text, beneficiary_aadhar text,
+        start_date text COLLATE "C", end_date text COLLATE "C", status text)''',
+    'premiums': '''CREATE TABLE premiums_v7
+        (id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY, policy_id bigint REFERENCES policies_v7(id),
+        due_date text COLLATE "C", amount double precision, status text, paid_date text COLLATE "C")''',
+}
+_PG_INTEGER_KEY_COPIES = {
+    'customers': [
+        '''INSERT INTO customers_v7 (id, display_id, agent_id, pan, aadhar, name, phone, email, income_range,
+                                    relationship, created_at)
+           SELECT row_number() OVER (ORDER BY ctid), id, agent_id, pan, aadhar, name, phone, email, income_range,
+                  relationship, created_at
+           FROM customers''',
+        '''UPDATE customers_v7 c SET parent_id = parent.id
+           FROM customers old JOIN customers_v7 parent ON parent.display_id = old.parent_id
+           WHERE old.id = c.display_id''',
+    ],
+    'policies': [
+        '''INSERT INTO policies_v7
+           SELECT row_number() OVER (ORDER BY p.ctid), p.id, c.id, holder.id, p.policy_number, p.premium_amount,
+                  p.frequency, p.type, p.provider, p.coverage_type, p.nominee_name, p.nominee_pan, p.nominee_aadhar,
+                  p.beneficiary_name, p.beneficiary_pan, p.beneficiary_aadhar, p.start_date, p.end_date, p.status
+           FROM policies p
+           LEFT JOIN customers_v7 c ON c.display_id = p.customer_id
+           LEFT JOIN customers_v7 holder ON holder.display_id = p.policy_holder_id''',
+    ],
+    'premiums': [
+        '''INSERT INTO premiums_v7
+           SELECT row_number() OVER (ORDER BY pr.ctid), p.id, pr.due_date, pr.amount, pr.status, pr.paid_date
+           FROM premiums pr LEFT JOIN policies_v7 p ON p.display_id = pr.policy_id''',
+    ],
+}
+
+
+# _integer_keys on PostgreSQL. DROP ... CASCADE also takes the functions
+# over the old row types, so those are created again with the triggers.
+def _pg_integer_keys(conn):
+    for table, create in _PG_INTEGER_KEY_TABLES.items():
+        conn.execute(create)
+        for statement in _PG_INTEGER_KEY_COPIES[table]:
+            conn.execute(statement)
+    conn.execute("DROP TABLE premiums, policies, customers, customer_search, policy_premium_counters CASCADE")
+    for table in _PG_INTEGER_KEY_TABLES:
+        conn.execute(f"ALTER TABLE {table}_v7 RENAME TO {table}")
+
+    conn.execute("CREATE TABLE customer_search (customer_id bigint PRIMARY KEY, document tsvector NOT NULL)")
+    conn.execute('''CREATE TABLE policy_premium_counters
+                    (policy_id bigint PRIMARY KEY, pending integer NOT NULL DEFAULT 0, next_due text COLLATE "C")''')
+    _rerun(conn, 'postgresql', 7, ("CREATE INDEX", "CREATE OR REPLACE FUNCTION", "CREATE TRIGGER"))
+    rebuild_customer_search(conn, 'postgresql')
+    rebuild_rollups(conn, 'postgresql')
+    restart_ids(conn, 'postgresql')
+
+
+# PostgreSQL's test for date(value, '+0 days') IS value: true for NULL and
+# real 'YYYY-MM-DD' days only. The day is rebuilt from its parts and
+# printed back, since a cast would raise on 2024-02-30 rather than answer
+# (pg_input_is_valid would need PostgreSQL 16).
+def _pg_iso_date(value):
+    return (f"CASE WHEN {value} ~ '^[0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}$' THEN "
+            f"to_char(date '2000-01-01' + make_interval(years => left({value}, 4)::int - 2000, "
+            f"months => substr({value}, 6, 2)::int - 1, days => right({value}, 2)::int - 1), 'YYYY-MM-DD') "
+            f"= {value} ELSE {value} IS NULL END")
+
+
+# _iso_dates on PostgreSQL, where the dates are text already: the same
+# check, the time of day cut off in place, then the CHECK constraints
+def _pg_iso_dates(conn):
+    for table, columns in _DATE_COLUMNS.items():
+        for column in columns:
+            row = conn.execute(f"SELECT id, {column} FROM {table} WHERE NOT ({_pg_iso_date(f'left({column}, 10)')}) "
+                               f"OR substr({column}, 11, 1) NOT IN ('', ' ', 'T') LIMIT 1").fetchone()
+            if row is not None:
+                raise RuntimeError(f"{table}.{column} of row {row[0]} is not a date ({row[1]!r}); "
+                                   f"correct it and restart to upgrade the database")
+    for table, columns in _DATE_COLUMNS.items():
+        for column in columns:
+            conn.execute(f"UPDATE {table} SET {column} = left({column}, 10) WHERE length({column}) > 10")
+            conn.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_iso CHECK ({_pg_iso_date(column)})")
+    rebuild_rollups(conn, 'postgresql')
+
+
+# Versioned schema migrations, applied in order by db.init_db() on either
+# database. Each entry is (version, description, steps); a step is either
+# an SQL statement or a callable taking the connection. Steps that differ
+# between SQLite and PostgreSQL are given per dialect, as
+# {'sqlite': [...], 'postgresql': [...]}. Append new versions at the end
+# and never edit one that has already shipped.
+# Racing submits could leave an agent two active jobs of a kind; all but
+# the newest are failed before the unique index of version 10 forbids it
+_JOBS_ONE_ACTIVE = '''UPDATE jobs SET status='failed', error='duplicate of a later job'
+                      WHERE status IN ('queued', 'running') AND id NOT IN
+                        (SELECT MAX(id) FROM jobs WHERE status IN ('queued', 'running') GROUP BY agent_id, kind)'''
+
+
+MIGRATIONS = [
+    (1, "Indexes for the agent/policy/premium hot paths", [
+        # Dashboard counts, enrollment and records lists (agent_id), family members (parent_id)
+        "CREATE INDEX IF NOT EXISTS idx_customers_agent_parent ON customers(agent_id, parent_id)",
+        "CREATE INDEX IF NOT EXISTS idx_customers_parent ON customers(parent_id)",
+        # Policies per customer, filtered by status
+        "CREATE INDEX IF NOT EXISTS idx_policies_customer_status ON policies(customer_id, status)",
+        # Premium history and status recomputation per policy
+        "CREATE INDEX IF NOT EXISTS idx_premiums_policy_status_due ON premiums(policy_id, status, due_date)",
+        # Upcoming/overdue windows only ever look at pending premiums
+        "CREATE INDEX IF NOT EXISTS idx_premiums_pending_due ON premiums(due_date, policy_id) WHERE status='Pending'",
+    ]),
+    (2, "High-water marks for scheduled jobs", {'sqlite': [
+        '''CREATE TABLE IF NOT EXISTS scheduler_state
+           (job TEXT PRIMARY KEY, high_water_mark TEXT, last_run_at TIMESTAMP)''',
+    ], 'postgresql': [
+        # Dates compare as text in the C collation, as in SQLite
+        '''CREATE TABLE IF NOT EXISTS scheduler_state
+           (job text PRIMARY KEY, high_water_mark text COLLATE "C", last_run_at timestamp)''',
+    ]}),
+    (3, "Full-text customer search index", {'sqlite': [
+        # One row per customer (rowid = customers.rowid); nominees holds the
+        # nominee and beneficiary names of all the customer's policies
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS customer_search USING fts5(
+               name, pan, phone, email, nominees,
+               tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')''',
+        f'''CREATE TRIGGER IF NOT EXISTS customer_search_insert AFTER INSERT ON customers BEGIN
+               INSERT INTO customer_search (rowid, name, pan, phone, email, nominees)
+               VALUES (new.rowid, new.name, new.pan, new.phone, new.email, {_NOMINEES.format(customer='new.id')});
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS customer_search_update
+           AFTER UPDATE OF name, pan, phone, email ON customers BEGIN
+               UPDATE customer_search SET name=new.name, pan=new.pan, phone=new.phone, email=new.email
+               WHERE rowid=new.rowid;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS customer_search_delete AFTER DELETE ON customers BEGIN
+               DELETE FROM customer_search WHERE rowid=old.rowid;
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS customer_search_policy_insert AFTER INSERT ON policies BEGIN
+               UPDATE customer_search SET nominees={_NOMINEES.format(customer='new.customer_id')}
+               WHERE rowid=(SELECT rowid FROM customers WHERE id=new.customer_id);
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS customer_search_policy_update
+           AFTER UPDATE OF customer_id, nominee_name, beneficiary_name ON policies BEGIN
+               UPDATE customer_search SET nominees={_NOMINEES.format(customer='old.customer_id')}
+               WHERE rowid=(SELECT rowid FROM customers WHERE id=old.customer_id);
+               UPDATE customer_search SET nominees={_NOMINEES.format(customer='new.customer_id')}
+               WHERE rowid=(SELECT rowid FROM customers WHERE id=new.customer_id);
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS customer_search_policy_delete AFTER DELETE ON policies BEGIN
+               UPDATE customer_search SET nominees={_NOMINEES.format(customer='old.customer_id')}
+               WHERE rowid=(SELECT rowid FROM customers WHERE id=old.customer_id);
+           END''',
+        lambda conn: rebuild_customer_search(conn),
+    ], 'postgresql': [
+        # A tsvector document per customer, searched through a GIN index
+        '''CREATE TABLE IF NOT EXISTS customer_search
+           (customer_id text PRIMARY KEY, document tsvector NOT NULL)''',
+        "CREATE INDEX IF NOT EXISTS idx_customer_search_document ON customer_search USING gin (document)",
+        *_PG_SEARCH,
+        lambda conn: rebuild_customer_search(conn, 'postgresql'),
+    ]}),
+    (4, "Indexes for the upcoming premiums sort orders", [
+        # Customer Name sort: the agent's customers already in name order
+        "CREATE INDEX IF NOT EXISTS idx_customers_agent_name ON customers(agent_id, name)",
+        # Amount sort when walking pending premiums directly (see queries.upcoming_premiums_query)
+        "CREATE INDEX IF NOT EXISTS idx_premiums_pending_amount ON premiums(amount) WHERE status='Pending'",
+    ]),
+    (5, "Rollup tables maintained by triggers", {'sqlite': [
+        # Dashboard counts: one row per agent
+        '''CREATE TABLE IF NOT EXISTS agent_rollups
+           (agent_id TEXT PRIMARY KEY, customers INTEGER NOT NULL DEFAULT 0,
+            family_members INTEGER NOT NULL DEFAULT 0, policies INTEGER NOT NULL DEFAULT 0,
+            active INTEGER NOT NULL DEFAULT 0, lapsed INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0, cancelled INTEGER NOT NULL DEFAULT 0)''',
+        # Pending premiums of policies that are not cancelled, by due month (YYYY-MM)
+        '''CREATE TABLE IF NOT EXISTS agent_pending_months
+           (agent_id TEXT, due_month TEXT, premiums INTEGER NOT NULL DEFAULT 0, amount REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (agent_id, due_month)) WITHOUT ROWID''',
+        # Pending premiums per policy and the earliest pending due date; the
+        # policy is overdue while next_due is in the past
+        '''CREATE TABLE IF NOT EXISTS policy_premium_counters
+           (policy_id TEXT PRIMARY KEY, pending INTEGER NOT NULL DEFAULT 0, next_due DATE) WITHOUT ROWID''',
+        f'''CREATE TRIGGER IF NOT EXISTS rollup_customer_insert AFTER INSERT ON customers BEGIN
+               {_customer_counts('+', 'new')}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS rollup_customer_delete AFTER DELETE ON customers BEGIN
+               {_customer_counts('-', 'old')}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS rollup_customer_update AFTER UPDATE OF agent_id, parent_id ON customers BEGIN
+               {_customer_counts('-', 'old')}
+               {_customer_counts('+', 'new')}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS rollup_customer_agent AFTER UPDATE OF agent_id ON customers
+           WHEN old.agent_id IS NOT new.agent_id BEGIN
+               {_customer_book('-', 'old')}
+               {_customer_book('+', 'new')}
+           END''',
+        # Premiums are normally inserted after their policy; pick up any that were not
+        f'''CREATE TRIGGER IF NOT EXISTS rollup_policy_insert AFTER INSERT ON policies BEGIN
+               {_policy_counts('+', 'new')}
+               {_policy_months('+', 'new')}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS rollup_policy_delete AFTER DELETE ON policies BEGIN
+               {_policy_counts('-', 'old')}
+               {_policy_months('-', 'old')}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS rollup_policy_update AFTER UPDATE OF status, customer_id ON policies BEGIN
+               {_policy_counts('-', 'old')}
+               {_policy_counts('+', 'new')}
+           END''',
+        # Only cancelling (or un-cancelling) a policy or moving it to another
+        # customer moves its pending premiums; Active/Lapsed/Completed do not
+        f'''CREATE TRIGGER IF NOT EXISTS rollup_policy_pending AFTER UPDATE OF status, customer_id ON policies
+           WHEN (old.status IS 'Cancelled') IS NOT (new.status IS 'Cancelled')
+                OR old.customer_id IS NOT new.customer_id BEGIN
+               {_policy_months('-', 'old')}
+               {_policy_months('+', 'new')}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS rollup_premium_insert AFTER INSERT ON premiums
+           WHEN new.status='Pending' BEGIN
+               {_premium_month('+', 'new')}
+               {_PREMIUM_COUNTER_ADD}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS rollup_premium_delete AFTER DELETE ON premiums
+           WHEN old.status='Pending' BEGIN
+               {_premium_month('-', 'old')}
+               {_PREMIUM_COUNTER_REMOVE}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS rollup_premium_update
+           AFTER UPDATE OF policy_id, due_date, amount, status ON premiums
+           WHEN old.status='Pending' OR new.status='Pending' BEGIN
+               {_premium_month('-', 'old')}
+               {_premium_month('+', 'new')}
+               {_PREMIUM_COUNTER_REMOVE}
+               {_PREMIUM_COUNTER_ADD}
+           END''',
+        lambda conn: rebuild_rollups(conn),
+    ], 'postgresql': [
+        '''CREATE TABLE IF NOT EXISTS agent_rollups
+           (agent_id text PRIMARY KEY, customers integer NOT NULL DEFAULT 0,
+            family_members integer NOT NULL DEFAULT 0, policies integer NOT NULL DEFAULT 0,
+            active integer NOT NULL DEFAULT 0, lapsed integer NOT NULL DEFAULT 0,
+            completed integer NOT NULL DEFAULT 0, cancelled integer NOT NULL DEFAULT 0)''',
+        '''CREATE TABLE IF NOT EXISTS agent_pending_months
+           (agent_id text, due_month text COLLATE "C", premiums integer NOT NULL DEFAULT 0,
+            amount double precision NOT NULL DEFAULT 0, PRIMARY KEY (agent_id, due_month))''',
+        '''CREATE TABLE IF NOT EXISTS policy_premium_counters
+           (policy_id text PRIMARY KEY, pending integer NOT NULL DEFAULT 0, next_due text COLLATE "C")''',
+        *_PG_ROLLUPS,
+        lambda conn: rebuild_rollups(conn, 'postgresql'),
+    ]}),
+    (6, "Background jobs", {'sqlite': [
+        # State and progress of crm.jobs work, polled by the pages
+        '''CREATE TABLE IF NOT EXISTS jobs
+           (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, agent_id TEXT, params TEXT,
+            status TEXT NOT NULL, done INTEGER NOT NULL DEFAULT 0, total INTEGER NOT NULL DEFAULT 0,
+            result TEXT, error TEXT, created_at TIMESTAMP, started_at TIMESTAMP, finished_at TIMESTAMP)''',
+        # An agent's latest (or active) job of a kind
+        "CREATE INDEX IF NOT EXISTS idx_jobs_agent_kind ON jobs(agent_id, kind, id)",
+    ], 'postgresql': [
+        '''CREATE TABLE IF NOT EXISTS jobs
+           (id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY, kind text NOT NULL, agent_id text, params text,
+            status text NOT NULL, done bigint NOT NULL DEFAULT 0, total bigint NOT NULL DEFAULT 0,
+            result text, error text, created_at timestamp, started_at timestamp, finished_at timestamp)''',
+        "CREATE INDEX IF NOT EXISTS idx_jobs_agent_kind ON jobs(agent_id, kind, id)",
+    ]}),
+    (7, "Integer primary keys; text ids kept as display_id", {'sqlite': [
+        _integer_keys,
+    ], 'postgresql': [
+        _pg_integer_keys,
+    ]}),
+    (8, "Dates stored as YYYY-MM-DD text with CHECK constraints", {'sqlite': [
+        _iso_dates,
+    ], 'postgresql': [
+        _pg_iso_dates,
+    ]}),
+    (9, "Premium reminder outbox", {'sqlite': [
+        # One reminder per policy and due date (crm.reminders), whichever
+        # window run queued it; the SMTP/SMS gateway sends the rows with
+        # sent_at NULL and sets it
+        '''CREATE TABLE IF NOT EXISTS reminder_outbox
+           (id INTEGER PRIMARY KEY, policy_id INTEGER NOT NULL, due_date TEXT NOT NULL, window_key TEXT NOT NULL,
+            customer_id INTEGER, agent_id TEXT, email TEXT, phone TEXT, subject TEXT, body TEXT,
+            created_at TIMESTAMP, sent_at TIMESTAMP, UNIQUE (policy_id, due_date))''',
+        "CREATE INDEX IF NOT EXISTS idx_reminder_outbox_unsent ON reminder_outbox(id) WHERE sent_at IS NULL",
+        # Checkpoint of each window's run: the keyset position of its last committed batch
+        '''CREATE TABLE IF NOT EXISTS reminder_runs
+           (window_key TEXT PRIMARY KEY, last_due TEXT NOT NULL DEFAULT '', last_policy INTEGER NOT NULL DEFAULT 0,
+            last_premium INTEGER NOT NULL DEFAULT 0, reminders INTEGER NOT NULL DEFAULT 0,
+            started_at TIMESTAMP, finished_at TIMESTAMP)''',
+    ], 'postgresql': [
+        '''CREATE TABLE IF NOT EXISTS reminder_outbox
+           (id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY, policy_id bigint NOT NULL,
+            due_date text COLLATE "C" NOT NULL, window_key text NOT NULL, customer_id bigint, agent_id text,
+            email text, phone text, subject text, body text, created_at timestamp, sent_at timestamp,
+            UNIQUE (policy_id, due_date))''',
+        "CREATE INDEX IF NOT EXISTS idx_reminder_outbox_unsent ON reminder_outbox(id) WHERE sent_at IS NULL",
+        '''CREATE TABLE IF NOT EXISTS reminder_runs
+           (window_key text PRIMARY KEY, last_due text COLLATE "C" NOT NULL DEFAULT '',
+            last_policy bigint NOT NULL DEFAULT 0, last_premium bigint NOT NULL DEFAULT 0,
+            reminders integer NOT NULL DEFAULT 0, started_at timestamp, finished_at timestamp)''',
+    ]}),
+    (10, "Job owners and one active job per agent and kind", {'sqlite': [
+        # host:pid of the process running a job and when it last said so (crm.jobs)
+        "ALTER TABLE jobs ADD COLUMN owner TEXT",
+        "ALTER TABLE jobs ADD COLUMN heartbeat_at TIMESTAMP",
+        _JOBS_ONE_ACTIVE,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active ON jobs(agent_id, kind) WHERE status IN ('queued', 'running')",
+    ], 'postgresql': [
+        "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS owner text",
+        "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS heartbeat_at timestamp",
+        _JOBS_ONE_ACTIVE,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active ON jobs(agent_id, kind) WHERE status IN ('queued', 'running')",
+    ]}),
+    (11, "Indexes for the COALESCE keys of the upcoming premiums sorts", [
+        # The expressions of queries.UPCOMING_SORTS, so the sorts still walk an index
+        "CREATE INDEX IF NOT EXISTS idx_customers_agent_name_key ON customers(agent_id, (COALESCE(name, '')))",
+        "CREATE INDEX IF NOT EXISTS idx_policies_number_key ON policies((COALESCE(policy_number, '')))",
+        "CREATE INDEX IF NOT EXISTS idx_premiums_pending_amount_key ON premiums((COALESCE(amount, 0))) "
+        "WHERE status='Pending'",
+        "DROP INDEX IF EXISTS idx_premiums_pending_amount",
+    ]),
+]
+
+
+# Refill customer_search from the base tables. Its rowids follow
+# customers.rowid (customers.id since version 7).
+def rebuild_customer_search(conn, dialect='sqlite'):
+    conn.execute("DELETE FROM customer_search")
+    if dialect == 'postgresql':
+        conn.execute("INSERT INTO customer_search SELECT c.id, customer_search_document(c) FROM customers c")
+        return
+    conn.execute(f'''INSERT INTO customer_search (rowid, name, pan, phone, email, nominees)
+                     SELECT rowid, name, pan, phone, email, {_NOMINEES.format(customer='customers.id')}
+                     FROM customers''')
+
+
+# Refill the v5 rollup tables from the base tables (python -m crm.rollups)
+def rebuild_rollups(conn, dialect='sqlite'):
+    if dialect == 'postgresql':
+        for statement in _PG_REBUILD_ROLLUPS:
+            conn.execute(statement)
+        return
+    conn.execute("DELETE FROM agent_rollups")
+    conn.execute('''INSERT INTO agent_rollups (agent_id, customers, family_members)
+                    SELECT agent_id, COUNT(*), COUNT(parent_id) FROM customers GROUP BY agent_id''')
+    conn.execute(f'''INSERT INTO agent_rollups (agent_id, policies, active, lapsed, completed, cancelled)
+                     SELECT c.agent_id, COUNT(*), SUM(p.status IS 'Active'), SUM(p.status IS 'Lapsed'),
+                            SUM(p.status IS 'Completed'), SUM(p.status IS 'Cancelled')
+                     FROM policies p JOIN customers c ON c.id = p.customer_id
+                     WHERE 1 GROUP BY c.agent_id {_ADD_COUNTS}''')
+    conn.execute("DELETE FROM agent_pending_months")
+    conn.execute('''INSERT INTO agent_pending_months (agent_id, due_month, premiums, amount)
+                    SELECT c.agent_id, substr(pr.due_date, 1, 7), COUNT(*), SUM(pr.amount)
+                    FROM premiums pr
+                    JOIN policies p ON p.id = pr.policy_id
+                    JOIN customers c ON c.id = p.customer_id
+                    WHERE pr.status = 'Pending' AND p.status IS NOT 'Cancelled'
+                    GROUP BY 1, 2''')
+    conn.execute("DELETE FROM policy_premium_counters")
+    conn.execute('''INSERT INTO policy_premium_counters (policy_id, pending, next_due)
+                    SELECT policy_id, COUNT(*), MIN(due_date) FROM premiums
+                    WHERE status = 'Pending' GROUP BY policy_id''')
+
+
+# Have the identity sequences follow rows inserted with explicit ids
+# (crm.synthetic, version 7); SQLite takes MAX(id) + 1 as it goes
+def restart_ids(conn, dialect='sqlite'):
+    if dialect != 'postgresql':
+        return
+    for table in ('customers', 'policies', 'premiums'):
+        conn.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 0) + 1, false) "
+                     f"FROM {table}")
+
+
+def current_version(conn):
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+# The steps of a migration for one dialect
+def steps_for(steps, dialect):
+    return steps[dialect] if isinstance(steps, dict) else steps
+
+
+# Apply every pending migration; must run inside db.transaction().
+# dialect: 'sqlite' or 'postgresql', the database `conn` is connected to.
+def migrate(conn, dialect='sqlite'):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                    (version INTEGER PRIMARY KEY, description TEXT, applied_at TIMESTAMP)''')
+
+    version = current_version(conn)
+    applied = []
+    for number, description, steps in MIGRATIONS:
+        if number <= version:
+            continue
+        for step in steps_for(steps, dialect):
+            if callable(step):
+                step(conn)
+            else:
+                conn.execute(step)
+        conn.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                     (number, description, datetime.now()))
+        applied.append(number)
+    return applied
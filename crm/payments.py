@@ -0,0 +1,67 @@
+from datetime import date
+
+from crm import db, queries, statuses
+
+PAY_PREMIUM = "UPDATE premiums SET status='Paid', paid_date=? WHERE policy_id=? AND due_date=? AND status='Pending'"
+NEXT_PENDING_DUE = "SELECT MIN(due_date) FROM premiums WHERE policy_id=? AND status='Pending'"
+
+
+# Mark one premium of a policy as paid: the one due on due_date, or the
+# earliest pending one. Raises ValueError for a cancelled policy. Runs in
+# the caller's transaction; returns the policy's new status.
+def pay_premium(conn, policy_id, due_date=None, paid_date=None):
+    status = conn.execute("SELECT status FROM policies WHERE id=?", (policy_id,)).fetchone()[0]
+    if status == 'Cancelled':
+        raise ValueError("Cannot mark premium as paid for a cancelled policy!")
+    if due_date is None:
+        due_date = conn.execute(NEXT_PENDING_DUE, (policy_id,)).fetchone()[0]
+        if due_date is None:
+            return status
+    conn.execute(PAY_PREMIUM, (str(paid_date or date.today()), policy_id, str(due_date)[:10]))
+    return statuses.update_policy_status(conn, policy_id)
+
+
+# Bulk premium payment for one agent. `payments` is an iterable of
+# (policy_number, due_date) pairs. Policy ids are resolved with one query,
+# every payment is applied with one executemany and the touched policies'
+# statuses are recomputed set-wise, all in the caller's transaction.
+# Payments against unknown or cancelled policies are skipped.
+# Returns a summary dict for the page.
+def pay_premiums(conn, agent_id, payments, paid_date=None):
+    paid_date = str(paid_date or date.today())
+    payments = list(dict.fromkeys((number, str(due_date)[:10]) for number, due_date in payments))
+    numbers = sorted({number for number, _ in payments})
+
+    policies = {number: (policy_id, status) for number, policy_id, status in conn.execute(
+        queries.AGENT_POLICIES_BY_NUMBER, (db.array(numbers), agent_id))}
+    unknown = [number for number in numbers if number not in policies]
+    cancelled = [number for number in numbers if number in policies and policies[number][1] == 'Cancelled']
+
+    rows = [(paid_date, policies[number][0], due_date) for number, due_date in payments
+            if number in policies and policies[number][1] != 'Cancelled']
+    # rowcount, unlike total_changes, leaves out the rollup triggers' writes
+    paid = conn.executemany(PAY_PREMIUM, rows).rowcount
+
+    policy_ids = sorted({policy_id for _, policy_id, _ in rows})
+    transitions = statuses.recompute_policy_statuses(conn, policy_ids=policy_ids)
+    return {
+        'requested': len(payments),
+        'paid': paid,
+        'policies': len(policy_ids),
+        'unknown_policies': unknown,
+        'cancelled_policies': cancelled,
+        'transitions': transitions,
+    }
+
+
+# One line per part of the summary, e.g. for st.success / st.info
+def describe(summary):
+    lines = [f"{summary['paid']} of {summary['requested']} premiums marked as paid "
+             f"across {summary['policies']} policies"]
+    if summary['unknown_policies']:
+        lines.append(f"Unknown policies skipped: {', '.join(summary['unknown_policies'])}")
+    if summary['cancelled_policies']:
+        lines.append(f"Cancelled policies skipped: {', '.join(summary['cancelled_policies'])}")
+    if summary['transitions']:
+        lines.append(statuses.describe(summary['transitions']))
+    return "\n".join(lines)
@@ -0,0 +1,326 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Time every SQL statement on pooled connections - CRM_PROFILE=0 turns it off
+ENABLED = os.environ.get('CRM_PROFILE', '1') != '0'
+# Statements slower than this are logged with their EXPLAIN QUERY PLAN
+SLOW_QUERY_MS = float(os.environ.get('CRM_SLOW_QUERY_MS', 250))
+# Percentiles come from the most recent samples of each statement or page
+WINDOW = 1000
+SLOW_LOG_SIZE = 50
+QUANTILES = (0.5, 0.95, 0.99)
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r'\s+')
+
+
+# Statement text with literals replaced by ? and whitespace collapsed, so
+# the same query with different values shares one entry
+@lru_cache(maxsize=4096)
+def normalize(sql):
+    return _SPACE.sub(' ', _LITERAL.sub('?', sql)).strip()
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    return f"{zlib.crc32(normalize(sql).encode()):08x}"
+
+
+class _Series:
+    def __init__(self, kind, name, text):
+        self.kind, self.name, self.text = kind, name, text
+        self.count = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.fetch_ms = 0.0
+        self.samples = deque(maxlen=WINDOW)
+
+    def add(self, elapsed_ms, rows):
+        self.count += 1
+        self.rows += rows
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.samples.append(elapsed_ms)
+
+    # Fetch time and rows count towards the statement, not as a run of their own
+    def add_fetch(self, elapsed_ms, rows):
+        self.rows += rows
+        self.total_ms += elapsed_ms
+        self.fetch_ms += elapsed_ms
+
+    def summary(self):
+        p50, p95, p99 = np.percentile(np.fromiter(self.samples, float), [q * 100 for q in QUANTILES])
+        return {
+            'kind': self.kind, 'name': self.name, 'text': self.text,
+            'count': self.count, 'rows': self.rows,
+            'total_ms': self.total_ms, 'mean_ms': self.total_ms / self.count, 'max_ms': self.max_ms,
+            'fetch_ms': self.fetch_ms,
+            'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+        }
+
+
+# Timings of SQL statements (by fingerprint) and page renders (by page name)
+class Registry:
+    def __init__(self):
+        self._series = {}
+        self._slow = deque(maxlen=SLOW_LOG_SIZE)
+        self._lock = threading.Lock()
+
+    def record(self, kind, name, elapsed_ms, rows=0, text=None):
+        with self._lock:
+            series = self._series.get((kind, name))
+            if series is None:
+                series = self._series[(kind, name)] = _Series(kind, name, text or name)
+            series.add(elapsed_ms, rows)
+
+    def fetched(self, kind, name, elapsed_ms, rows):
+        with self._lock:
+            series = self._series.get((kind, name))
+            if series is not None:
+                series.add_fetch(elapsed_ms, rows)
+
+    def add_slow(self, entry):
+        with self._lock:
+            self._slow.appendleft(entry)
+
+    # Per statement / page summaries, slowest in total first
+    def snapshot(self, kind=None):
+        with self._lock:
+            summaries = [s.summary() for s in self._series.values() if kind in (None, s.kind)]
+        return sorted(summaries, key=lambda s: s['total_ms'], reverse=True)
+
+    def slow_statements(self):
+        with self._lock:
+            return list(self._slow)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._slow.clear()
+
+
+# Shared by all sessions of the Streamlit process
+registry = Registry()
+
+
+def record(kind, name, elapsed_ms, rows=0, text=None):
+    registry.record(kind, name, elapsed_ms, rows, text)
+
+
+def snapshot(kind=None):
+    return registry.snapshot(kind)
+
+
+def slow_statements():
+    return registry.slow_statements()
+
+
+# SQL statements recorded so far; the difference around a call is its query count
+def statement_count():
+    return sum(s['count'] for s in snapshot('sql'))
+
+
+def reset():
+    registry.reset()
+
+
+# Times the block under (kind, name), also when it raises (st.rerun does)
+@contextmanager
+def timed(kind, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, name, (time.perf_counter() - started) * 1000)
+
+
+def to_json():
+    return json.dumps({'series': snapshot(), 'slow_statements': slow_statements()}, indent=2, default=str)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+# Prometheus text exposition format: one summary per statement and per page
+def to_prometheus():
+    lines = []
+    for kind, label in (('sql', 'fingerprint'), ('page', 'page')):
+        metric = f"crm_{kind}_duration_seconds"
+        lines.append(f"# HELP {metric} {'SQL statement' if kind == 'sql' else 'Page render'} duration")
+        lines.append(f"# TYPE {metric} summary")
+        for s in snapshot(kind):
+            labels = f'{label}="{_label(s["name"])}"'
+            for q in QUANTILES:
+                lines.append(f'{metric}{{{labels},quantile="{q}"}} {s[f"p{round(q * 100)}_ms"] / 1000:.6f}')
+            lines.append(f"{metric}_sum{{{labels}}} {s['total_ms'] / 1000:.6f}")
+            lines.append(f"{metric}_count{{{labels}}} {s['count']}")
+    lines.append("# HELP crm_sql_rows_total Rows returned by SQL statements")
+    lines.append("# TYPE crm_sql_rows_total counter")
+    for s in snapshot('sql'):
+        lines.append(f'crm_sql_rows_total{{fingerprint="{_label(s["name"])}"}} {s["rows"]}')
+    return "\n".join(lines) + "\n"
+
+
+# Timing of the statements a cursor runs. Execute is recorded as soon as it
+# returns and every fetch as it returns, so nothing waits for the cursor to
+# be closed or collected. Once a statement is done with - it returns no rows,
+# its rows are read to the end, or the cursor is closed or runs another - a
+# slow one is explained (self._plan) and logged, outside of its timing.
+class StatementProfile:
+    _sql = None
+    _elapsed = 0.0
+
+    def _profile_execute(self, execute, sql, parameters):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            result = execute()
+        finally:
+            elapsed = time.perf_counter() - started
+            record('sql', fingerprint(sql), elapsed * 1000, 0, normalize(sql))
+        self._sql, self._parameters, self._elapsed, self._rows = sql, parameters, elapsed, 0
+        if self.description is None:
+            self._finish()
+        return result
+
+    # The batch is one statement; its first parameters stand in for all of them in the plan
+    def _profile_executemany(self, executemany, sql, seq_of_parameters):
+        self._finish()
+        first = []
+
+        def remember(parameters):
+            for params in parameters:
+                if not first:
+                    first.append(params)
+                yield params
+
+        started = time.perf_counter()
+        try:
+            result = executemany(remember(seq_of_parameters))
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            record('sql', fingerprint(sql), elapsed_ms, max(self.rowcount, 0), normalize(sql))
+        if elapsed_ms >= SLOW_QUERY_MS:
+            self._explain_slow(sql, first[0] if first else (), elapsed_ms, max(self.rowcount, 0))
+        return result
+
+    # fetch returns (result, rows in it, whether the statement has no more rows)
+    def _profile_fetch(self, fetch):
+        started = time.perf_counter()
+        try:
+            result, rows, done = fetch()
+        finally:
+            elapsed = time.perf_counter() - started
+        if self._sql is not None:
+            self._elapsed += elapsed
+            self._rows += rows
+            registry.fetched('sql', fingerprint(self._sql), elapsed * 1000, rows)
+            if done:
+                self._finish()
+        return result
+
+    def _finish(self):
+        sql, self._sql = self._sql, None
+        if sql is not None and self._elapsed * 1000 >= SLOW_QUERY_MS:
+            self._explain_slow(sql, self._parameters, self._elapsed * 1000, self._rows)
+
+    # Logs a slow statement with its plan and adds it to the slow log
+    def _explain_slow(self, sql, parameters, elapsed_ms, rows):
+        plan = self._plan(sql, parameters)
+        log.warning("slow query %.0f ms, %d rows: %s\n    %s", elapsed_ms, rows, normalize(sql), "\n    ".join(plan))
+        registry.add_slow({
+            'at': time.strftime('%Y-%m-%d %H:%M:%S'), 'fingerprint': fingerprint(sql),
+            'elapsed_ms': elapsed_ms, 'rows': rows, 'text': normalize(sql), 'plan': plan,
+        })
+
+    def _plan(self, sql, parameters):
+        raise NotImplementedError
+
+
+class ProfiledCursor(StatementProfile, sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        return self._profile_execute(lambda: super(ProfiledCursor, self).execute(sql, parameters), sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._profile_executemany(lambda params: super(ProfiledCursor, self).executemany(sql, params),
+                                         sql, seq_of_parameters)
+
+    def fetchone(self):
+        def fetch():
+            row = super(ProfiledCursor, self).fetchone()
+            return row, row is not None, row is None
+        return self._profile_fetch(fetch)
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+
+        def fetch():
+            rows = super(ProfiledCursor, self).fetchmany(size)
+            return rows, len(rows), len(rows) < size
+        return self._profile_fetch(fetch)
+
+    def fetchall(self):
+        def fetch():
+            rows = super(ProfiledCursor, self).fetchall()
+            return rows, len(rows), True
+        return self._profile_fetch(fetch)
+
+    def __next__(self):
+        def fetch():
+            try:
+                return super(ProfiledCursor, self).__next__(), 1, False
+            except StopIteration:
+                return None, 0, True
+        row = self._profile_fetch(fetch)
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _plan(self, sql, parameters):
+        return self.connection.query_plan(sql, parameters)
+
+
+# Connection whose cursors are profiled
+class ProfiledConnection(sqlite3.Connection):
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    # The C shortcuts open plain cursors; route them through cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def query_plan(self, sql, parameters):
+        try:
+            cursor = super().cursor()
+            plan = [row[3] for row in cursor.execute("EXPLAIN QUERY PLAN " + sql, parameters)]
+            cursor.close()
+            return plan
+        except sqlite3.Error as e:
+            return [f"(no plan: {e})"]
+
+
+# sqlite3.connect factory for the connection pool
+def connection_factory():
+    return ProfiledConnection if ENABLED else sqlite3.Connection
@@ -0,0 +1,316 @@
+import json
+
+from crm import dates, db
+
+# Read queries issued by the Streamlit pages.
+# Kept in one place so crm.query_plans can check every one of them
+# against the indexes created by crm.migrations.
+
+AGENT_BY_ID = "SELECT * FROM agents WHERE id=?"
+
+# --- Dashboard ---
+# All dashboard counts in one row, kept current by the rollup triggers
+# (crm.migrations version 5)
+DASHBOARD_METRICS = '''
+    SELECT customers, family_members, policies, active, lapsed, completed, cancelled
+    FROM agent_rollups WHERE agent_id=?
+'''
+# Pending premiums of the agent from the by-month rollup: all of them, and
+# those of months before :month, the current one (all overdue)
+PENDING_MONTHS = '''
+    SELECT COALESCE(SUM(premiums), 0), COALESCE(SUM(amount), 0),
+           COALESCE(SUM(CASE WHEN due_month < :month THEN premiums END), 0),
+           COALESCE(SUM(CASE WHEN due_month < :month THEN amount END), 0)
+    FROM agent_pending_months WHERE agent_id=:agent_id
+'''
+# The rest of the overdue premiums: due this month, before today. At most a
+# month of pending premiums, so they drive the join (CROSS JOIN) rather
+# than every policy of the agent. Parameters: agent, first of the month, today.
+PENDING_THIS_MONTH_OVERDUE = '''
+    SELECT COUNT(*), COALESCE(SUM(pr.amount), 0)
+    FROM premiums pr
+    CROSS JOIN policies p ON pr.policy_id = p.id
+    CROSS JOIN customers c ON p.customer_id = c.id
+    WHERE c.agent_id=? AND pr.status='Pending' AND p.status != 'Cancelled'
+      AND pr.due_date >= ? AND pr.due_date < ?
+'''
+DASHBOARD_UPCOMING_PREMIUMS = "SELECT pr.due_date, pr.amount, c.name as customer_name, p.policy_number FROM premiums pr JOIN policies p ON pr.policy_id = p.id JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND pr.status='Pending' AND pr.due_date BETWEEN ? AND ? ORDER BY pr.due_date"
+
+# --- Enrollment ---
+CUSTOMER_CHOICES = "SELECT id, name, pan FROM customers WHERE agent_id=?"
+CUSTOMER_BY_PAN = "SELECT id, name FROM customers WHERE pan=?"
+CUSTOMERS_WITH_PARENT = "SELECT c.id, c.name, c.pan, c.parent_id, c.relationship, parent.name as parent_name, parent.pan as parent_pan FROM customers c LEFT JOIN customers parent ON c.parent_id = parent.id WHERE c.agent_id=? ORDER BY c.name"
+POLICY_BY_NUMBER = "SELECT id FROM policies WHERE policy_number=?"
+
+# --- Policy status ---
+# Status, pending premium count and whether any pending premium is past due,
+# from the trigger-maintained per-policy counters
+POLICY_STATUS_COUNTERS = '''
+    SELECT p.status, COALESCE(k.pending, 0) as pending,
+           CASE WHEN k.next_due < :today THEN 1 ELSE 0 END as overdue
+    FROM policies p LEFT JOIN policy_premium_counters k ON k.policy_id = p.id
+    WHERE p.id=:policy_id
+'''
+
+# --- Family management ---
+FAMILIES = "SELECT c.id, c.name, c.pan, c.phone, c.email, c.parent_id, c.relationship, parent.name as parent_name, parent.pan as parent_pan FROM customers c LEFT JOIN customers parent ON c.parent_id = parent.id WHERE c.agent_id=? ORDER BY parent.name NULLS FIRST, c.name"
+# Every family policy of the agent, keyed by the family's primary customer
+AGENT_FAMILY_POLICIES = '''
+    SELECT COALESCE(customer.parent_id, customer.id) as family_id,
+           p.policy_number, p.type, p.provider, p.status,
+           customer.name as insured_name, holder.name as holder_name
+    FROM customers customer
+    JOIN policies p ON p.customer_id = customer.id
+    JOIN customers holder ON p.policy_holder_id = holder.id
+    WHERE customer.agent_id=?
+    ORDER BY p.policy_number
+'''
+
+# --- Records ---
+RECORD_BY_PAN = "SELECT c.*, parent.name as parent_name, parent.pan as parent_pan FROM customers c LEFT JOIN customers parent ON c.parent_id = parent.id WHERE c.pan=? AND c.agent_id=?"
+# The agent's customers among a JSON array of PANs (API batch lookup)
+RECORDS_BY_PANS = '''
+    SELECT c.*, parent.name as parent_name, parent.pan as parent_pan
+    FROM json_each(?) j
+    CROSS JOIN customers c ON c.pan = j.value
+    LEFT JOIN customers parent ON c.parent_id = parent.id
+    WHERE c.agent_id=?
+'''
+# Full-text customer search (crm.search builds the MATCH expression).
+# Best bm25 rank first; name, PAN and phone weigh most. CROSS JOIN keeps
+# the index lookup as the outer loop - otherwise SQLite walks every one of
+# the agent's customers and probes the index once per row.
+CUSTOMER_SEARCH = '''
+    SELECT c.*, parent.name as parent_name, parent.pan as parent_pan
+    FROM (SELECT c.rowid, bm25(customer_search, 10.0, 5.0, 5.0, 2.0, 1.0) AS score
+          FROM customer_search
+          CROSS JOIN customers c ON c.rowid = customer_search.rowid
+          WHERE customer_search MATCH ? AND c.agent_id=?
+          ORDER BY score LIMIT ? OFFSET ?) matches
+    JOIN customers c ON c.rowid = matches.rowid
+    LEFT JOIN customers parent ON c.parent_id = parent.id
+    ORDER BY matches.score, c.name
+'''
+CUSTOMER_SEARCH_COUNT = '''
+    SELECT COUNT(*)
+    FROM customer_search
+    CROSS JOIN customers c ON c.rowid = customer_search.rowid
+    WHERE customer_search MATCH ? AND c.agent_id=?
+'''
+PRIMARY_CUSTOMERS = "SELECT id, name, pan FROM customers WHERE agent_id=? AND parent_id IS NULL ORDER BY name"
+FAMILY_RECORDS = "SELECT c.*, parent.name as parent_name, parent.pan as parent_pan FROM customers c LEFT JOIN customers parent ON c.parent_id = parent.id WHERE (c.id = ? OR c.parent_id = ?) AND c.agent_id=? ORDER BY c.parent_id NULLS FIRST, c.name"
+# Policies and premiums of a set of customers, passed as one JSON array of ids
+CUSTOMERS_POLICIES = '''
+    SELECT p.*, holder.name as holder_name
+    FROM policies p
+    LEFT JOIN customers holder ON p.policy_holder_id = holder.id
+    WHERE p.customer_id IN (SELECT value FROM json_each(?))
+    ORDER BY p.customer_id, p.start_date DESC
+'''
+CUSTOMERS_PREMIUMS = '''
+    SELECT pr.*
+    FROM premiums pr
+    JOIN policies p ON pr.policy_id = p.id
+    WHERE p.customer_id IN (SELECT value FROM json_each(?)) AND p.status != 'Cancelled'
+    ORDER BY pr.policy_id, pr.due_date
+'''
+
+# Bulk payments: the agent's policies among a JSON array of policy numbers
+AGENT_POLICIES_BY_NUMBER = '''
+    SELECT p.policy_number, p.id, p.status
+    FROM policies p
+    JOIN customers c ON p.customer_id = c.id
+    WHERE p.policy_number IN (SELECT value FROM json_each(?)) AND c.agent_id=?
+'''
+
+# --- Export ---
+EXPORT_CUSTOMERS = "SELECT * FROM customers WHERE agent_id=?"
+EXPORT_POLICIES = '''
+    SELECT p.*, c.name as customer_name
+    FROM policies p
+    JOIN customers c ON p.customer_id = c.id
+    WHERE c.agent_id=?
+'''
+EXPORT_PREMIUMS = '''
+    SELECT pr.*, p.policy_number, c.name as customer_name, p.status as policy_status
+    FROM premiums pr
+    JOIN policies p ON pr.policy_id = p.id
+    JOIN customers c ON p.customer_id = c.id
+    WHERE c.agent_id=?
+'''
+EXPORT_CUSTOMERS_COUNT = "SELECT COUNT(*) FROM customers WHERE agent_id=?"
+EXPORT_POLICIES_COUNT = '''
+    SELECT COUNT(*) FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=?
+'''
+EXPORT_PREMIUMS_COUNT = '''
+    SELECT COUNT(*)
+    FROM premiums pr
+    JOIN policies p ON pr.policy_id = p.id
+    JOIN customers c ON p.customer_id = c.id
+    WHERE c.agent_id=?
+'''
+
+
+# --- Import (crm.importer) ---
+# The agent's customers with the given PANs, for a JSON array of PANs
+AGENT_PANS = '''
+    SELECT c.pan, c.id FROM json_each(?) j
+    CROSS JOIN customers c ON c.pan = j.value
+    WHERE c.agent_id = ?
+'''
+
+
+# Existing values of a unique column, for an array of candidates
+# (CROSS JOIN: probe the column's unique index once per candidate)
+def existing_values_query(table, column, dialect=None):
+    if (dialect or db.dialect()) == 'postgresql':
+        return f"SELECT j.value FROM unnest(?::text[]) j(value) JOIN {table} ON {table}.{column} = j.value"
+    return f"SELECT value FROM json_each(?) CROSS JOIN {table} ON {table}.{column} = value"
+
+
+# --- Reminders (crm.reminders) ---
+# Policies with pending premiums due in [:start, :end], across all agents,
+# each on the row of its first such premium, after the keyset cursor
+# (due date, policy id, premium id). Walks the pending-premium index in
+# due-date order (CROSS JOIN keeps premiums the outer loop), so a batch
+# never sorts the window and a run resumes from its last row.
+REMINDER_BATCH = '''
+    SELECT pr.due_date, pr.policy_id, pr.id as premium_id,
+           (SELECT COUNT(*) FROM premiums w WHERE w.policy_id = pr.policy_id AND w.status='Pending'
+              AND w.due_date BETWEEN :start AND :end) as premiums,
+           (SELECT SUM(w.amount) FROM premiums w WHERE w.policy_id = pr.policy_id AND w.status='Pending'
+              AND w.due_date BETWEEN :start AND :end) as amount,
+           p.policy_number, p.type as policy_type, p.provider,
+           c.id as customer_id, c.agent_id, c.name as customer_name, c.email, c.phone,
+           a.name as agent_name, a.phone as agent_phone
+    FROM premiums pr
+    CROSS JOIN policies p ON pr.policy_id = p.id
+    CROSS JOIN customers c ON p.customer_id = c.id
+    LEFT JOIN agents a ON a.id = c.agent_id
+    WHERE pr.status='Pending' AND pr.due_date BETWEEN :start AND :end AND p.status != 'Cancelled'
+      AND (pr.due_date, pr.policy_id, pr.id) > (:due_date, :policy_id, :premium_id)
+      AND NOT EXISTS (SELECT 1 FROM premiums e WHERE e.policy_id = pr.policy_id AND e.status='Pending'
+                      AND e.due_date >= :start AND e.due_date < pr.due_date)
+    ORDER BY pr.due_date, pr.policy_id, pr.id
+    LIMIT :limit
+'''
+# The (policy id, due date) pairs of a batch that already have a reminder;
+# the policy ids and due dates come as two arrays, paired by position
+REMINDED_PREMIUMS = '''
+    SELECT o.policy_id, o.due_date FROM json_each(?) p
+    JOIN json_each(?) d ON d.key = p.key
+    CROSS JOIN reminder_outbox o ON o.policy_id = p.value AND o.due_date = d.value
+'''
+
+
+# Upcoming premiums page sort orders: label -> (keyset columns, result column, descending).
+# Each key ends in the premium id so every row has a unique position, and
+# matches an index so SQLite can stop after one page instead of sorting the window.
+# Nullable columns are keyed by COALESCE: a NULL would fail the row-value
+# comparison and end the walk early (migration 11 indexes the same expressions).
+UPCOMING_SORTS = {
+    "Due Date": (("pr.due_date", "pr.policy_id", "pr.id"), "due_date", False),
+    "Amount": (("COALESCE(pr.amount, 0)", "pr.id"), "amount", True),
+    "Customer Name": (("COALESCE(c.name, '')", "pr.id"), "customer_name", False),
+    "Policy Number": (("COALESCE(p.policy_number, '')", "pr.id"), "policy_number", False),
+}
+
+# Sorts that can walk the pending-premium indexes directly
+PREMIUM_SORTS = ("Due Date", "Amount")
+
+
+# Upcoming premiums page - exclude cancelled policies.
+# days: look-ahead window, None for all upcoming, negative for overdue only
+def _upcoming_premiums_filter(agent_id, days, status_filter):
+    where = "WHERE c.agent_id=? AND pr.status='Pending' AND p.status != 'Cancelled'"
+    params = [agent_id]
+
+    if days is not None and days < 0:
+        where += " AND pr.due_date < ?"
+        params.append(dates.today())
+    elif days is not None:
+        where += " AND pr.due_date BETWEEN ? AND ?"
+        params.extend([dates.today(), dates.days_from_today(days)])
+
+    if status_filter != "All":
+        where += " AND p.status=?"
+        params.append(status_filter)
+    return where, params
+
+
+# One page of upcoming premiums, ordered in SQL. `after` is the keyset
+# cursor (the previous page's last row_key); `limit` None returns every row.
+# policy_numbers restricts the rows to those policies.
+# dense: the agent owns a large share of the window's premiums - walk the
+# pending-premium index in sort order and filter by agent, rather than
+# collecting all the agent's premiums and sorting them.
+# dialect: 'sqlite' or 'postgresql', by default the configured database's.
+def upcoming_premiums_query(agent_id, days=None, status_filter="All", sort="Due Date",
+                            after=None, limit=None, policy_numbers=None, dense=False, dialect=None):
+    postgres = (dialect or db.dialect()) == 'postgresql'
+    where, params = _upcoming_premiums_filter(agent_id, days, status_filter)
+    columns, _, descending = UPCOMING_SORTS[sort]
+    direction = "DESC" if descending else "ASC"
+    key = ", ".join(columns)
+
+    if policy_numbers is not None:
+        if postgres:
+            where += " AND p.policy_number IN (SELECT unnest(?::text[]))"
+            params.append(list(policy_numbers))
+        else:
+            where += " AND p.policy_number IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(policy_numbers)))
+    if after is not None:
+        # An index on an expression is only sought on a bound of that
+        # expression alone, never on a row value that starts with it
+        if '(' in columns[0]:
+            where += f" AND {columns[0]} {'<=' if descending else '>='} ?"
+            params.append(after[0])
+        where += f" AND ({key}) {'<' if descending else '>'} ({', '.join('?' * len(columns))})"
+        params.extend(after)
+
+    # CROSS JOIN pins premiums as the outer loop (SQLite only)
+    join = "CROSS JOIN" if dense and sort in PREMIUM_SORTS and not postgres else "JOIN"
+    row_key = f"json_build_array({key})::text" if postgres else f"json_array({key})"
+    query = f'''
+        SELECT {row_key} as row_key, pr.due_date, pr.amount, pr.status as premium_status,
+               c.name as customer_name, p.policy_number, p.type as policy_type,
+               p.provider, p.status as policy_status, holder.name as policy_holder
+        FROM premiums pr
+        {join} policies p ON pr.policy_id = p.id
+        {join} customers c ON p.customer_id = c.id
+        LEFT JOIN customers holder ON p.policy_holder_id = holder.id
+        {where}
+        ORDER BY {", ".join(f"{column} {direction}" for column in columns)}
+    '''
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return query, params
+
+
+# Pending premiums in the window across all agents, from the pending-premium index alone
+def upcoming_window_count_query(days=None):
+    query = "SELECT COUNT(*) FROM premiums pr WHERE pr.status='Pending'"
+    params = []
+    if days is not None and days < 0:
+        query += " AND pr.due_date < ?"
+        params.append(dates.today())
+    elif days is not None:
+        query += " AND pr.due_date BETWEEN ? AND ?"
+        params.extend([dates.today(), dates.days_from_today(days)])
+    return query, params
+
+
+# Count, total amount and overdue count for the whole upcoming window
+def upcoming_premiums_summary_query(agent_id, days=None, status_filter="All"):
+    where, params = _upcoming_premiums_filter(agent_id, days, status_filter)
+    query = f'''
+        SELECT COUNT(*) as premiums, COALESCE(SUM(pr.amount), 0) as total_amount,
+               COALESCE(SUM(CASE WHEN pr.due_date < ? THEN 1 ELSE 0 END), 0) as overdue
+        FROM premiums pr
+        JOIN policies p ON pr.policy_id = p.id
+        JOIN customers c ON p.customer_id = c.id
+        {where}
+    '''
+    return query, [dates.today()] + params
@@ -0,0 +1,97 @@
+"""EXPLAIN QUERY PLAN regression check for the page queries.
+
+    python -m crm.query_plans [path/to/crm.db]
+
+Builds the schema (or opens the given database), explains every query in
+crm.queries and exits non-zero if any of them falls back to a full table
+scan instead of an index search. Full-text (virtual table) lookups and
+scans of partial indexes count as index searches.
+"""
+import re
+import sqlite3
+import sys
+
+from crm import db, queries
+
+_SCAN = re.compile(r'^SCAN (\w+)')
+_SUBQUERY = re.compile(r'^(?:MATERIALIZE|CO-ROUTINE) (\w+)')
+_USING_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+_NAMED_PARAM = re.compile(r'(?<![:\w]):(\w+)')
+
+
+# Every page query with placeholder parameters, keyed by a readable name
+def page_queries():
+    found = {}
+    for name in dir(queries):
+        value = getattr(queries, name)
+        if name.isupper() and isinstance(value, str):
+            named = _NAMED_PARAM.findall(value)
+            if named:
+                found[name] = (value, dict.fromkeys(named, 'x'))
+            else:
+                found[name] = (value, ['x'] * value.count('?'))
+
+    for days in (30, None, -1):
+        for status_filter in ("All", "Active"):
+            found[f"upcoming_premiums_summary_query(days={days}, status={status_filter})"] = \
+                queries.upcoming_premiums_summary_query('x', days, status_filter)
+            for sort, (columns, _, _) in queries.UPCOMING_SORTS.items():
+                for dense in (False, True):
+                    found[f"upcoming_premiums_query(days={days}, status={status_filter}, sort={sort}, dense={dense})"] = \
+                        queries.upcoming_premiums_query('x', days, status_filter, sort, after=['x'] * len(columns),
+                                                        limit=50, dense=dense, dialect='sqlite')
+        found[f"upcoming_window_count_query(days={days})"] = queries.upcoming_window_count_query(days)
+    found["upcoming_premiums_query(policy_numbers=...)"] = \
+        queries.upcoming_premiums_query('x', policy_numbers=['x'], dialect='sqlite')
+    for table, column in (('customers', 'pan'), ('policies', 'policy_number')):
+        found[f"existing_values_query({table}, {column})"] = \
+            (queries.existing_values_query(table, column, dialect='sqlite'), ['x'])
+    return found
+
+
+def explain(conn, sql, params):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+# Returns {query name: [offending plan lines]} for every query that scans a table
+def full_scans(conn):
+    # A partial index only holds the rows its WHERE selects (e.g. pending premiums)
+    partial = {name for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type='index'")
+               if sql and ' WHERE ' in sql.upper()}
+    offenders = {}
+    for name, (sql, params) in page_queries().items():
+        plan = explain(conn, sql, params)
+        # Scanning a subquery's own (already filtered) result is fine
+        subqueries = {m.group(1) for m in map(_SUBQUERY.match, plan) if m}
+        scans = [line for line in plan
+                 if _SCAN.match(line) and _SCAN.match(line).group(1) not in subqueries
+                 and not line.startswith('SCAN CONSTANT') and 'VIRTUAL TABLE' not in line
+                 and not (_USING_INDEX.search(line) and _USING_INDEX.search(line).group(1) in partial)]
+        if scans:
+            offenders[name] = scans
+    return offenders
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        conn = sqlite3.connect(argv[0])
+    else:
+        conn = sqlite3.connect(':memory:')
+        db.create_schema(conn)
+
+    offenders = full_scans(conn)
+    conn.close()
+
+    for name, scans in sorted(offenders.items()):
+        print(f"FULL SCAN  {name}")
+        for line in scans:
+            print(f"    {line}")
+    if offenders:
+        return 1
+    print(f"OK: {len(page_queries())} page queries use indexes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
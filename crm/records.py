@@ -0,0 +1,34 @@
+from crm import dates, db, queries
+
+
+# Policies and premiums of a set of customers, loaded together and grouped
+# in memory so rendering any number of customers costs two queries. The
+# groups are built on first use; all_policies and all_premiums hold every
+# loaded row for callers that serialize them in one pass (crm.api).
+class CustomerRecords:
+    def __init__(self, policies, premiums):
+        self.all_policies = policies
+        self.all_premiums = premiums
+        self._empty_policies = policies.iloc[0:0]
+        self._empty_premiums = premiums.iloc[0:0]
+        self._policies = None
+        self._premiums = None
+
+    # Newest first, including cancelled policies
+    def policies(self, customer_id):
+        if self._policies is None:
+            self._policies = dict(tuple(self.all_policies.groupby('customer_id', sort=False)))
+        return self._policies.get(customer_id, self._empty_policies)
+
+    # By due date; cancelled policies have none loaded
+    def premiums(self, policy_id):
+        if self._premiums is None:
+            self._premiums = dict(tuple(self.all_premiums.groupby('policy_id', sort=False)))
+        return self._premiums.get(policy_id, self._empty_premiums)
+
+
+def load_customer_records(conn, customer_ids):
+    ids = db.array(customer_ids)
+    policies = dates.parse(db.read_sql(conn, queries.CUSTOMERS_POLICIES, (ids,)))
+    premiums = dates.parse(db.read_sql(conn, queries.CUSTOMERS_PREMIUMS, (ids,)))
+    return CustomerRecords(policies, premiums)
@@ -0,0 +1,190 @@
+"""Batch premium reminders for every agent's customers.
+
+    python -m crm.reminders [--days 30] [--start YYYY-MM-DD] [--maildir DIR] [--template FILE] [--restart]
+
+Walks the pending premiums due in the window (by default today and the
+next 30 days, as on the dashboard) across all agents in one pass over the
+pending-premium index, BATCH_SIZE rows at a time, and renders one reminder
+per policy, addressed to its customer. Reminders go to the reminder_outbox
+table, which stands in for the SMTP/SMS gateway: it sends the rows whose
+sent_at is NULL. With --maildir each new reminder is also written as a
+message file to DIR/new.
+
+A reminder is keyed on its policy and the first pending due date in the
+window, so each premium is reminded once: rerunning a window, or the
+next night's run over a window that moved by a day, only adds reminders
+for premiums that come into the window. A monthly policy is reminded
+monthly. Every batch commits its reminders with the run's checkpoint
+(reminder_runs), so an interrupted run resumes after its last committed
+batch. Maildir files are written before that commit
+under fixed names; a crash between the two rewrites them on resume.
+"""
+import argparse
+import os
+from datetime import date, datetime, timedelta
+from email.message import EmailMessage
+
+from crm import dates, db, queries
+
+BATCH_SIZE = int(os.environ.get('CRM_REMINDER_BATCH', 5000))
+DEFAULT_DAYS = 30
+SENDER = os.environ.get('CRM_REMINDER_SENDER', "reminders@insureCRM.com")
+
+# First line is the subject, the rest the body; str.format fields are the
+# columns of queries.REMINDER_BATCH plus first_due, total and window_end
+TEMPLATE = """Premium due for policy {policy_number}
+Dear {customer_name},
+
+{premiums} premium(s) of your {policy_type} policy {policy_number} with {provider}, \
+totalling ₹{total}, fall due between {first_due} and {window_end}.
+
+Please pay on time to keep the policy active. For any help, contact {agent_name} on {agent_phone}.
+"""
+
+_INSERT = '''INSERT INTO reminder_outbox (policy_id, due_date, window_key, customer_id, agent_id, email, phone,
+                                          subject, body, created_at)
+             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+_CHECKPOINT = '''UPDATE reminder_runs SET last_due=?, last_policy=?, last_premium=?, reminders=reminders+?
+                 WHERE window_key=?'''
+
+
+def window_key(start, end):
+    return f"{start}..{end}"
+
+
+def load_template(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+# (subject, body) of one reminder. `row` is a dict of a REMINDER_BATCH row.
+def render(template, row, window_end):
+    fields = dict(row, first_due=row['due_date'], total=f"{row['amount']:,.2f}", window_end=window_end)
+    fields = {key: "" if value is None else value for key, value in fields.items()}
+    try:
+        subject, _, body = template.format_map(fields).partition("\n")
+    except KeyError as e:
+        raise ValueError(f"Unknown reminder template field: {e}")
+    return subject, body
+
+
+# Written under tmp/ and renamed into new/, so the gateway never sees half a message
+def _deliver(maildir, name, row, subject, body):
+    message = EmailMessage()
+    message['From'] = SENDER
+    message['To'] = row['email'] or ""
+    message['Subject'] = subject
+    message['X-CRM-Phone'] = row['phone'] or ""
+    message.set_content(body)
+    temporary = os.path.join(maildir, 'tmp', name)
+    with open(temporary, 'wb') as f:
+        f.write(message.as_bytes())
+    os.replace(temporary, os.path.join(maildir, 'new', name))
+
+
+# Starts or resumes the window's run. Returns (checkpoint, finished).
+def _checkpoint(conn, key, restart):
+    row = conn.execute('''SELECT last_due, last_policy, last_premium, finished_at FROM reminder_runs
+                          WHERE window_key=?''', (key,)).fetchone()
+    if row is None or restart:
+        conn.execute('''INSERT INTO reminder_runs (window_key, started_at) VALUES (?, ?)
+                        ON CONFLICT (window_key) DO UPDATE SET last_due='', last_policy=0, last_premium=0,
+                            started_at=excluded.started_at, finished_at=NULL''', (key, datetime.now()))
+        return ('', 0, 0), False
+    return row[:3], row[3] is not None
+
+
+# Reminders for every policy with a pending premium due in [start, start + days].
+# `progress(reminders, due_date)` is called after every batch. Returns a
+# summary dict; a window that already finished is not walked again unless
+# `restart` is set (which still skips the premiums already reminded).
+def run(start=None, days=DEFAULT_DAYS, maildir=None, template=TEMPLATE, restart=False,
+        batch_size=BATCH_SIZE, progress=None):
+    start = start or dates.today()
+    end = (date.fromisoformat(start) + timedelta(days=days)).isoformat()
+    key = window_key(start, end)
+    if maildir:
+        for sub in ('tmp', 'new', 'cur'):
+            os.makedirs(os.path.join(maildir, sub), exist_ok=True)
+
+    with db.transaction() as conn:
+        (last_due, last_policy, last_premium), finished = _checkpoint(conn, key, restart)
+    summary = {'window': key, 'resumed': bool(last_due) and not finished, 'policies': 0, 'reminders': 0,
+               'already_reminded': 0}
+    if finished:
+        summary['finished'] = True
+        return summary
+
+    params = {'start': start, 'end': end, 'limit': batch_size}
+    while True:
+        with db.connection() as conn:
+            cursor = conn.execute(queries.REMINDER_BATCH, dict(params, due_date=last_due, policy_id=last_policy,
+                                                               premium_id=last_premium))
+            columns = [d[0] for d in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        if not rows:
+            break
+        last_due, last_policy, last_premium = rows[-1]['due_date'], rows[-1]['policy_id'], rows[-1]['premium_id']
+
+        with db.transaction() as conn:
+            reminded = set(conn.execute(queries.REMINDED_PREMIUMS, (
+                db.array(row['policy_id'] for row in rows), db.array(row['due_date'] for row in rows))).fetchall())
+            created_at = datetime.now()
+            outbox = []
+            for row in rows:
+                premium = (row['policy_id'], row['due_date'])
+                if premium in reminded:
+                    continue
+                # A policy with two premiums on its first due date comes up twice
+                reminded.add(premium)
+                subject, body = render(template, row, end)
+                if maildir:
+                    _deliver(maildir, f"{row['policy_id']}.{row['due_date']}", row, subject, body)
+                outbox.append((row['policy_id'], row['due_date'], key, row['customer_id'], row['agent_id'],
+                               row['email'], row['phone'], subject, body, created_at))
+            conn.executemany(_INSERT, outbox)
+            conn.execute(_CHECKPOINT, (last_due, last_policy, last_premium, len(outbox), key))
+
+        summary['policies'] += len(rows)
+        summary['reminders'] += len(outbox)
+        summary['already_reminded'] += len(rows) - len(outbox)
+        if progress:
+            progress(summary['reminders'], last_due)
+
+    with db.transaction() as conn:
+        conn.execute("UPDATE reminder_runs SET finished_at=? WHERE window_key=?", (datetime.now(), key))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch premium reminders for every agent's customers")
+    parser.add_argument("--start", default=None, help="first due date of the window (default today)")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="days the window spans after --start")
+    parser.add_argument("--maildir", default=None, help="also write each new reminder to this maildir")
+    parser.add_argument("--template", default=None, help="template file: subject line, then the body")
+    parser.add_argument("--restart", action="store_true", help="walk the window again from its start")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="premium rows per batch")
+    args = parser.parse_args(argv)
+
+    if args.start:
+        try:
+            date.fromisoformat(args.start)
+        except ValueError:
+            parser.error("--start must be a date (YYYY-MM-DD)")
+    template = load_template(args.template) if args.template else TEMPLATE
+
+    def report(reminders, due_date):
+        print(f"\r{reminders} reminders, up to {due_date}", end="", flush=True)
+
+    db.init_db()
+    summary = run(args.start, args.days, args.maildir, template, args.restart, args.batch, progress=report)
+    print()
+    if summary.get('finished'):
+        print(f"window {summary['window']} already done; --restart to walk it again")
+        return
+    print(f"window {summary['window']}{' (resumed)' if summary['resumed'] else ''}: "
+          f"{summary['reminders']} reminders queued, {summary['already_reminded']} premiums already reminded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Rebuild or verify the trigger-maintained rollup tables.
+
+    python -m crm.rollups [--check]
+
+agent_rollups, agent_pending_months and policy_premium_counters are kept
+current by the triggers of migration 5. Rebuild them after writing to the
+database with triggers disabled (or with an older version of the app);
+--check only reports the rows that differ from a fresh rebuild.
+"""
+import argparse
+
+from crm import dates, db, queries
+
+ROLLUP_TABLES = ('agent_rollups', 'agent_pending_months', 'policy_premium_counters')
+
+_EMPTY_COUNTS = {'customers': 0, 'family_members': 0, 'policies': 0,
+                 'active': 0, 'lapsed': 0, 'completed': 0, 'cancelled': 0}
+
+
+# Dashboard counts for one agent, read from its rollup row
+def agent_counts(conn, agent_id):
+    cursor = conn.execute(queries.DASHBOARD_METRICS, (agent_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return dict(_EMPTY_COUNTS)
+    return dict(zip([d[0] for d in cursor.description], row))
+
+
+# (premiums, total amount, overdue premiums) of the agent's pending premiums,
+# all of them or (overdue_only) the overdue ones. Whole months come from the
+# rollup; only this month's premiums due before today are read from premiums.
+def pending_summary(conn, agent_id, overdue_only=False):
+    premiums, amount, past_premiums, past_amount = conn.execute(
+        queries.PENDING_MONTHS, {'agent_id': agent_id, 'month': dates.month()}).fetchone()
+    month_premiums, month_amount = conn.execute(
+        queries.PENDING_THIS_MONTH_OVERDUE, (agent_id, dates.month_start(), dates.today())).fetchone()
+    overdue = past_premiums + month_premiums
+    if overdue_only:
+        return overdue, past_amount + month_amount, overdue
+    return premiums, amount, overdue
+
+
+def rebuild(conn):
+    db.rebuild_rollups(conn)
+
+
+def _empty(values):
+    return not any(abs(v) >= 0.005 if isinstance(v, float) else v for v in values)
+
+
+# {key: values} of a rollup table, leaving out rows with nothing left in them
+def _rows(conn, table):
+    keys = 2 if table == 'agent_pending_months' else 1
+    return {row[:keys]: row[keys:] for row in conn.execute(f"SELECT * FROM {table}") if not _empty(row[keys:])}
+
+
+def _same(a, b):
+    return a is not None and b is not None and all(
+        abs(x - y) < 0.005 if isinstance(x, float) else x == y for x, y in zip(a, b))
+
+
+# {table: number of rows that differ from a fresh rebuild}; the rebuild is rolled back
+def check(conn):
+    current = {table: _rows(conn, table) for table in ROLLUP_TABLES}
+    conn.execute("SAVEPOINT rollup_check")
+    try:
+        rebuild(conn)
+        fresh = {table: _rows(conn, table) for table in ROLLUP_TABLES}
+    finally:
+        conn.execute("ROLLBACK TO rollup_check")
+        conn.execute("RELEASE rollup_check")
+    return {table: sum(not _same(current[table].get(key), fresh[table].get(key))
+                       for key in current[table].keys() | fresh[table].keys())
+            for table in ROLLUP_TABLES}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild or verify the rollup tables")
+    parser.add_argument("--check", action="store_true", help="report differences instead of rebuilding")
+    args = parser.parse_args(argv)
+
+    db.init_db()
+    with db.transaction() as conn:
+        if args.check:
+            differences = check(conn)
+            for table, count in differences.items():
+                print(f"{table}: {count} rows differ")
+            if any(differences.values()):
+                raise SystemExit(1)
+        else:
+            rebuild(conn)
+            for table in ROLLUP_TABLES:
+                print(f"{table}: {conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import numpy as np
+
+# Months between premiums for each payment frequency; anything else is billed monthly
+FREQUENCY_MONTHS = {
+    "Monthly": 1,
+    "Quarterly": 3,
+    "Half-Yearly": 6,
+    "Yearly": 12
+}
+
+
+def to_day(value):
+    return np.datetime64(value, 'D')
+
+
+def to_days(values):
+    return np.asarray(values, dtype='datetime64[D]')
+
+
+def _month_steps(frequencies):
+    return np.array([FREQUENCY_MONTHS.get(f, 1) for f in frequencies], dtype=np.int64)
+
+
+# The k-th due date of each policy: start month + k * step, on the start's
+# day of month clamped to the length of that month (Jan 31 -> Feb 28/29 ->
+# Mar 31, Feb 29 -> Feb 28 in common years)
+def _due_dates(start_months, start_days, steps, k):
+    months = start_months + k * steps
+    first = months.astype('datetime64[D]')
+    month_length = (months + 1).astype('datetime64[D]') - first
+    return first + np.minimum(start_days, month_length.astype(np.int64) - 1)
+
+
+# Premium schedules for many policies in one vectorized pass. Takes
+# equal-length arrays of start dates, end dates and frequencies and returns
+# (policy_index, due_date) arrays with one entry per premium: due dates
+# from start through end (inclusive), grouped by policy in input order.
+def premium_schedule(start_dates, end_dates, frequencies):
+    starts = to_days(start_dates)
+    ends = to_days(end_dates)
+    steps = _month_steps(frequencies)
+
+    start_months = starts.astype('datetime64[M]')
+    start_days = (starts - start_months.astype('datetime64[D]')).astype(np.int64)
+    elapsed = (ends.astype('datetime64[M]') - start_months).astype(np.int64)
+
+    # Last k whose due date is on or before the end date
+    last = elapsed // steps
+    last -= _due_dates(start_months, start_days, steps, last) > ends
+    counts = np.where(ends >= starts, last + 1, 0)
+
+    policy_index = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.cumsum(counts) - counts
+    k = np.arange(len(policy_index)) - offsets[policy_index]
+    due_dates = _due_dates(start_months[policy_index], start_days[policy_index], steps[policy_index], k)
+    return policy_index, due_dates
+
+
+# Due dates for a single policy as a datetime64[D] array
+def premium_due_dates(start_date, end_date, frequency):
+    return premium_schedule([start_date], [end_date], [frequency])[1]
+
+
+def generate_premium_dates(start_date, end_date, frequency):
+    return premium_due_dates(start_date, end_date, frequency).astype(object).tolist()
@@ -0,0 +1,119 @@
+"""Scheduled lapse detection.
+
+    python -m crm.scheduler              # run forever, every CRM_LAPSE_CHECK_INTERVAL seconds
+    python -m crm.scheduler --once       # one incremental pass
+    python -m crm.scheduler --once --full
+
+Each pass only looks at pending premiums whose due date crossed "now"
+since the previous pass, using the high-water mark persisted in
+scheduler_state, and recomputes the status of just those policies.
+The first pass (or --full) recomputes every policy.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from crm import cache, dates, db, statuses
+
+log = logging.getLogger(__name__)
+
+JOB = 'lapse_detection'
+DEFAULT_INTERVAL = int(os.environ.get('CRM_LAPSE_CHECK_INTERVAL', 900))
+
+# Pending premiums that became overdue inside [high-water mark, today)
+_NEWLY_OVERDUE = '''
+    SELECT DISTINCT pr.policy_id, c.agent_id
+    FROM premiums pr
+    JOIN policies p ON pr.policy_id = p.id
+    JOIN customers c ON p.customer_id = c.id
+    WHERE pr.status='Pending' AND pr.due_date >= ? AND pr.due_date < ?
+      AND p.status NOT IN ('Cancelled', 'Lapsed')
+'''
+
+
+def high_water_mark(conn):
+    row = conn.execute("SELECT high_water_mark FROM scheduler_state WHERE job=?", (JOB,)).fetchone()
+    return row[0] if row else None
+
+
+# One lapse detection pass. Returns (transitions, affected agent ids).
+def run_once(full=False):
+    with db.transaction() as conn:
+        today = dates.today()
+        mark = None if full else high_water_mark(conn)
+
+        if mark is None:
+            agent_ids = {row[0] for row in conn.execute("SELECT DISTINCT agent_id FROM customers")}
+            transitions = statuses.recompute_policy_statuses(conn)
+        elif mark >= today:
+            agent_ids, transitions = set(), {}
+        else:
+            rows = conn.execute(_NEWLY_OVERDUE, (mark, today)).fetchall()
+            agent_ids = {agent_id for _, agent_id in rows}
+            transitions = statuses.recompute_policy_statuses(conn, policy_ids=[policy_id for policy_id, _ in rows])
+
+        conn.execute('''INSERT INTO scheduler_state (job, high_water_mark, last_run_at) VALUES (?, ?, ?)
+                        ON CONFLICT (job) DO UPDATE SET high_water_mark=excluded.high_water_mark,
+                            last_run_at=excluded.last_run_at''', (JOB, today, datetime.now()))
+
+    # Statuses changed outside any page - drop the affected agents' cached results
+    if transitions:
+        for agent_id in agent_ids:
+            cache.invalidate(agent_id)
+    return transitions, agent_ids
+
+
+def run_forever(interval=DEFAULT_INTERVAL, stop_event=None):
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        try:
+            run_once()
+        except Exception:
+            # With the traceback; the thread keeps running and retries next interval
+            log.exception("lapse detection failed")
+        stop_event.wait(interval)
+
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+# Start the in-process background thread once per process; later calls are no-ops
+def start_background(interval=DEFAULT_INTERVAL):
+    global _thread
+    if interval <= 0:
+        return None
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=run_forever, args=(interval,),
+                                       name="crm-lapse-detection", daemon=True)
+            _thread.start()
+        return _thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scheduled lapse detection")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    parser.add_argument("--full", action="store_true", help="recompute every policy, ignoring the high-water mark")
+    parser.add_argument("--interval", type=int, default=DEFAULT_INTERVAL, help="seconds between passes")
+    args = parser.parse_args(argv)
+
+    db.init_db()
+    if args.once or args.full:
+        transitions, agent_ids = run_once(full=args.full)
+        print(statuses.describe(transitions))
+        return
+
+    while True:
+        started = time.perf_counter()
+        transitions, agent_ids = run_once()
+        print(f"{datetime.now():%Y-%m-%d %H:%M:%S} {sum(transitions.values())} policies updated "
+              f"for {len(agent_ids)} agents in {time.perf_counter() - started:.2f}s")
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
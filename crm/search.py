@@ -0,0 +1,46 @@
+import re
+
+import pandas as pd
+
+from crm import db, queries
+
+_TOKEN = re.compile(r'\w+')
+# PostgreSQL search documents split words on anything but letters and digits
+_WORD = re.compile(r'[^\W_]+')
+
+
+# FTS5 MATCH expression for a free-text term: every word must prefix-match
+# the customer's name, PAN, phone, email or a nominee/beneficiary name.
+# Returns None when the term has no searchable words.
+def match_expression(term):
+    tokens = _TOKEN.findall(term)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+# The same search as a to_tsquery('simple', ...) expression, for PostgreSQL
+def tsquery_expression(term):
+    words = _WORD.findall(term)
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def _expression(term):
+    return tsquery_expression(term) if db.dialect() == 'postgresql' else match_expression(term)
+
+
+def count_matches(conn, agent_id, term):
+    expression = _expression(term)
+    if expression is None:
+        return 0
+    return conn.execute(queries.CUSTOMER_SEARCH_COUNT, (expression, agent_id)).fetchone()[0]
+
+
+# One page of the agent's matching customers, best ranked first
+def search_customers(conn, agent_id, term, limit=20, offset=0):
+    expression = _expression(term)
+    if expression is None:
+        return pd.DataFrame()
+    return db.read_sql(conn, queries.CUSTOMER_SEARCH, (expression, agent_id, limit, offset))
@@ -0,0 +1,117 @@
+"""Set-based policy status recomputation.
+
+    python -m crm.statuses [--agent AGENT_ID]
+
+A policy that is not Cancelled is Completed once it has no pending
+premiums, Lapsed while any pending premium is past due, and Active
+otherwise. Both facts come from the trigger-maintained
+policy_premium_counters. All statuses in scope are recomputed with one
+INSERT ... SELECT into a temp table and one UPDATE, inside the caller's
+transaction.
+"""
+import argparse
+
+from crm import dates, db, queries
+
+# SQLite's default host-parameter limit is 999 on older builds
+_MAX_PARAMS = 900
+
+# The one parameter is today's date
+_NEW_STATUS = '''
+    CASE
+        WHEN COALESCE(k.pending, 0) = 0 THEN 'Completed'
+        WHEN k.next_due < ? THEN 'Lapsed'
+        ELSE 'Active'
+    END
+'''
+
+
+def _collect_changes(conn, scope_sql, params):
+    conn.execute(f'''
+        INSERT INTO policy_status_changes (id, old_status, new_status)
+        SELECT id, old_status, new_status FROM (
+            SELECT p.id, p.status as old_status, {_NEW_STATUS} as new_status
+            FROM policies p
+            LEFT JOIN policy_premium_counters k ON k.policy_id = p.id
+            {scope_sql}
+            AND COALESCE(p.status, '') != 'Cancelled'
+        ) changes
+        WHERE old_status IS NULL OR old_status != new_status
+        ON CONFLICT (id) DO UPDATE SET old_status = excluded.old_status, new_status = excluded.new_status
+    ''', [dates.today(), *params])
+
+
+# Recompute statuses for one agent's policies, the given policy ids, or
+# (with neither) every policy. Must run inside db.transaction().
+# Returns {(old_status, new_status): number of policies moved}.
+def recompute_policy_statuses(conn, agent_id=None, policy_ids=None):
+    conn.execute('''CREATE TEMP TABLE IF NOT EXISTS policy_status_changes
+                    (id INTEGER PRIMARY KEY, old_status TEXT, new_status TEXT)''')
+    conn.execute("DELETE FROM policy_status_changes")
+
+    if policy_ids is not None:
+        policy_ids = list(policy_ids)
+        for start in range(0, len(policy_ids), _MAX_PARAMS):
+            chunk = policy_ids[start:start + _MAX_PARAMS]
+            placeholders = ", ".join("?" * len(chunk))
+            _collect_changes(conn, f"WHERE p.id IN ({placeholders})", chunk)
+    elif agent_id is not None:
+        _collect_changes(conn, "JOIN customers c ON p.customer_id = c.id WHERE c.agent_id = ?", (agent_id,))
+    else:
+        _collect_changes(conn, "WHERE 1=1", ())
+
+    conn.execute('''
+        UPDATE policies
+        SET status = (SELECT ch.new_status FROM policy_status_changes ch WHERE ch.id = policies.id)
+        WHERE id IN (SELECT id FROM policy_status_changes)
+    ''')
+
+    transitions = {}
+    for old_status, new_status, count in conn.execute('''
+            SELECT old_status, new_status, COUNT(*) FROM policy_status_changes
+            GROUP BY old_status, new_status'''):
+        transitions[(old_status, new_status)] = count
+    conn.execute("DELETE FROM policy_status_changes")
+    return transitions
+
+
+# Single-policy status update after a payment, from the policy's premium
+# counters. Cancelled policies keep their status. Returns the new status.
+def update_policy_status(conn, policy_id):
+    status, pending, overdue = conn.execute(
+        queries.POLICY_STATUS_COUNTERS, {'today': dates.today(), 'policy_id': policy_id}).fetchone()
+    if status == 'Cancelled':
+        return status
+    new_status = 'Completed' if pending == 0 else 'Lapsed' if overdue else 'Active'
+    if new_status != status:
+        conn.execute("UPDATE policies SET status=? WHERE id=?", (new_status, policy_id))
+    return new_status
+
+
+# Cancel a policy: its pending premiums are deleted, paid ones kept
+def cancel_policy(conn, policy_id):
+    conn.execute("DELETE FROM premiums WHERE policy_id=? AND status='Pending'", (policy_id,))
+    conn.execute("UPDATE policies SET status='Cancelled' WHERE id=?", (policy_id,))
+
+
+# One line per transition, e.g. "Active → Lapsed: 12"
+def describe(transitions):
+    if not transitions:
+        return "No policy status changes"
+    return "\n".join(f"{old or 'None'} → {new}: {count}"
+                     for (old, new), count in sorted(transitions.items(), key=lambda t: (str(t[0][0]), t[0][1])))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute policy statuses")
+    parser.add_argument("--agent", help="only this agent's policies (default: all agents)")
+    args = parser.parse_args(argv)
+
+    db.init_db()
+    with db.transaction() as conn:
+        transitions = recompute_policy_statuses(conn, agent_id=args.agent)
+    print(describe(transitions))
+
+
+if __name__ == "__main__":
+    main()
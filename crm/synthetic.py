@@ -0,0 +1,228 @@
+"""Seeded synthetic book of business for load testing.
+
+    python -m crm.synthetic --agents 20 --policies 100000 [--seed 42] [--db data/crm.db] [--replace]
+
+Agents get households of customers (a primary plus spouse, children,
+parents or siblings linked through parent_id/relationship), policies
+across every frequency, type and provider, and full premium schedules.
+Past premiums are paid, left pending (Lapsed) or dropped with the policy
+(Cancelled), and policy statuses follow the same rule as crm.statuses.
+The same seed and --today always produce the same database. --db may
+also be a postgresql:// URL, whose schema must start out empty.
+"""
+import argparse
+import os
+import random
+from datetime import date, timedelta
+
+import numpy as np
+
+from crm import db, schedule
+
+FREQUENCIES = ("Monthly", "Quarterly", "Half-Yearly", "Yearly")
+FREQUENCY_WEIGHTS = (0.3, 0.25, 0.2, 0.25)
+TYPES = ("Life Insurance", "Health Insurance", "Motor Insurance", "Home Insurance", "Travel Insurance")
+PROVIDERS = ("LIC", "HDFC Life", "ICICI Prudential", "SBI Life", "Max Life", "Star Health", "Bajaj Allianz")
+INCOME_RANGES = ("Below ₹5L", "₹5L-₹10L", "₹10L-₹20L", "Above ₹20L")
+MEMBER_RELATIONSHIPS = ("Spouse", "Child", "Child", "Parent", "Sibling")
+# Share of policies whose holder stops paying (Lapsed) or that were cancelled
+LAPSE_RATE = 0.12
+CANCEL_RATE = 0.08
+# Customers per chunk; each chunk is generated and inserted on its own
+CHUNK_CUSTOMERS = 5000
+
+_SYLLABLES = ("ra", "vi", "sha", "ma", "an", "ku", "de", "pa", "ti", "la", "su", "ni", "ka", "ja", "ya",
+              "ha", "go", "me", "ru", "sa", "bi", "na", "chan", "dra", "kri", "shna", "pri", "mi", "lo", "ve")
+_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def _first_name(rnd):
+    return (rnd.choice(_SYLLABLES) + rnd.choice(_SYLLABLES)).title()
+
+
+def _surname(rnd):
+    return (rnd.choice(_SYLLABLES) + rnd.choice(_SYLLABLES) + "r").title()
+
+
+# Valid-looking PAN, unique for n < 6.76 million: the 5th and 10th letters
+# and the four digits encode n
+def _pan(rnd, n):
+    q = n // 10000
+    return (rnd.choice(_LETTERS) + rnd.choice(_LETTERS) + rnd.choice(_LETTERS) + "P"
+            + _LETTERS[q % 26] + f"{n % 10000:04d}" + _LETTERS[q // 26 % 26])
+
+
+def _aadhar(rnd):
+    return str(rnd.randint(2, 9)) + f"{rnd.randrange(10 ** 11):011d}"
+
+
+# Households for one chunk: rows for the customers table plus their
+# [(customer_id, name, primary_id)] in insertion order
+def _customers(rnd, agent_id, first_n, count, today):
+    rows, people = [], []
+    n = first_n
+    while n < first_n + count:
+        surname = _surname(rnd)
+        size = min(rnd.choice((1, 1, 2, 2, 3, 4)), first_n + count - n)
+        primary_id = n + 1
+        income = rnd.choice(INCOME_RANGES)
+        for member in range(size):
+            customer_id = n + 1
+            name = f"{_first_name(rnd)} {surname}"
+            parent_id = primary_id if member else None
+            relationship = rnd.choice(MEMBER_RELATIONSHIPS) if member else None
+            email = f"{name.lower().replace(' ', '.')}{n}@example.com" if rnd.random() < 0.7 else None
+            created = today - timedelta(days=rnd.randint(0, 3650))
+            rows.append((customer_id, f"C{n:08x}", agent_id, _pan(rnd, n), _aadhar(rnd), name, f"9{n:09d}", email,
+                         income, parent_id, relationship, created))
+            people.append((customer_id, name, primary_id))
+            n += 1
+    return rows, people
+
+
+# Policies for one chunk of customers, as column arrays
+def _policies(rnd, rng, people, count, first_n, today, years):
+    owner = np.sort(rng.integers(0, len(people), count))
+    frequency = rng.choice(len(FREQUENCIES), count, p=FREQUENCY_WEIGHTS)
+    start = np.datetime64(today) - rng.integers(0, 365 * years, count).astype('timedelta64[D]')
+    term_years = rng.choice((1, 2, 3, 5, 10), count, p=(0.2, 0.25, 0.25, 0.2, 0.1))
+    end = start + np.round(term_years * 365.25).astype('timedelta64[D]') - 1
+    amount = np.round(rng.lognormal(8.0, 0.8, count), -1).clip(500, 500000)
+    behaviour = rng.choice(3, count, p=(1 - LAPSE_RATE - CANCEL_RATE, LAPSE_RATE, CANCEL_RATE))
+
+    rows = []
+    for i in range(count):
+        n = first_n + i
+        customer_id, name, primary_id = people[owner[i]]
+        # Family members' policies are often bought by the primary
+        holder_id = primary_id if customer_id != primary_id and rnd.random() < 0.5 else customer_id
+        family = customer_id != holder_id or rnd.random() < 0.2
+        nominee = f"{_first_name(rnd)} {name.split()[-1]}"
+        rows.append([n + 1, f"P{n:08x}", customer_id, holder_id, f"POL{n:09d}", float(amount[i]),
+                     FREQUENCIES[frequency[i]], rnd.choice(TYPES), rnd.choice(PROVIDERS),
+                     "Family" if family else "Individual", nominee,
+                     start[i].item(), end[i].item(), None])
+    return rows, start, end, frequency, amount, behaviour
+
+
+# Premium rows and the resulting policy statuses for one chunk
+def _premiums(rng, policies, start, end, frequency, amount, behaviour, first_premium, today):
+    today = np.datetime64(today)
+    policy_index, due = schedule.premium_schedule(start, end, [FREQUENCIES[f] for f in frequency])
+    counts = np.bincount(policy_index, minlength=len(policies))
+    past = due < today
+    past_count = np.bincount(policy_index, weights=past, minlength=len(policies)).astype(np.int64)
+
+    # Lapsing policies leave their last one to three past premiums unpaid
+    k = np.arange(len(due)) - (np.cumsum(counts) - counts)[policy_index]
+    unpaid_from = past_count - rng.integers(1, 4, len(policies))
+    unpaid = past & (behaviour[policy_index] == 1) & (k >= unpaid_from[policy_index])
+    paid = past & ~unpaid
+    # Cancelled policies keep their paid history only
+    keep = paid | (behaviour[policy_index] != 2)
+
+    paid_date = np.minimum(due + rng.integers(0, 15, len(due)).astype('timedelta64[D]'), today - 1)
+    pending = ~paid & keep
+    overdue = pending & past
+    has_pending = np.bincount(policy_index, weights=pending, minlength=len(policies)) > 0
+    has_overdue = np.bincount(policy_index, weights=overdue, minlength=len(policies)) > 0
+    status = np.where(behaviour == 2, "Cancelled",
+                      np.where(~has_pending, "Completed", np.where(has_overdue, "Lapsed", "Active")))
+    for row, value in zip(policies, status):
+        row[-1] = str(value)
+
+    rows = [(first_premium + j + 1, policies[p][0], d.item(), float(amount[p]),
+             "Paid" if is_paid else "Pending", paid_on.item() if is_paid else None)
+            for j, (p, d, is_paid, paid_on)
+            in enumerate(zip(policy_index[keep], due[keep], paid[keep], paid_date[keep]))]
+    return rows
+
+
+# Fill the connection's database with `agents` agents sharing `policies`
+# policies (about two per customer). Must run inside db.transaction().
+# Returns {'agents', 'customers', 'policies', 'premiums'} counts.
+def generate(conn, agents=10, policies=10000, seed=42, today=None, years=5, progress=None):
+    today = today or date.today()
+    rnd = random.Random(seed)
+    rng = np.random.default_rng(seed)
+    totals = {'agents': agents, 'customers': 0, 'policies': 0, 'premiums': 0}
+
+    conn.executemany("INSERT INTO agents (id, name, email, phone, created_at) VALUES (?, ?, ?, ?, ?)",
+                     [(f"A{a:04d}", f"{_first_name(rnd)} {_surname(rnd)}", f"agent{a}@insureCRM.com",
+                       f"98{a:08d}", today) for a in range(agents)])
+
+    for a in range(agents):
+        agent_id = f"A{a:04d}"
+        agent_policies = policies // agents + (a < policies % agents)
+        agent_customers = max(1, agent_policies // 2)
+        done = 0
+        while done < agent_customers:
+            count = min(CHUNK_CUSTOMERS, agent_customers - done)
+            chunk_policies = agent_policies * (done + count) // agent_customers - agent_policies * done // agent_customers
+
+            customer_rows, people = _customers(rnd, agent_id, totals['customers'], count, today)
+            conn.executemany(
+                "INSERT INTO customers (id, display_id, agent_id, pan, aadhar, name, phone, email, income_range, parent_id, relationship, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                customer_rows)
+
+            policy_rows, start, end, frequency, amount, behaviour = _policies(
+                rnd, rng, people, chunk_policies, totals['policies'], today, years)
+            premium_rows = _premiums(rng, policy_rows, start, end, frequency, amount, behaviour,
+                                     totals['premiums'], today)
+            conn.executemany(
+                "INSERT INTO policies (id, display_id, customer_id, policy_holder_id, policy_number, premium_amount, frequency, type, provider, coverage_type, nominee_name, start_date, end_date, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                policy_rows)
+            conn.executemany(
+                "INSERT INTO premiums (id, policy_id, due_date, amount, status, paid_date) VALUES (?, ?, ?, ?, ?, ?)",
+                premium_rows)
+
+            done += count
+            totals['customers'] += count
+            totals['policies'] += len(policy_rows)
+            totals['premiums'] += len(premium_rows)
+            if progress:
+                progress(totals)
+    # The rows above carry their own ids; later inserts continue after them
+    db.restart_ids(conn)
+    return totals
+
+
+# Create `path` from scratch and fill it; closes the pool afterwards
+def build(path, agents=10, policies=10000, seed=42, today=None, years=5, progress=None):
+    db.configure(path)
+    db.init_db()
+    with db.transaction() as conn:
+        totals = generate(conn, agents, policies, seed, today, years, progress)
+    db.close()
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seeded synthetic book of business")
+    parser.add_argument("--agents", type=int, default=10)
+    parser.add_argument("--policies", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--years", type=int, default=5, help="policies started within this many years")
+    parser.add_argument("--today", type=date.fromisoformat, default=None, help="reference date (YYYY-MM-DD)")
+    parser.add_argument("--db", default=db.DB_PATH,
+                        help=f"database file or postgresql:// URL (default {db.DB_PATH})".replace("%", "%%"))
+    parser.add_argument("--replace", action="store_true", help="delete an existing database file first")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.db):
+        if not args.replace:
+            parser.error(f"{args.db} already exists; pass --replace to start from an empty database")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    def report(totals):
+        print(f"\r{totals['customers']} customers, {totals['policies']} policies, "
+              f"{totals['premiums']} premiums", end="", flush=True)
+
+    build(args.db, args.agents, args.policies, args.seed, args.today, args.years, progress=report)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import json
+
+from crm import dates, db, queries, rollups
+
+
+# Premium count, total amount and overdue count for the whole window. All
+# upcoming and Overdue over every status come from the by-month rollup.
+def summary(conn, agent_id, days=None, status_filter="All"):
+    if status_filter == "All" and (days is None or days < 0):
+        return rollups.pending_summary(conn, agent_id, overdue_only=days is not None)
+    query, params = queries.upcoming_premiums_summary_query(agent_id, days, status_filter)
+    return conn.execute(query, params).fetchone()
+
+
+# Walking the pending-premium index in sort order reads about
+# page_size * window / premium_count rows per page; collecting the agent's
+# premiums and sorting them reads premium_count. Pick the smaller. Costs a
+# count over the pending-premium index, so callers keep the answer per view.
+def dense_window(conn, days, sort, premium_count, page_size=50):
+    if sort not in queries.PREMIUM_SORTS or not premium_count:
+        return False
+    # Inside a due-date window the amount order still needs a sort of the whole window
+    if sort == "Amount" and days is not None:
+        return False
+    query, params = queries.upcoming_window_count_query(days)
+    window = conn.execute(query, params).fetchone()[0]
+    return page_size * window < premium_count * premium_count
+
+
+# One page of upcoming premiums after the keyset cursor `after`. Returns the
+# page and the cursor of the next page (None on the last page).
+def page(conn, agent_id, days=None, status_filter="All", sort="Due Date", after=None,
+         page_size=50, dense=False):
+    query, params = queries.upcoming_premiums_query(agent_id, days, status_filter, sort, after=after,
+                                                    limit=page_size + 1, dense=dense)
+    premiums = dates.parse(db.read_sql(conn, query, params))
+    next_cursor = None
+    if len(premiums) > page_size:
+        premiums = premiums.iloc[:page_size]
+        next_cursor = json.loads(premiums['row_key'].iloc[-1])
+    return premiums.drop(columns='row_key'), next_cursor
+
+
+# Every upcoming premium of the given policies in the window
+def for_policies(conn, agent_id, policy_numbers, days=None, status_filter="All"):
+    query, params = queries.upcoming_premiums_query(agent_id, days, status_filter,
+                                                    policy_numbers=policy_numbers)
+    return dates.parse(db.read_sql(conn, query, params)).drop(columns='row_key')
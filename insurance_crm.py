@@ -1,10 +1,12 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
-import uuid
+import io
 from datetime import datetime, timedelta
 import os
 
+from crm import (agents, cache, dates, db, enrollment, export, families, importer, jobs, metrics, payments,
+                 profiling, queries, records, scheduler, search, statuses, upcoming)
+
 # Set up the page
 st.set_page_config(
     page_title="Insurance CRM System",
@@ -14,46 +16,8 @@ st.set_page_config(
 )
 
 
-# Database setup
-def init_db():
-    # Create data directory if it doesn't exist
-    if not os.path.exists('data'):
-        os.makedirs('data')
-
-    # Connect to database in data directory
-    conn = sqlite3.connect('data/crm.db')
-    c = conn.cursor()
-
-    # Create tables if they don't exist
-    c.execute('''CREATE TABLE IF NOT EXISTS agents
-                (id TEXT PRIMARY KEY, name TEXT, email TEXT, phone TEXT, created_at TIMESTAMP)''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS customers
-                (id TEXT PRIMARY KEY, agent_id TEXT, pan TEXT UNIQUE, aadhar TEXT,
-                name TEXT, phone TEXT, email TEXT, income_range TEXT,
-                parent_id TEXT, relationship TEXT,
-                created_at TIMESTAMP, FOREIGN KEY(agent_id) REFERENCES agents(id))''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS policies
-                (id TEXT PRIMARY KEY, customer_id TEXT, policy_holder_id TEXT, policy_number TEXT UNIQUE,
-                premium_amount REAL, frequency TEXT, type TEXT, provider TEXT,
-                coverage_type TEXT, nominee_name TEXT, nominee_pan TEXT, nominee_aadhar TEXT,
-                beneficiary_name TEXT, beneficiary_pan TEXT, beneficiary_aadhar TEXT,
-                start_date TIMESTAMP, end_date TIMESTAMP, status TEXT,
-                FOREIGN KEY(customer_id) REFERENCES customers(id),
-                FOREIGN KEY(policy_holder_id) REFERENCES customers(id))''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS premiums
-                (id TEXT PRIMARY KEY, policy_id TEXT, due_date TIMESTAMP,
-                amount REAL, status TEXT, paid_date TIMESTAMP,
-                FOREIGN KEY(policy_id) REFERENCES policies(id))''')
-
-    conn.commit()
-    conn.close()
-
-
-# Initialize database
-init_db()
+# Date columns of result tables (datetime64) shown without a time of day
+DATE_COLUMNS = {column: st.column_config.DateColumn(format="YYYY-MM-DD") for column in dates.DATE_COLUMNS}
 
 # Session state setup
 if 'current_agent' not in st.session_state:
@@ -64,37 +28,33 @@ if 'page' not in st.session_state:
 
 # Agent authentication
 def agent_login(agent_id):
-    conn = sqlite3.connect('data/crm.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM agents WHERE id=?", (agent_id,))
-    agent = c.fetchone()
-    conn.close()
+    with db.connection() as conn:
+        agent = agents.get_agent(conn, agent_id)
     if agent:
-        st.session_state.current_agent = {
-            'id': agent[0],
-            'name': agent[1],
-            'email': agent[2],
-            'phone': agent[3]
-        }
+        st.session_state.current_agent = agent
         return True
     return False
 
 
 # Create a demo agent if none exists
 def create_demo_agent():
-    conn = sqlite3.connect('data/crm.db')
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM agents")
-    count = c.fetchone()[0]
-    if count == 0:
-        demo_agent_id = "A1001"
-        c.execute("INSERT INTO agents (id, name, email, phone, created_at) VALUES (?, ?, ?, ?, ?)",
-                  (demo_agent_id, "John Doe", "john@insureCRM.com", "9876543210", datetime.now()))
-        conn.commit()
-    conn.close()
+    with db.transaction() as conn:
+        agents.ensure_demo_agent(conn)
+
+
+# Streamlit re-executes this script on every interaction; schema setup,
+# migrations and the demo agent only need to happen once per server process
+# and database file
+@st.cache_resource(show_spinner=False)
+def bootstrap(db_path):
+    db.init_db()
+    create_demo_agent()
+    # Keep Lapsed statuses fresh in the background (CRM_LAPSE_CHECK_INTERVAL=0 disables)
+    scheduler.start_background()
+    return db_path
 
 
-create_demo_agent()
+bootstrap(db.DB_PATH)
 
 
 # Navigation function
@@ -120,7 +80,9 @@ def render_sidebar():
             "Policy Enrollment": "📝",
             "Records": "📂",
             "Family Management": "👨‍👩‍👧‍👦",
-            "Upcoming Premiums": "💰"
+            "Upcoming Premiums": "💰",
+            "Bulk Import": "📥",
+            "Performance": "⏱️"
         }
 
         for page, icon in nav_options.items():
@@ -132,8 +94,10 @@ def render_sidebar():
         st.divider()
         st.subheader("Data Management")
 
-        if st.button("💾 Export Data (CSV + TXT)", use_container_width=True):
-            export_data_to_csv_and_txt()
+        export_format = st.selectbox("Export format", export.FORMATS, key="export_format")
+        if st.button("💾 Export Data", use_container_width=True):
+            export_data_to_csv_and_txt(export_format)
+        render_job_progress('export', "Exporting", show_export_result)
 
         st.divider()
 
@@ -144,134 +108,69 @@ def render_sidebar():
                 st.rerun()
 
 
-# Data export function - FIXED VERSION
+# Data export - streams the agent's data to CRM_EXPORT_DIR as a background job
 from datetime import datetime
 
 
-def export_data_to_csv_and_txt():
-    try:
-        export_path = r"D:\test"
-        if not os.path.exists(export_path):
-            os.makedirs(export_path)
+def export_data_to_csv_and_txt(fmt="csv"):
+    job = jobs.submit('export', st.session_state.current_agent['id'], {'format': fmt})
+    if job['params']['format'] != fmt:
+        st.sidebar.warning(f"An export ({job['params']['format']}) is already running")
 
-        conn = sqlite3.connect('data/crm.db')
 
-        # Add timestamp to avoid locked overwrite issues
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+def show_export_result(job):
+    files = job['result']['files']
+    st.success(f"✅ Data exported successfully to {os.path.dirname(files[0])}")
+    st.info("📁 Files created with timestamp suffix: " + ", ".join(os.path.basename(f) for f in files))
 
-        # --- Customers ---
-        customers_df = pd.read_sql_query(
-            "SELECT * FROM customers WHERE agent_id=?",
-            conn, params=(st.session_state.current_agent['id'],)
-        )
-        customers_file = os.path.join(export_path, f"customers_export_{timestamp}.csv")
-        customers_df.to_csv(customers_file, index=False, encoding="utf-8-sig")
-
-        # --- Policies with all statuses ---
-        policies_df = pd.read_sql_query('''
-            SELECT p.*, c.name as customer_name 
-            FROM policies p 
-            JOIN customers c ON p.customer_id = c.id 
-            WHERE c.agent_id=?
-        ''', conn, params=(st.session_state.current_agent['id'],))
-        policies_file = os.path.join(export_path, f"policies_export_{timestamp}.csv")
-        policies_df.to_csv(policies_file, index=False, encoding="utf-8-sig")
-
-        # --- Premiums ---
-        premiums_df = pd.read_sql_query('''
-            SELECT pr.*, p.policy_number, c.name as customer_name, p.status as policy_status
-            FROM premiums pr 
-            JOIN policies p ON pr.policy_id = p.id 
-            JOIN customers c ON p.customer_id = c.id 
-            WHERE c.agent_id=?
-        ''', conn, params=(st.session_state.current_agent['id'],))
-        premiums_file = os.path.join(export_path, f"premiums_export_{timestamp}.csv")
-        premiums_df.to_csv(premiums_file, index=False, encoding="utf-8-sig")
-
-        # --- TXT Export ---
-        txt_file = os.path.join(export_path, f"data_export_{timestamp}.txt")
-        with open(txt_file, "w", encoding="utf-8") as f:
-            f.write("=== Customers ===\n\n")
-            f.write(customers_df.to_string(index=False))
-            f.write("\n\n=== Policies ===\n\n")
-            f.write(policies_df.to_string(index=False))
-            f.write("\n\n=== Premiums ===\n\n")
-            f.write(premiums_df.to_string(index=False))
-            f.write("\n")
-
-        conn.close()
-
-        st.sidebar.success(f"✅ Data exported successfully to {export_path}")
-        st.sidebar.info("📁 Files created with timestamp suffix (CSV + TXT)")
-
-    except Exception as e:
-        st.sidebar.error(f"❌ Error exporting data: {str(e)}")
-
-
-# Add this function to update policy status automatically
-
-
-def update_policy_status(policy_id, conn):
-    c = conn.cursor()
-
-    # First check if policy is already cancelled
-    c.execute("SELECT status FROM policies WHERE id=?", (policy_id,))
-    current_status = c.fetchone()[0]
-
-    # If policy is already cancelled, don't change the status
-    if current_status == 'Cancelled':
-        return
 
-    # Check if all premiums are paid
-    c.execute("SELECT COUNT(*) FROM premiums WHERE policy_id=? AND status='Pending'", (policy_id,))
-    pending_count = c.fetchone()[0]
+def show_status_update_result(job):
+    st.success("All policy statuses updated!")
+    if job['result']['policies']:
+        st.info(job['result']['summary'])
 
-    if pending_count == 0:
-        # All premiums paid - mark as Completed
-        c.execute("UPDATE policies SET status='Completed' WHERE id=?", (policy_id,))
-    else:
-        # Check if any premium is overdue
-        c.execute("SELECT COUNT(*) FROM premiums WHERE policy_id=? AND status='Pending' AND due_date < date('now')",
-                  (policy_id,))
-        overdue_count = c.fetchone()[0]
-
-        if overdue_count > 0:
-            # Has overdue premiums - mark as Lapsed
-            c.execute("UPDATE policies SET status='Lapsed' WHERE id=?", (policy_id,))
-        else:
-            # Has pending premiums but none overdue - mark as Active
-            c.execute("UPDATE policies SET status='Active' WHERE id=?", (policy_id,))
 
-    conn.commit()
+# Progress of the agent's latest job of this kind. While it is queued or
+# running, only this fragment reruns (every second) to poll the jobs table.
+def render_job_progress(kind, label, show_result):
+    job = jobs.latest(st.session_state.current_agent['id'], kind)
+    if job is None:
+        return
 
-# Modify the mark_premium_as_paid function to call update_policy_status
-def mark_premium_as_paid(policy_id, conn):
-    premium = pd.read_sql_query(
-        "SELECT * FROM premiums WHERE policy_id=? AND status='Pending' ORDER BY due_date LIMIT 1",
-        conn, params=(policy_id,)
-    )
-    if not premium.empty:
-        c = conn.cursor()
-        c.execute("UPDATE premiums SET status='Paid', paid_date=? WHERE id=?",
-                  (datetime.now().date(), premium.iloc[0]['id']))
-        conn.commit()
+    polling = job['status'] in jobs.ACTIVE
+
+    @st.fragment(run_every=1 if polling else None)
+    def progress():
+        current = jobs.get(job['id'])
+        if polling and current['status'] not in jobs.ACTIVE:
+            # Finished - rerun the whole page once to stop polling
+            st.rerun()
+        if current['status'] == 'queued':
+            st.progress(0.0, text=f"{label} queued…")
+        elif current['status'] == 'running':
+            st.progress(jobs.fraction(current), text=f"{label}… {current['done']:,}/{current['total']:,}")
+        elif current['status'] == 'failed':
+            st.error(f"❌ {label} failed: {current['error']}")
+        else:
+            show_result(current)
 
-        # Update policy status after marking premium as paid
-        update_policy_status(policy_id, conn)
-        st.success("Premium marked as paid!")
+    progress()
 
 
-# Add a function to cancel a policy
-def cancel_policy(policy_id, conn):
-    c = conn.cursor()
+# Mark the policy's earliest pending premium as paid (status follows from its counters)
+def mark_premium_as_paid(policy_id):
+    with db.transaction() as conn:
+        payments.pay_premium(conn, policy_id)
+    cache.invalidate(st.session_state.current_agent['id'])
+    st.success("Premium marked as paid!")
 
-    # First, delete all pending premiums for this policy
-    c.execute("DELETE FROM premiums WHERE policy_id=? AND status='Pending'", (policy_id,))
 
-    # Then mark the policy as cancelled (direct update without calling update_policy_status)
-    c.execute("UPDATE policies SET status='Cancelled' WHERE id=?", (policy_id,))
+# Add a function to cancel a policy
+def cancel_policy(policy_id):
+    with db.transaction() as conn:
+        statuses.cancel_policy(conn, policy_id)
 
-    conn.commit()
+    cache.invalidate(st.session_state.current_agent['id'])
     st.success("Policy cancelled successfully! All pending premiums have been removed.")
     st.rerun()
 
@@ -299,53 +198,11 @@ def login_page():
 def dashboard_page():
     st.title("📊 Insurance CRM Dashboard")
 
-    # Dashboard metrics
-    conn = sqlite3.connect('data/crm.db')
-
-    # Get counts
-    customers_count = pd.read_sql_query(
-        "SELECT COUNT(*) as count FROM customers WHERE agent_id=?",
-        conn, params=(st.session_state.current_agent['id'],)
-    ).iloc[0]['count']
-
-    policies_count = pd.read_sql_query(
-        "SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=?",
-        conn, params=(st.session_state.current_agent['id'],)
-    ).iloc[0]['count']
-
-    active_policies_count = pd.read_sql_query(
-        "SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND p.status='Active'",
-        conn, params=(st.session_state.current_agent['id'],)
-    ).iloc[0]['count']
-
-    # Add counts for other statuses
-    lapsed_policies_count = pd.read_sql_query(
-        "SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND p.status='Lapsed'",
-        conn, params=(st.session_state.current_agent['id'],)
-    ).iloc[0]['count']
-
-    completed_policies_count = pd.read_sql_query(
-        "SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND p.status='Completed'",
-        conn, params=(st.session_state.current_agent['id'],)
-    ).iloc[0]['count']
-
-    cancelled_policies_count = pd.read_sql_query(
-        "SELECT COUNT(*) as count FROM policies p JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND p.status='Cancelled'",
-        conn, params=(st.session_state.current_agent['id'],)
-    ).iloc[0]['count']
-
-    family_members_count = pd.read_sql_query(
-        "SELECT COUNT(*) as count FROM customers WHERE agent_id=? AND parent_id IS NOT NULL",
-        conn, params=(st.session_state.current_agent['id'],)
-    ).iloc[0]['count']
+    # Dashboard metrics (cached per agent, refreshed after every write)
+    counts = metrics.dashboard_metrics(st.session_state.current_agent['id'])
 
     # Get upcoming premiums (next 30 days)
-    upcoming_premiums = pd.read_sql_query(
-        "SELECT pr.due_date, pr.amount, c.name as customer_name, p.policy_number FROM premiums pr JOIN policies p ON pr.policy_id = p.id JOIN customers c ON p.customer_id = c.id WHERE c.agent_id=? AND pr.status='Pending' AND pr.due_date BETWEEN date('now') AND date('now', '+30 days') ORDER BY pr.due_date",
-        conn, params=(st.session_state.current_agent['id'],)
-    )
-
-    conn.close()
+    upcoming_premiums = metrics.upcoming_premiums(st.session_state.current_agent['id'])
 
     # Quick actions
     st.subheader("Quick Actions")
@@ -364,23 +221,23 @@ def dashboard_page():
     st.subheader("Business Overview")
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("👥 Total Customers", customers_count)
+        st.metric("👥 Total Customers", counts['customers'])
     with col2:
-        st.metric("📋 Total Policies", policies_count)
+        st.metric("📋 Total Policies", counts['policies'])
     with col3:
-        st.metric("✅ Active Policies", active_policies_count)
+        st.metric("✅ Active Policies", counts['active'])
     with col4:
-        st.metric("👨‍👩‍👧‍👦 Family Members", family_members_count)
+        st.metric("👨‍👩‍👧‍👦 Family Members", counts['family_members'])
 
     # Additional policy status metrics
     st.subheader("Policy Status Overview")
     status_col1, status_col2, status_col3, status_col4 = st.columns(4)
     with status_col1:
-        st.metric("⏰ Lapsed Policies", lapsed_policies_count)
+        st.metric("⏰ Lapsed Policies", counts['lapsed'])
     with status_col2:
-        st.metric("🏁 Completed Policies", completed_policies_count)
+        st.metric("🏁 Completed Policies", counts['completed'])
     with status_col3:
-        st.metric("❌ Cancelled Policies", cancelled_policies_count)
+        st.metric("❌ Cancelled Policies", counts['cancelled'])
     with status_col4:
         total_pending = upcoming_premiums['amount'].sum() if not upcoming_premiums.empty else 0
         st.metric("💰 Pending Premiums", f"₹{total_pending:,.2f}")
@@ -388,8 +245,7 @@ def dashboard_page():
     # Upcoming premiums
     st.subheader("📅 Upcoming Premiums (Next 30 Days)")
     if not upcoming_premiums.empty:
-        upcoming_premiums['due_date'] = pd.to_datetime(upcoming_premiums['due_date']).dt.date
-        st.dataframe(upcoming_premiums, use_container_width=True)
+        st.dataframe(upcoming_premiums, use_container_width=True, column_config=DATE_COLUMNS)
 
         # Calculate total upcoming premiums
         total_upcoming = upcoming_premiums['amount'].sum()
@@ -407,12 +263,8 @@ def customer_enrollment_page():
     st.markdown("Register a new customer in the system")
 
     # Get existing customers for parent selection
-    conn = sqlite3.connect('data/crm.db')
-    existing_customers = pd.read_sql_query(
-        "SELECT id, name, pan FROM customers WHERE agent_id=?",
-        conn, params=(st.session_state.current_agent['id'],)
-    )
-    conn.close()
+    agent_id = st.session_state.current_agent['id']
+    existing_customers = cache.read_sql(agent_id, queries.CUSTOMER_CHOICES, (agent_id,))
 
     with st.form("customer_form", clear_on_submit=True):
         st.subheader("Customer Details")
@@ -494,30 +346,26 @@ def customer_enrollment_page():
                 st.error("❌ Please select a parent customer for family member")
                 return
 
-            # Save to database
-            conn = sqlite3.connect('data/crm.db')
-            c = conn.cursor()
-
             # Check if PAN already exists
-            c.execute("SELECT id, name FROM customers WHERE pan=?", (pan_card,))
-            existing = c.fetchone()
+            with db.connection() as conn:
+                existing = conn.execute(queries.CUSTOMER_BY_PAN, (pan_card,)).fetchone()
             if existing:
                 st.error(f"❌ Customer with PAN {pan_card} already exists: {existing[1]}")
-                conn.close()
                 return
 
             try:
-                customer_id = f"C{str(uuid.uuid4())[:8]}"
-                c.execute(
-                    "INSERT INTO customers (id, agent_id, pan, aadhar, name, phone, email, income_range, parent_id, relationship, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                    (customer_id, st.session_state.current_agent['id'], pan_card, aadhar_number,
-                     customer_name, phone_number, email_address, income_range,
-                     parent_customer_id, relationship, datetime.now().date()))
-                conn.commit()
-                conn.close()
+                # Save to database
+                with db.transaction() as conn:
+                    customer_id = enrollment.enroll_customer(conn, st.session_state.current_agent['id'], {
+                        'pan': pan_card, 'aadhar': aadhar_number, 'name': customer_name,
+                        'phone': phone_number, 'email': email_address, 'income_range': income_range,
+                        'parent_id': parent_customer_id, 'relationship': relationship,
+                    })
+                    customer_display_id = enrollment.display_id(conn, 'customers', customer_id)
+                cache.invalidate(st.session_state.current_agent['id'])
 
                 st.success(f"✅ Customer registered successfully!")
-                st.success(f"**Customer ID:** {customer_id}")
+                st.success(f"**Customer ID:** {customer_display_id}")
                 st.success(f"**Name:** {customer_name}")
                 if parent_customer_id:
                     parent_name = existing_customers[existing_customers['id'] == parent_customer_id].iloc[0]['name']
@@ -525,8 +373,6 @@ def customer_enrollment_page():
 
             except Exception as e:
                 st.error(f"❌ Error registering customer: {str(e)}")
-                if conn:
-                    conn.close()
 
 
 # Policy enrollment page
@@ -535,12 +381,8 @@ def policy_enrollment_page():
     st.markdown("Register a new insurance policy")
 
     # Get customers for this agent
-    conn = sqlite3.connect('data/crm.db')
-    customers = pd.read_sql_query(
-        "SELECT c.id, c.name, c.pan, c.parent_id, c.relationship, parent.name as parent_name, parent.pan as parent_pan FROM customers c LEFT JOIN customers parent ON c.parent_id = parent.id WHERE c.agent_id=? ORDER BY c.name",
-        conn, params=(st.session_state.current_agent['id'],)
-    )
-    conn.close()
+    agent_id = st.session_state.current_agent['id']
+    customers = cache.read_sql(agent_id, queries.CUSTOMERS_WITH_PARENT, (agent_id,))
 
     if customers.empty:
         st.warning("⚠️ No customers found. Please enroll customers first.")
@@ -555,7 +397,7 @@ def policy_enrollment_page():
         # Enhanced customer selection with family info
         customer_options = {}
         for _, row in customers.iterrows():
-            if row['parent_id']:
+            if pd.notna(row['parent_id']):
                 display_name = f"{row['name']} ({row['pan']}) - {row['relationship']} of {row['parent_name']}"
             else:
                 display_name = f"{row['name']} ({row['pan']})"
@@ -572,7 +414,7 @@ def policy_enrollment_page():
 
         policy_holder_id = selected_customer_id  # Default to same customer
 
-        if selected_customer['parent_id']:
+        if pd.notna(selected_customer['parent_id']):
             st.info(f"ℹ️ Selected customer is a family member. Policy can be purchased by parent/guardian.")
             col1, col2 = st.columns(2)
             with col1:
@@ -581,7 +423,7 @@ def policy_enrollment_page():
                     ["Self", "Parent/Guardian"]
                 )
             if policy_holder_option == "Parent/Guardian":
-                policy_holder_id = selected_customer['parent_id']
+                policy_holder_id = int(selected_customer['parent_id'])
                 with col2:
                     st.info(f"Policy will be purchased by: {selected_customer['parent_name']}")
 
@@ -688,39 +530,31 @@ def policy_enrollment_page():
                 st.error("❌ Policy end date must be after start date")
                 return
 
-            # Save policy
-            conn = sqlite3.connect('data/crm.db')
-            c = conn.cursor()
-
             # Check if policy number already exists
-            c.execute("SELECT id FROM policies WHERE policy_number=?", (policy_number,))
-            if c.fetchone():
+            with db.connection() as conn:
+                existing = conn.execute(queries.POLICY_BY_NUMBER, (policy_number,)).fetchone()
+            if existing:
                 st.error(f"❌ Policy with number {policy_number} already exists")
-                conn.close()
                 return
 
             try:
-                policy_id = f"P{str(uuid.uuid4())[:8]}"
-                c.execute(
-                    "INSERT INTO policies (id, customer_id, policy_holder_id, policy_number, premium_amount, frequency, type, provider, coverage_type, nominee_name, nominee_pan, nominee_aadhar, beneficiary_name, beneficiary_pan, beneficiary_aadhar, start_date, end_date, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                    (policy_id, selected_customer_id, policy_holder_id, policy_number, premium_amount, frequency,
-                     insurance_type, insurance_provider, coverage_type, nominee_name, nominee_pan, nominee_aadhar,
-                     beneficiary_name, beneficiary_pan, beneficiary_aadhar,
-                     start_date, end_date, "Active"))
-
-                # Create premium records based on frequency
-                premium_dates = generate_premium_dates(start_date, end_date, frequency)
-                for due_date in premium_dates:
-                    premium_id = f"PR{str(uuid.uuid4())[:8]}"
-                    c.execute(
-                        "INSERT INTO premiums (id, policy_id, due_date, amount, status) VALUES (?, ?, ?, ?, ?)",
-                        (premium_id, policy_id, due_date, premium_amount, "Pending"))
-
-                conn.commit()
-                conn.close()
+                # Save policy together with its premium schedule
+                with db.transaction() as conn:
+                    policy_id = enrollment.enroll_policy(conn, {
+                        'customer_id': selected_customer_id, 'policy_holder_id': policy_holder_id,
+                        'policy_number': policy_number, 'premium_amount': premium_amount,
+                        'frequency': frequency, 'type': insurance_type, 'provider': insurance_provider,
+                        'coverage_type': coverage_type, 'nominee_name': nominee_name,
+                        'nominee_pan': nominee_pan, 'nominee_aadhar': nominee_aadhar,
+                        'beneficiary_name': beneficiary_name, 'beneficiary_pan': beneficiary_pan,
+                        'beneficiary_aadhar': beneficiary_aadhar,
+                        'start_date': start_date, 'end_date': end_date,
+                    })
+                    policy_display_id = enrollment.display_id(conn, 'policies', policy_id)
+                cache.invalidate(st.session_state.current_agent['id'])
 
                 st.success("✅ Policy registered successfully!")
-                st.success(f"**Policy ID:** {policy_id}")
+                st.success(f"**Policy ID:** {policy_display_id}")
                 st.success(f"**Policy Number:** {policy_number}")
                 st.success(f"**Customer:** {selected_customer['name']}")
                 if policy_holder_id != selected_customer_id:
@@ -729,24 +563,6 @@ def policy_enrollment_page():
 
             except Exception as e:
                 st.error(f"❌ Error registering policy: {str(e)}")
-                if conn:
-                    conn.close()
-
-
-def generate_premium_dates(start_date, end_date, frequency):
-    dates = []
-    current_date = start_date
-    freq_days = {
-        "Monthly": 30,
-        "Quarterly": 90,
-        "Half-Yearly": 180,
-        "Yearly": 365
-    }
-    days = freq_days.get(frequency, 30)
-    while current_date <= end_date:
-        dates.append(current_date)
-        current_date += timedelta(days=days)
-    return dates
 
 
 # Family Management page
@@ -754,25 +570,25 @@ def family_management_page():
     st.title("👨‍👩‍👧‍👦 Family Management")
     st.markdown("Manage customer families and relationships")
 
-    conn = sqlite3.connect('data/crm.db')
+    # All families and their policies come from one cached per-agent load
+    agent_families = families.agent_families(st.session_state.current_agent['id'])
+    primary_customers = agent_families.primaries
 
-    # Get all customers with family info
-    families = pd.read_sql_query(
-        "SELECT c.id, c.name, c.pan, c.phone, c.email, c.parent_id, c.relationship, parent.name as parent_name, parent.pan as parent_pan FROM customers c LEFT JOIN customers parent ON c.parent_id = parent.id WHERE c.agent_id=? ORDER BY parent.name, c.name",
-        conn, params=(st.session_state.current_agent['id'],)
-    )
-
-    if families.empty:
+    if primary_customers.empty:
         st.info("No customers found. Please add customers first.")
-        conn.close()
         return
 
-    # Separate primary customers and family members
-    primary_customers = families[families['parent_id'].isna()]
-    family_members = families[families['parent_id'].notna()]
+    # Only one page of family expanders is built per rerun
+    page_size = 20
+    pages = -(-len(primary_customers) // page_size)
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+        st.caption(f"{len(primary_customers)} families")
+    first = (page - 1) * page_size
 
     # Display family structures
-    for _, primary in primary_customers.iterrows():
+    for _, primary in primary_customers.iloc[first:first + page_size].iterrows():
         with st.expander(f"👨‍👩‍👧‍👦 {primary['name']} Family ({primary['pan']})"):
             col1, col2 = st.columns(2)
 
@@ -784,8 +600,8 @@ def family_management_page():
                 st.write(f"• **Email:** {primary['email'] or 'Not provided'}")
 
             with col2:
-                # Get family members for this primary customer
-                family_of_primary = family_members[family_members['parent_id'] == primary['id']]
+                # Family members of this primary customer
+                family_of_primary = agent_families.members(primary['id'])
 
                 if not family_of_primary.empty:
                     st.write("**Family Members:**")
@@ -794,11 +610,8 @@ def family_management_page():
                 else:
                     st.write("**Family Members:** None")
 
-            # Get policies for this family
-            family_policies = pd.read_sql_query(
-                "SELECT p.policy_number, p.type, p.provider, p.status, customer.name as insured_name, holder.name as holder_name FROM policies p JOIN customers customer ON p.customer_id = customer.id JOIN customers holder ON p.policy_holder_id = holder.id WHERE (customer.id = ? OR customer.parent_id = ?) ORDER BY p.policy_number",
-                conn, params=(primary['id'], primary['id'])
-            )
+            # Policies for this family
+            family_policies = agent_families.policies(primary['id'])
 
             if not family_policies.empty:
                 st.write("**Family Policies:**")
@@ -822,7 +635,42 @@ def family_management_page():
 
                 st.dataframe(family_policies, use_container_width=True)
 
-    conn.close()
+
+# Bulk Import page
+def bulk_import_page():
+    st.title("📥 Bulk Import")
+    st.markdown("Import customers or policies from a CSV or Excel file")
+
+    kind = st.radio("Import", ["Customers", "Policies"], horizontal=True)
+    columns = importer.CUSTOMER_COLUMNS if kind == "Customers" else importer.POLICY_COLUMNS
+    st.caption("Columns: " + ", ".join(columns) + ". Import customers before their policies.")
+
+    uploaded = st.file_uploader("File", type=["csv", "xlsx"])
+    if uploaded is not None and st.button("Import", type="primary"):
+        bar = st.progress(0.0)
+        size = max(uploaded.size, 1)
+
+        def progress(summary):
+            bar.progress(min(uploaded.tell() / size, 1.0),
+                         text=f"{summary['rows']} rows read, {summary['imported']} imported")
+
+        rejects = io.StringIO()
+        try:
+            st.session_state.import_result = importer.import_file(
+                kind.lower(), st.session_state.current_agent['id'], uploaded, rejects,
+                filename=uploaded.name, progress=progress)
+            st.session_state.import_rejects = rejects.getvalue()
+        except (ValueError, RuntimeError) as e:
+            st.error(f"❌ {str(e)}")
+        bar.empty()
+
+    result = st.session_state.get('import_result')
+    if result:
+        st.success(f"✅ {result['imported']} of {result['rows']} rows imported")
+        if result['rejected']:
+            st.warning(f"{result['rejected']} rows rejected")
+            st.download_button("Download rejected rows", st.session_state.import_rejects,
+                               "rejected_rows.csv", "text/csv")
 
 
 # Records page
@@ -831,42 +679,45 @@ def records_page():
     st.markdown("Search and view customer information and policies")
 
     search_option = st.radio("Search by", ["PAN Card", "Customer Name", "Family"])
+    agent_id = st.session_state.current_agent['id']
 
-    conn = sqlite3.connect('data/crm.db')
-
+    # Every read below is cached per agent until one of its writes
     if search_option == "PAN Card":
         pan_search = st.text_input("Enter PAN Card Number", placeholder="ABCDE1234F").upper()
         if pan_search:
-            customer = pd.read_sql_query(
-                "SELECT c.*, parent.name as parent_name, parent.pan as parent_pan FROM customers c LEFT JOIN customers parent ON c.parent_id = parent.id WHERE c.pan=? AND c.agent_id=?",
-                conn, params=(pan_search, st.session_state.current_agent['id'])
-            )
+            customer = cache.read_sql(agent_id, queries.RECORD_BY_PAN, (pan_search, agent_id))
 
             if not customer.empty:
-                display_customer_details(customer.iloc[0], conn)
+                loaded = cache.call(agent_id, records.load_customer_records, customer['id'])
+                display_customer_details(customer.iloc[0], loaded)
             else:
                 st.warning("No customer found with this PAN number")
 
     elif search_option == "Customer Name":
-        name_search = st.text_input("Enter Customer Name", placeholder="Enter full or partial name")
+        name_search = st.text_input("Enter Customer Name",
+                                    placeholder="Name, PAN, phone, email or nominee - full or partial")
         if name_search:
-            customers = pd.read_sql_query(
-                "SELECT c.*, parent.name as parent_name, parent.pan as parent_pan FROM customers c LEFT JOIN customers parent ON c.parent_id = parent.id WHERE c.name LIKE ? AND c.agent_id=? ORDER BY c.name",
-                conn, params=(f"%{name_search}%", st.session_state.current_agent['id'])
-            )
-
-            if not customers.empty:
+            page_size = 10
+            total = cache.call(agent_id, search.count_matches, agent_id, name_search)
+
+            if total:
+                pages = -(-total // page_size)
+                page = 1
+                if pages > 1:
+                    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+                first = (page - 1) * page_size
+                st.caption(f"Showing {first + 1}-{min(first + page_size, total)} of {total} matches")
+
+                customers = cache.call(agent_id, search.search_customers, agent_id, name_search, page_size, first)
+                loaded = cache.call(agent_id, records.load_customer_records, customers['id'])
                 for _, customer in customers.iterrows():
-                    display_customer_details(customer, conn)
+                    display_customer_details(customer, loaded)
             else:
                 st.warning("No customers found with this name")
 
     elif search_option == "Family":
         # Get primary customers
-        primary_customers = pd.read_sql_query(
-            "SELECT id, name, pan FROM customers WHERE agent_id=? AND parent_id IS NULL ORDER BY name",
-            conn, params=(st.session_state.current_agent['id'],)
-        )
+        primary_customers = cache.read_sql(agent_id, queries.PRIMARY_CUSTOMERS, (agent_id,))
 
         if not primary_customers.empty:
             family_options = {row['id']: f"{row['name']} ({row['pan']})" for _, row in primary_customers.iterrows()}
@@ -878,21 +729,19 @@ def records_page():
 
             if selected_family:
                 # Get all family members
-                family_members = pd.read_sql_query(
-                    "SELECT c.*, parent.name as parent_name, parent.pan as parent_pan FROM customers c LEFT JOIN customers parent ON c.parent_id = parent.id WHERE (c.id = ? OR c.parent_id = ?) AND c.agent_id=? ORDER BY c.parent_id, c.name",
-                    conn, params=(selected_family, selected_family, st.session_state.current_agent['id'])
-                )
+                family_members = cache.read_sql(agent_id, queries.FAMILY_RECORDS,
+                                                (selected_family, selected_family, agent_id))
 
+                loaded = cache.call(agent_id, records.load_customer_records, family_members['id'])
                 for _, member in family_members.iterrows():
-                    display_customer_details(member, conn)
-
-    conn.close()
+                    display_customer_details(member, loaded)
 
 
 # Update the display_customer_details function to handle cancelled policies better
-def display_customer_details(customer, conn):
+# `loaded` holds the preloaded policies and premiums (records.load_customer_records)
+def display_customer_details(customer, loaded):
     # Customer header with family info
-    if customer.get('parent_id'):
+    if pd.notna(customer.get('parent_id')):
         st.subheader(f"👤 {customer['name']} ({customer['relationship']} of {customer.get('parent_name', 'Unknown')})")
     else:
         st.subheader(f"👤 {customer['name']} (Primary Customer)")
@@ -905,13 +754,10 @@ def display_customer_details(customer, conn):
     with col2:
         st.write(f"**Email:** {customer['email'] or 'Not provided'}")
         st.write(f"**Income Range:** {customer['income_range']}")
-        st.write(f"**Customer Since:** {customer['created_at'][:10]}")
+        st.write(f"**Customer Since:** {customer['created_at']}")
 
-    # Get policies for this customer (including cancelled ones)
-    policies = pd.read_sql_query(
-        "SELECT p.*, holder.name as holder_name FROM policies p LEFT JOIN customers holder ON p.policy_holder_id = holder.id WHERE p.customer_id=? ORDER BY p.start_date DESC",
-        conn, params=(customer['id'],)
-    )
+    # Policies for this customer (including cancelled ones)
+    policies = loaded.policies(customer['id'])
 
     if not policies.empty:
         st.subheader("📋 Policies")
@@ -925,6 +771,7 @@ def display_customer_details(customer, conn):
 
         if status_filter != "All":
             policies = policies[policies['status'] == status_filter]
+        policies = policies.assign(start_date=dates.iso(policies['start_date']), end_date=dates.iso(policies['end_date']))
 
         for _, policy in policies.iterrows():
             status_emoji = "✅" if policy['status'] == 'Active' else "⏰" if policy['status'] == 'Lapsed' else "🏁" if policy['status'] == 'Completed' else "❌"
@@ -952,15 +799,12 @@ def display_customer_details(customer, conn):
                 # Policy actions - only show for active/lapsed policies
                 if policy['status'] in ['Active', 'Lapsed']:
                     if st.button(f"❌ Cancel Policy", key=f"cancel_{policy['id']}"):
-                        cancel_policy(policy['id'], conn)
+                        cancel_policy(policy['id'])
                         st.rerun()
 
                 # Show premium history only for non-cancelled policies
                 if policy['status'] != 'Cancelled':
-                    premiums = pd.read_sql_query(
-                        "SELECT * FROM premiums WHERE policy_id=? ORDER BY due_date",
-                        conn, params=(policy['id'],)
-                    )
+                    premiums = loaded.premiums(policy['id'])
 
                     if not premiums.empty:
                         st.write("**Premium History:**")
@@ -969,33 +813,34 @@ def display_customer_details(customer, conn):
                         paid_premiums = premiums[premiums['status'] == 'Paid']
                         pending_premiums = premiums[premiums['status'] == 'Pending']
 
+                        # Lines are formatted column-wise; dates arrive as datetime64
                         if not paid_premiums.empty:
                             st.write("**Paid Premiums:**")
-                            for _, premium in paid_premiums.iterrows():
-                                paid_date = premium['paid_date'][:10] if isinstance(premium['paid_date'], str) else premium['paid_date']
-                                due_date = premium['due_date'][:10] if isinstance(premium['due_date'], str) else premium['due_date']
-                                st.write(f"• ₹{premium['amount']:,.2f} paid on {paid_date} (due: {due_date})")
+                            lines = ("• ₹" + paid_premiums['amount'].map("{:,.2f}".format)
+                                     + " paid on " + dates.iso(paid_premiums['paid_date'])
+                                     + " (due: " + dates.iso(paid_premiums['due_date']) + ")")
+                            for line in lines:
+                                st.write(line)
 
                         if not pending_premiums.empty:
                             st.write("**Upcoming Premiums:**")
-                            for _, premium in pending_premiums.iterrows():
-                                due_date = premium['due_date'][:10] if isinstance(premium['due_date'], str) else premium['due_date']
-                                # Fixed line below:
-                                status_icon = "⏰" if pd.to_datetime(due_date).date() < datetime.now().date() else "📅"
-                                st.write(f"• {status_icon} ₹{premium['amount']:,.2f} due on {due_date}")
+                            overdue = pending_premiums['due_date'] < pd.Timestamp(dates.today())
+                            lines = (overdue.map({True: "• ⏰ ₹", False: "• 📅 ₹"})
+                                     + pending_premiums['amount'].map("{:,.2f}".format)
+                                     + " due on " + dates.iso(pending_premiums['due_date']))
+                            for line in lines:
+                                st.write(line)
 
                         # Mark premium as paid (only for pending premiums)
                         if not pending_premiums.empty:
-                            due_dates = [premium['due_date'] for _, premium in pending_premiums.iterrows()]
                             selected_due_date = st.selectbox(
                                 "Select premium to mark as paid",
-                                due_dates,
-                                key=f"premium_select_{policy['id']}",
-                                format_func=lambda x: x[:10] if isinstance(x, str) else x
+                                dates.iso(pending_premiums['due_date']).tolist(),
+                                key=f"premium_select_{policy['id']}"
                             )
 
                             if st.button(f"Mark Premium as Paid", key=f"pay_{policy['id']}"):
-                                mark_specific_premium_as_paid(policy['id'], selected_due_date, conn)
+                                mark_specific_premium_as_paid(policy['id'], selected_due_date)
                                 st.rerun()
                 else:
                     st.info("This policy has been cancelled. No premium payments are required.")
@@ -1004,23 +849,14 @@ def display_customer_details(customer, conn):
 
 
 # Also update the mark_specific_premium_as_paid function to not update status for cancelled policies
-def mark_specific_premium_as_paid(policy_id, due_date, conn):
-    # First check if policy is cancelled
-    c = conn.cursor()
-    c.execute("SELECT status FROM policies WHERE id=?", (policy_id,))
-    policy_status = c.fetchone()[0]
-
-    if policy_status == 'Cancelled':
-        st.error("Cannot mark premium as paid for a cancelled policy!")
+def mark_specific_premium_as_paid(policy_id, due_date):
+    try:
+        with db.transaction() as conn:
+            payments.pay_premium(conn, policy_id, due_date)
+    except ValueError as e:
+        st.error(str(e))
         return
-
-    c.execute("UPDATE premiums SET status='Paid', paid_date=? WHERE policy_id=? AND due_date=?",
-              (datetime.now().date(), policy_id, due_date))
-    conn.commit()
-
-    # Update policy status after marking premium as paid (only if not cancelled)
-    if policy_status != 'Cancelled':
-        update_policy_status(policy_id, conn)
+    cache.invalidate(st.session_state.current_agent['id'])
     st.success("Premium marked as paid!")
 
 
@@ -1036,127 +872,133 @@ def upcoming_premiums_page():
     status_filter = st.selectbox("Filter by Policy Status",
                                  ["All", "Active", "Lapsed", "Completed"])
 
-    days_map = {"30 days": 30, "60 days": 60, "90 days": 90, "All upcoming": 3650, "Overdue": -3650}
+    days_map = {"30 days": 30, "60 days": 60, "90 days": 90, "All upcoming": None, "Overdue": -1}
     days = days_map[timeframe]
 
-    conn = sqlite3.connect('data/crm.db')
-
-    # Build query based on filters - exclude cancelled policies
-    query = '''
-        SELECT pr.due_date, pr.amount, pr.status as premium_status, 
-               c.name as customer_name, p.policy_number, p.type as policy_type, 
-               p.provider, p.status as policy_status, holder.name as policy_holder 
-        FROM premiums pr 
-        JOIN policies p ON pr.policy_id = p.id 
-        JOIN customers c ON p.customer_id = c.id 
-        LEFT JOIN customers holder ON p.policy_holder_id = holder.id 
-        WHERE c.agent_id=? AND pr.status='Pending' AND p.status != 'Cancelled'
-    '''
-
-    params = [st.session_state.current_agent['id']]
-
-    if timeframe == "Overdue":
-        query += " AND pr.due_date < date('now')"
-    elif timeframe != "All upcoming":
-        query += " AND pr.due_date BETWEEN date('now') AND date('now', ?)"
-        params.append(f"+{days} days")
-
-    if status_filter != "All":
-        query += " AND p.status=?"
-        params.append(status_filter)
+    # Result of the last bulk payment, shown once after its rerun
+    if 'payment_summary' in st.session_state:
+        st.success(st.session_state.pop('payment_summary').replace("\n", "  \n"))
 
-    query += " ORDER BY pr.due_date"
+    agent_id = st.session_state.current_agent['id']
+    page_size = 50
 
-    premiums = pd.read_sql_query(query, conn, params=params)
-
-    if not premiums.empty:
-        if isinstance(premiums['due_date'].iloc[0], str):
-            premiums['due_date'] = pd.to_datetime(premiums['due_date']).dt.date
-
-        total_amount = premiums['amount'].sum()
+    # Totals for the whole window come from one aggregate query; both it and the pages are cached per agent
+    premium_count, total_amount, overdue_count = cache.call(agent_id, upcoming.summary, agent_id, days, status_filter)
 
+    if premium_count:
         col1, col2, col3 = st.columns(3)
         with col1:
             st.metric("💰 Total Amount Due", f"₹{total_amount:,.2f}")
         with col2:
-            st.metric("📊 Number of Premiums", len(premiums))
+            st.metric("📊 Number of Premiums", premium_count)
         with col3:
-            overdue_count = len(premiums[premiums['due_date'] < datetime.now().date()])
             st.metric("⏰ Overdue Premiums", overdue_count)
 
         # Add sorting options
-        sort_option = st.selectbox("Sort by", ["Due Date", "Amount", "Customer Name", "Policy Number"])
-
-        if sort_option == "Due Date":
-            premiums = premiums.sort_values("due_date")
-        elif sort_option == "Amount":
-            premiums = premiums.sort_values("amount", ascending=False)
-        elif sort_option == "Customer Name":
-            premiums = premiums.sort_values("customer_name")
-        elif sort_option == "Policy Number":
-            premiums = premiums.sort_values("policy_number")
+        sort_option = st.selectbox("Sort by", list(queries.UPCOMING_SORTS))
+
+        # Keyset cursors of the pages before the current one; reset when the view changes
+        view = (timeframe, status_filter, sort_option)
+        if st.session_state.get('upcoming_view') != view:
+            st.session_state.upcoming_view = view
+            st.session_state.upcoming_cursors = []
+            with db.connection() as conn:
+                st.session_state.upcoming_dense = upcoming.dense_window(conn, days, sort_option,
+                                                                        premium_count, page_size)
+        cursors = st.session_state.upcoming_cursors
+
+        # Only the visible page is fetched, sorted in SQL
+        premiums, next_cursor = cache.call(agent_id, upcoming.page, agent_id, days, status_filter, sort_option,
+                                           cursors[-1] if cursors else None, page_size,
+                                           st.session_state.upcoming_dense)
+
+        first = len(cursors) * page_size
+        st.caption(f"Showing {first + 1}-{first + len(premiums)} of {premium_count}")
 
         # Format display
         display_df = premiums.copy()
-        display_df['due_date'] = display_df['due_date'].apply(
-            lambda x: x.strftime('%Y-%m-%d') if hasattr(x, 'strftime') else x)
-        display_df['amount'] = display_df['amount'].apply(lambda x: f"₹{x:,.2f}")
+        display_df['amount'] = display_df['amount'].map("₹{:,.2f}".format)
+        st.dataframe(display_df, use_container_width=True, column_config=DATE_COLUMNS)
 
-        st.dataframe(display_df, use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button("⬅️ Previous", disabled=not cursors, on_click=cursors.pop, use_container_width=True)
+        with col2:
+            st.button("Next ➡️", disabled=next_cursor is None, on_click=lambda: cursors.append(next_cursor),
+                      use_container_width=True)
 
         # Bulk actions section
         st.subheader("Bulk Actions")
 
-        # Select policies with premiums
+        # Select policies with premiums on this page
         policy_options = premiums['policy_number'].unique()
         selected_policies = st.multiselect("Select Policies", policy_options)
 
         if selected_policies:
-            # Get due dates for selected policies
-            selected_premiums = premiums[premiums['policy_number'].isin(selected_policies)]
-            due_dates = selected_premiums['due_date'].unique()
-
             if st.button("Mark Selected Premiums as Paid", type="primary"):
-                c = conn.cursor()
-                for policy_number in selected_policies:
-                    policy_premiums = selected_premiums[selected_premiums['policy_number'] == policy_number]
-                    for due_date in policy_premiums['due_date']:
-                        c.execute(
-                            "UPDATE premiums SET status='Paid', paid_date=? WHERE policy_id=(SELECT id FROM policies WHERE policy_number=?) AND due_date=?",
-                            (datetime.now().date(), policy_number, due_date)
-                        )
-                        # Update policy status
-                        c.execute("SELECT id FROM policies WHERE policy_number=?", (policy_number,))
-                        policy_id = c.fetchone()[0]
-                        update_policy_status(policy_id, conn)
-
-                conn.commit()
-                st.success("Selected premiums marked as paid!")
+                # Every premium of the selected policies in the window, not just this page
+                with db.transaction() as wconn:
+                    selected_premiums = upcoming.for_policies(wconn, agent_id, selected_policies,
+                                                              days, status_filter)
+                    summary = payments.pay_premiums(
+                        wconn, agent_id, zip(selected_premiums['policy_number'], selected_premiums['due_date']))
+
+                cache.invalidate(agent_id)
+                st.session_state.upcoming_cursors = []
+                st.session_state.payment_summary = payments.describe(summary)
                 st.rerun()
     else:
         st.info("No upcoming premiums found")
 
-    conn.close()
 
 # Add a function to update all policy statuses (for maintenance)
 def update_all_policy_statuses():
-    conn = sqlite3.connect('data/crm.db')
-    c = conn.cursor()
+    # Recompute every policy of this agent in one set-based pass, off the script thread
+    jobs.submit('update_statuses', st.session_state.current_agent['id'])
+
 
-    # Get all policies for this agent
-    c.execute('''
-        SELECT p.id FROM policies p 
-        JOIN customers c ON p.customer_id = c.id 
-        WHERE c.agent_id=?
-    ''', (st.session_state.current_agent['id'],))
+# Admin view of the profiling layer: page and SQL timings, slow statements
+def performance_page():
+    st.title("⏱️ Performance")
+    st.markdown("Render and SQL timings of this server process since start (or the last reset)")
 
-    policy_ids = [row[0] for row in c.fetchall()]
+    columns = ['name', 'count', 'rows', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'total_ms']
 
-    for policy_id in policy_ids:
-        update_policy_status(policy_id, conn)
+    st.subheader("Pages")
+    pages = pd.DataFrame(profiling.snapshot('page'), columns=columns + ['text'])
+    st.dataframe(pages[columns].drop(columns='rows').round(2), use_container_width=True)
 
-    conn.close()
-    st.sidebar.success("All policy statuses updated!")
+    st.subheader("SQL statements")
+    statements = pd.DataFrame(profiling.snapshot('sql'), columns=columns + ['text'])
+    statements = statements.rename(columns={'name': 'fingerprint'})
+    st.dataframe(statements.round(2), use_container_width=True)
+
+    st.subheader(f"Slow statements (over {profiling.SLOW_QUERY_MS:g} ms)")
+    slow = profiling.slow_statements()
+    if slow:
+        for entry in slow:
+            with st.expander(f"{entry['at']}  {entry['elapsed_ms']:.0f} ms  {entry['rows']} rows  {entry['fingerprint']}"):
+                st.code(entry['text'], language='sql')
+                st.code("\n".join(entry['plan']))
+    else:
+        st.info("No slow statements recorded")
+
+    stats = cache.stats()
+    st.subheader("Result cache")
+    st.write(f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}), "
+             f"{stats['entries']}/{stats['max_entries']} entries, {stats['evictions']} evicted")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button("Download JSON", profiling.to_json(), "crm_profile.json", "application/json",
+                           use_container_width=True)
+    with col2:
+        st.download_button("Download Prometheus text", profiling.to_prometheus(), "crm_metrics.prom", "text/plain",
+                           use_container_width=True)
+    with col3:
+        if st.button("Reset timings", use_container_width=True):
+            profiling.reset()
+            st.rerun()
 
 
 # Add this to the sidebar for maintenance
@@ -1176,7 +1018,9 @@ def render_sidebar():
             "Policy Enrollment": "📝",
             "Records": "📂",
             "Family Management": "👨‍👩‍👧‍👦",
-            "Upcoming Premiums": "💰"
+            "Upcoming Premiums": "💰",
+            "Bulk Import": "📥",
+            "Performance": "⏱️"
         }
 
         for page, icon in nav_options.items():
@@ -1188,11 +1032,19 @@ def render_sidebar():
         st.divider()
         st.subheader("Data Management")
 
-        if st.button("💾 Export Data (CSV + TXT)", use_container_width=True):
-            export_data_to_csv_and_txt()
+        export_format = st.selectbox("Export format", export.FORMATS, key="export_format")
+        if st.button("💾 Export Data", use_container_width=True):
+            export_data_to_csv_and_txt(export_format)
+        render_job_progress('export', "Exporting", show_export_result)
 
         if st.button("🔄 Update All Policy Statuses", use_container_width=True):
             update_all_policy_statuses()
+        render_job_progress('update_statuses', "Updating policy statuses", show_status_update_result)
+
+        # Result cache counters, for tuning CRM_CACHE_ENTRIES
+        stats = cache.stats()
+        st.caption(f"Cache: {stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%}), "
+                   f"{stats['entries']}/{stats['max_entries']} entries, {stats['evictions']} evicted")
 
         st.divider()
 
@@ -1206,21 +1058,24 @@ def render_sidebar():
 # Main app logic
 def main():
     if st.session_state.current_agent is None:
-        login_page()
+        with profiling.timed('page', 'login_page'):
+            login_page()
     else:
         render_sidebar()
-        if st.session_state.page == 'Dashboard':
-            dashboard_page()
-        elif st.session_state.page == 'Customer Enrollment':
-            customer_enrollment_page()
-        elif st.session_state.page == 'Policy Enrollment':
-            policy_enrollment_page()
-        elif st.session_state.page == 'Records':
-            records_page()
-        elif st.session_state.page == 'Family Management':
-            family_management_page()
-        elif st.session_state.page == 'Upcoming Premiums':
-            upcoming_premiums_page()
+        page = {
+            'Dashboard': dashboard_page,
+            'Customer Enrollment': customer_enrollment_page,
+            'Policy Enrollment': policy_enrollment_page,
+            'Records': records_page,
+            'Family Management': family_management_page,
+            'Upcoming Premiums': upcoming_premiums_page,
+            'Bulk Import': bulk_import_page,
+            'Performance': performance_page,
+        }.get(st.session_state.page)
+        if page:
+            # Every render is timed for the Performance page
+            with profiling.timed('page', page.__name__):
+                page()
 
 
 if __name__ == "__main__":
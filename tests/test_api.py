@@ -0,0 +1,71 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from crm import api, db, profiling
+
+from conftest import AGENT
+
+
+@pytest.mark.parametrize("cursor", ["[1]", "[1, 2, 3, 4, 5]", '[[1], 2, 3]', '{"a": 1}', "[true, 1, 2]", "{"])
+def test_upcoming_rejects_malformed_cursors(database, cursor):
+    with pytest.raises(ValueError, match="invalid cursor"):
+        api.upcoming_premiums(AGENT['id'], days=30, cursor=cursor)
+
+
+def test_upcoming_accepts_its_own_cursor(database):
+    cursor = json.dumps(["2026-01-01", 1, 1])
+    assert api.upcoming_premiums(AGENT['id'], days=30, cursor=cursor)['premiums'] == []
+
+
+def get(path, headers=()):
+    pytest.importorskip("starlette")
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'raw_path': path.encode(), 'query_string': b"",
+             'headers': [(name.lower().encode(), value.encode()) for name, value in headers]}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b"", 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(api.create_app()(scope, receive, send))
+    start, body = sent[0], b"".join(message.get('body', b"") for message in sent[1:])
+    return start['status'], dict(start['headers']), body.decode()
+
+
+def test_metrics_serves_the_statement_timings(monkeypatch):
+    profiling.reset()
+    profiling.record('sql', 'abcd1234', 12.0, 3, "SELECT 1")
+    status, headers, body = get('/metrics')
+    assert status == 200 and headers[b'content-type'].startswith(b"text/plain; version=0.0.4")
+    assert 'crm_sql_duration_seconds_count{fingerprint="abcd1234"} 1' in body
+
+    monkeypatch.setattr(api, 'API_KEY', "secret")
+    assert get('/metrics')[0] == 401
+    assert get('/metrics', [("Authorization", "Bearer secret")])[0] == 200
+    profiling.reset()
+
+
+def busy_errors():
+    if db.dialect() == 'sqlite':
+        return [sqlite3.OperationalError("database is locked")]
+    from psycopg import errors
+    return [errors.LockNotAvailable(), errors.SerializationFailure(), errors.DeadlockDetected()]
+
+
+def test_busy_database_is_503(database, monkeypatch):
+    for error in busy_errors():
+        def lookup(agent_id, pans):
+            raise error
+        monkeypatch.setattr(api, 'lookup_customers', lookup)
+        status, headers, body = get('/customers/ABCDE0001F', [("X-Agent-Id", AGENT['id'])])
+        assert (status, json.loads(body)) == (503, {'error': "database busy, retry"})
+        assert headers[b'retry-after'] == b"1"
+
+    monkeypatch.setattr(api, 'lookup_customers', lambda agent_id, pans: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        get('/customers/ABCDE0001F', [("X-Agent-Id", AGENT['id'])])
@@ -0,0 +1,26 @@
+import pytest
+
+from crm import export
+
+from conftest import AGENT, customer, import_rows
+
+
+# parent_id is NULL all through the first chunk and an integer in the second
+def test_parquet_export_with_nulls_in_the_first_chunk(database, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    rows = [customer(1), customer(2), customer(3, parent_pan="ABCDE0001F")]
+    assert import_rows('customers', rows)['imported'] == 3
+
+    files = export.export_agent(AGENT['id'], 'parquet', str(tmp_path), chunksize=2)
+
+    customers = pq.read_table(files[0])
+    assert str(customers.schema.field('parent_id').type) == 'int64'
+    assert str(customers.schema.field('id').type) == 'int64'
+    parents = customers.column('parent_id').to_pylist()
+    assert parents[:2] == [None, None] and parents[2] is not None
+    # The display ids the pages show stay text
+    assert str(customers.schema.field('display_id').type) == 'string'
+    policies = pq.read_table(files[1])
+    assert policies.num_rows == 0
+    assert str(policies.schema.field('policy_holder_id').type) == 'int64'
+    assert str(policies.schema.field('premium_amount').type) == 'double'
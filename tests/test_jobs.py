@@ -0,0 +1,76 @@
+import logging
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from crm import db, jobs
+
+from conftest import AGENT
+
+
+# The first status write fails as if another writer held the database
+def test_job_whose_status_write_fails_is_marked_failed(database, monkeypatch, caplog):
+    update = jobs._update
+    calls = []
+
+    def flaky_update(job_id, **values):
+        calls.append(values)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        update(job_id, **values)
+
+    monkeypatch.setattr(jobs, '_update', flaky_update)
+    with caplog.at_level(logging.ERROR, logger='crm.jobs'):
+        job = jobs.wait(jobs.submit('update_statuses', AGENT['id'])['id'], timeout=10)
+
+    assert job['status'] == 'failed'
+    assert "database is locked" in job['error']
+    assert any(record.exc_info for record in caplog.records)
+    # The failed job no longer blocks the next one of its kind
+    retry = jobs.submit('update_statuses', AGENT['id'])
+    assert retry['id'] != job['id']
+    assert jobs.wait(retry['id'], timeout=10)['status'] == 'done'
+
+
+def active_job(agent_id, kind, owner, heartbeat_at):
+    with db.transaction() as conn:
+        return conn.execute('''INSERT INTO jobs (kind, agent_id, params, status, created_at, owner, heartbeat_at)
+                               VALUES (?, ?, '{}', 'running', ?, ?, ?) RETURNING id''',
+                            (kind, agent_id, datetime.now(), owner, heartbeat_at)).fetchall()[0][0]
+
+
+# Only the jobs of processes that are gone fail; the others keep running
+def test_only_jobs_of_gone_processes_are_failed(database):
+    finished = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                              capture_output=True, text=True, check=True)
+    now, stale = datetime.now(), datetime.now() - timedelta(seconds=jobs.STALE_AFTER + 60)
+    ids = {
+        'exited here': active_job("A1", 'export', f"{jobs.HOST}:{finished.stdout.strip()}", now),
+        'running here': active_job("A2", 'export', f"{jobs.HOST}:{os.getppid()}", stale),
+        'beating elsewhere': active_job("A3", 'export', "other-host:1", now),
+        'silent elsewhere': active_job("A4", 'export', "other-host:2", stale),
+        'from before owners': active_job("A5", 'export', None, None),
+    }
+    with db.transaction() as conn:
+        failed = jobs._fail_orphans(conn)
+    assert sorted(failed) == sorted(ids[name] for name in ('exited here', 'silent elsewhere', 'from before owners'))
+    assert jobs.get(ids['running here'])['status'] == 'running'
+
+
+# Racing submits get the one job: the unique index on active jobs, not a read-then-insert
+def test_concurrent_submits_share_one_job(database, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setitem(jobs.HANDLERS, 'update_statuses', lambda agent_id, params, progress: release.wait(10))
+    with ThreadPoolExecutor(8) as pool:
+        submitted = list(pool.map(lambda _: jobs.submit('update_statuses', AGENT['id'])['id'], range(16)))
+    release.set()
+    assert len(set(submitted)) == 1
+    assert jobs.wait(submitted[0], timeout=10)['status'] == 'done'
+
+    # A job held by a live process elsewhere is returned, not duplicated
+    held = active_job(AGENT['id'], 'export', "other-host:1", datetime.now())
+    assert jobs.submit('export', AGENT['id'])['id'] == held
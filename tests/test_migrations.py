@@ -0,0 +1,55 @@
+import sqlite3
+
+from crm import db, migrations
+
+from conftest import postgres_schema, requires_postgres
+
+# Search tables differ by design: FTS5 and its shadow tables in SQLite, a tsvector table in PostgreSQL
+SEARCH_TABLES = ('customer_search',)
+
+
+def sqlite_schema(path):
+    db.configure(path)
+    db.init_db()
+    db.close()
+    conn = sqlite3.connect(path)
+    try:
+        tables = [name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+            if not name.startswith(SEARCH_TABLES)]
+        columns = {table: [row[1] for row in conn.execute(f"PRAGMA table_info({table})")] for table in tables}
+        indexes = {name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'idx_%'")}
+        version = migrations.current_version(conn)
+    finally:
+        conn.close()
+    return columns, indexes, version
+
+
+def postgres_schema_of(url):
+    db.configure(url)
+    db.init_db()
+    with db.connection() as conn:
+        tables = [name for (name,) in conn.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = current_schema() ORDER BY table_name")
+            if not name.startswith(SEARCH_TABLES)]
+        columns = {table: [name for (name,) in conn.execute(
+            '''SELECT column_name FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = ? ORDER BY ordinal_position''', (table,))]
+            for table in tables}
+        indexes = {name for (name,) in conn.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND indexname LIKE 'idx_%'")}
+        version = migrations.current_version(conn)
+    db.close()
+    return columns, indexes, version
+
+
+# Both dialects of crm.migrations end in the same tables, columns and indexes
+@requires_postgres
+def test_sqlite_and_postgres_schemas_match(tmp_path):
+    columns, indexes, version = sqlite_schema(str(tmp_path / "crm.db"))
+    with postgres_schema() as url:
+        pg_columns, pg_indexes, pg_version = postgres_schema_of(url)
+    assert pg_columns == columns
+    assert pg_indexes - {'idx_customer_search_document'} == indexes
+    assert pg_version == version == migrations.MIGRATIONS[-1][0]
@@ -0,0 +1,75 @@
+import logging
+import sqlite3
+
+import pytest
+
+from crm import db, profiling
+
+from conftest import AGENT
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    monkeypatch.setattr(profiling, 'SLOW_QUERY_MS', 0)
+    conn = sqlite3.connect(':memory:', factory=profiling.ProfiledConnection)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+    profiling.reset()
+    yield conn
+    conn.close()
+    profiling.reset()
+
+
+# Recorded when execute returns; the fetches add their rows to it
+def test_statement_is_recorded_when_execute_returns(conn):
+    conn.executemany("INSERT INTO t (name) VALUES (?)", [("a",), ("b",)])
+    profiling.reset()
+    cursor = conn.execute("SELECT name FROM t")
+    [entry] = profiling.snapshot('sql')
+    assert (entry['count'], entry['rows']) == (1, 0)
+    assert cursor.fetchone() == ("a",)
+    assert list(cursor) == [("b",)]
+    [entry] = profiling.snapshot('sql')
+    assert (entry['count'], entry['rows']) == (1, 2)
+
+
+# Logged once its rows are read to the end; the cursor is never closed
+def test_slow_statement_is_logged_when_it_finishes(conn, caplog):
+    with caplog.at_level(logging.WARNING, logger='crm.profiling'):
+        cursor = conn.execute("SELECT name FROM t WHERE id = ?", (1,))
+        assert profiling.slow_statements() == []
+        cursor.fetchall()
+
+    [entry] = profiling.slow_statements()
+    assert entry['text'] == "SELECT name FROM t WHERE id = ?"
+    assert any('USING INTEGER PRIMARY KEY' in line for line in entry['plan'])
+    assert "slow query" in caplog.text and "USING INTEGER PRIMARY KEY" in caplog.text
+
+
+def test_slow_write_and_batch_are_logged_when_they_return(conn):
+    conn.execute("UPDATE t SET name = ? WHERE id = ?", ("a", 1))
+    conn.executemany("UPDATE t SET name = ? WHERE id = ?", [("b", 2), ("c", 3)])
+    batch, update = profiling.slow_statements()
+    assert update['text'] == batch['text'] == "UPDATE t SET name = ? WHERE id = ?"
+    assert any('USING INTEGER PRIMARY KEY' in line for line in batch['plan'])
+
+
+# On every backend; a statement PostgreSQL cannot explain (DDL) leaves the transaction usable
+def test_backend_statements_are_profiled(database, monkeypatch):
+    monkeypatch.setattr(profiling, 'SLOW_QUERY_MS', 0)
+    profiling.reset()
+    with db.connection() as conn:
+        assert conn.execute("SELECT name FROM agents WHERE id = ?", (AGENT['id'],)).fetchall()
+    [entry] = [s for s in profiling.snapshot('sql') if s['text'].startswith("SELECT name FROM agents")]
+    assert (entry['count'], entry['rows']) == (1, 1)
+    slow = profiling.slow_statements()[0]
+    assert slow['text'] == entry['text'] and slow['plan'] and not slow['plan'][0].startswith("(no plan")
+
+    profiling.reset()
+    with db.transaction() as conn:
+        conn.execute("CREATE TEMP TABLE profiling_scratch (id integer)")
+        conn.executemany("INSERT INTO profiling_scratch VALUES (?)", [(1,), (2,)])
+        assert conn.execute("SELECT COUNT(*) FROM profiling_scratch").fetchone()[0] == 2
+        conn.execute("DROP TABLE profiling_scratch")
+    # The COUNT(*) still has rows to read: it is explained when its cursor is closed or reused
+    assert [entry['text'].split()[0] for entry in profiling.slow_statements()] [:3] == ["DROP", "INSERT", "CREATE"]
+    profiling.reset()
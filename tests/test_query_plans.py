@@ -0,0 +1,24 @@
+import sqlite3
+
+from crm import db, migrations, query_plans
+
+
+# Every page query must search an index; a full table scan is a regression
+def test_page_queries_use_indexes():
+    conn = sqlite3.connect(':memory:')
+    db.create_schema(conn)
+    assert migrations.current_version(conn) == migrations.MIGRATIONS[-1][0]
+    assert query_plans.full_scans(conn) == {}
+    conn.close()
+
+
+# Without the migration indexes the check must fail, or it checks nothing
+def test_missing_indexes_are_reported():
+    conn = sqlite3.connect(':memory:')
+    db.create_schema(conn)
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'idx_%'").fetchall():
+        conn.execute(f"DROP INDEX {name}")
+    offenders = query_plans.full_scans(conn)
+    assert 'CUSTOMER_CHOICES' in offenders
+    assert any(line.startswith('SCAN') for scans in offenders.values() for line in scans)
+    conn.close()
@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+
+import pytest
+
+from crm import db, reminders, synthetic
+
+
+@pytest.fixture
+def book(database_url):
+    synthetic.build(database_url, 2, 600, seed=7)
+    db.configure(database_url)
+    db.init_db()
+    yield
+    db.close()
+
+
+def outbox():
+    with db.connection() as conn:
+        return conn.execute("SELECT policy_id, due_date, window_key FROM reminder_outbox").fetchall()
+
+
+# A nightly run moves the window by a day; each premium is still reminded once
+def test_next_nights_window_only_adds_premiums_not_yet_reminded(book):
+    today = date.today()
+    first = reminders.run(today.isoformat(), days=30, batch_size=50)
+    assert first['reminders'] > 0
+    assert reminders.run(today.isoformat(), days=30, restart=True)['reminders'] == 0
+
+    day_one = {policy_id: due_date for policy_id, due_date, _ in outbox()}
+    second = reminders.run((today + timedelta(days=1)).isoformat(), days=30, batch_size=50)
+    assert second['already_reminded'] > 0
+    added = [(policy_id, due_date) for policy_id, due_date, window in outbox() if window.startswith(
+        (today + timedelta(days=1)).isoformat())]
+    assert len(added) == second['reminders']
+    # Only premiums that came into the window: the policy's reminded premium
+    # fell out of it (due today), or it had none due in the first window
+    for policy_id, due_date in added:
+        assert day_one.get(policy_id, today.isoformat()) == today.isoformat()
+        assert due_date > today.isoformat()
+
+
+def test_interrupted_run_resumes_from_its_checkpoint(book, monkeypatch):
+    render, calls = reminders.render, []
+
+    def failing_render(*args):
+        calls.append(1)
+        if len(calls) == 120:
+            raise RuntimeError("interrupted")
+        return render(*args)
+
+    monkeypatch.setattr(reminders, 'render', failing_render)
+    with pytest.raises(RuntimeError):
+        reminders.run(days=60, batch_size=50)
+    committed = len(outbox())
+    assert committed == 100
+    monkeypatch.setattr(reminders, 'render', render)
+
+    resumed = reminders.run(days=60, batch_size=50)
+    assert resumed['resumed']
+    assert committed + resumed['reminders'] == len(outbox()) == len({row[:2] for row in outbox()})
@@ -0,0 +1,22 @@
+import logging
+import threading
+
+from crm import scheduler
+
+
+# A failed pass is logged with its traceback and the loop carries on
+def test_run_forever_logs_failures_and_keeps_running(monkeypatch, caplog):
+    stop, calls = threading.Event(), []
+
+    def run_once():
+        calls.append(1)
+        if len(calls) == 2:
+            stop.set()
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(scheduler, 'run_once', run_once)
+    with caplog.at_level(logging.ERROR, logger='crm.scheduler'):
+        scheduler.run_forever(interval=0, stop_event=stop)
+    assert len(calls) == 2
+    assert [record.message for record in caplog.records] == ["lapse detection failed"] * 2
+    assert caplog.records[0].exc_info[0] is RuntimeError
@@ -0,0 +1,121 @@
+from datetime import date, timedelta
+
+import pytest
+
+from crm import db, families, payments, queries, records, rollups, search, statuses, upcoming
+
+from conftest import AGENT, customer, import_rows, policy
+
+
+# Two families: a primary with a spouse, and a customer of their own.
+# POL-1 has five months of unpaid premiums, POL-2 is paid up, POL-3 ended.
+@pytest.fixture
+def book(database):
+    today = date.today()
+    rows = [customer(1, "Arjun Rao"), customer(2, "Kavya Rao", parent_pan="ABCDE0001F"), customer(3, "Vikram Shah")]
+    assert import_rows('customers', rows)['imported'] == 3
+    rows = [policy("POL-1", "ABCDE0001F", "Monthly", today - timedelta(days=150), today + timedelta(days=720)),
+            policy("POL-2", "ABCDE0002F", "Yearly", today - timedelta(days=30), today + timedelta(days=1800),
+                   paid_until=today.isoformat(), nominee="Rohan Rao"),
+            policy("POL-3", "ABCDE0003F", "Quarterly", today - timedelta(days=1000), today - timedelta(days=40),
+                   paid_until=today.isoformat(), nominee="Anita Shah")]
+    assert import_rows('policies', rows)['imported'] == 3
+    with db.connection() as conn:
+        ids = dict(conn.execute("SELECT policy_number, id FROM policies").fetchall())
+        customers = dict(conn.execute("SELECT pan, id FROM customers").fetchall())
+    return ids, customers
+
+
+def policy_statuses():
+    with db.connection() as conn:
+        return dict(conn.execute("SELECT policy_number, status FROM policies").fetchall())
+
+
+def assert_rollups_match():
+    with db.transaction() as conn:
+        assert rollups.check(conn) == {table: 0 for table in rollups.ROLLUP_TABLES}
+
+
+def test_enrollment_statuses_and_rollups(book):
+    assert policy_statuses() == {'POL-1': 'Lapsed', 'POL-2': 'Active', 'POL-3': 'Completed'}
+    assert_rollups_match()
+    with db.connection() as conn:
+        counts = rollups.agent_counts(conn, AGENT['id'])
+    assert (counts['customers'], counts['family_members'], counts['policies']) == (3, 1, 3)
+    assert (counts['active'], counts['lapsed'], counts['completed']) == (1, 1, 1)
+
+
+def test_payments_and_cancellation_keep_the_rollups_current(book):
+    today = date.today()
+    with db.connection() as conn:
+        overdue = [row[0] for row in conn.execute(
+            "SELECT due_date FROM premiums WHERE policy_id=? AND status='Pending' AND due_date < ?",
+            (book[0]['POL-1'], today))]
+    assert len(overdue) >= 4
+
+    with db.transaction() as conn:
+        summary = payments.pay_premiums(conn, AGENT['id'], [("POL-1", due) for due in overdue] + [("NOPE", today)])
+    assert summary['paid'] == len(overdue) and summary['unknown_policies'] == ["NOPE"]
+    assert summary['transitions'] == {('Lapsed', 'Active'): 1}
+    assert policy_statuses()['POL-1'] == 'Active'
+    assert_rollups_match()
+
+    with db.transaction() as conn:
+        statuses.cancel_policy(conn, book[0]['POL-2'])
+        assert statuses.recompute_policy_statuses(conn) == {}
+    assert_rollups_match()
+    with db.connection() as conn:
+        assert rollups.agent_counts(conn, AGENT['id'])['cancelled'] == 1
+
+
+def test_search_records_and_families(book):
+    ids, customers = book
+    with db.connection() as conn:
+        found = search.search_customers(conn, AGENT['id'], "rao")
+        assert set(found['name']) == {"Arjun Rao", "Kavya Rao"}
+        # Nominee names, PAN prefixes and email parts match as well
+        assert search.search_customers(conn, AGENT['id'], "anita")['name'].tolist() == ["Vikram Shah"]
+        assert search.count_matches(conn, AGENT['id'], "abcde0002") == 1
+        assert search.count_matches(conn, AGENT['id'], "c3@example") == 1
+        assert search.count_matches(conn, "A9999", "rao") == 0
+
+        loaded = records.load_customer_records(conn, [customers['ABCDE0001F'], customers['ABCDE0003F']])
+        assert loaded.policies(customers['ABCDE0001F'])['policy_number'].tolist() == ["POL-1"]
+        assert len(loaded.premiums(ids['POL-3'])) > 0
+
+        book_families = families.load_families(conn, AGENT['id'])
+    assert sorted(book_families.primaries['name']) == ["Arjun Rao", "Vikram Shah"]
+    assert book_families.members(customers['ABCDE0001F'])['name'].tolist() == ["Kavya Rao"]
+    assert sorted(book_families.policies(customers['ABCDE0001F'])['policy_number']) == ["POL-1", "POL-2"]
+
+
+@pytest.mark.parametrize("sort", list(queries.UPCOMING_SORTS))
+def test_upcoming_pages_walk_every_premium_once(book, sort):
+    with db.connection() as conn:
+        expected = upcoming.for_policies(conn, AGENT['id'], ["POL-1", "POL-2", "POL-3"], days=365)
+        count = upcoming.summary(conn, AGENT['id'], days=365)[0]
+        seen, after = [], None
+        while True:
+            page, after = upcoming.page(conn, AGENT['id'], days=365, sort=sort, after=after, page_size=4)
+            seen.extend(zip(page['policy_number'], page['due_date']))
+            if after is None:
+                break
+    assert len(seen) == len(set(seen)) == len(expected) == count > 4
+
+
+# A NULL name or policy number sorts as '' and keeps its place in the walk
+@pytest.mark.parametrize("sort", list(queries.UPCOMING_SORTS))
+def test_upcoming_pages_walk_past_nulls(book, sort):
+    ids, customers = book
+    with db.transaction() as conn:
+        conn.execute("UPDATE customers SET name = NULL WHERE id = ?", (customers['ABCDE0001F'],))
+        conn.execute("UPDATE policies SET policy_number = NULL WHERE id = ?", (ids['POL-2'],))
+    with db.connection() as conn:
+        count = upcoming.summary(conn, AGENT['id'], days=365)[0]
+        seen, after = [], None
+        while True:
+            page, after = upcoming.page(conn, AGENT['id'], days=365, sort=sort, after=after, page_size=4)
+            seen.extend(zip(page['policy_number'], page['due_date']))
+            if after is None:
+                break
+    assert len(seen) == len(set(seen)) == count > 4